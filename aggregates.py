@@ -0,0 +1,96 @@
+import math
+
+# SQL aggregates registered on every connection by db.configure, so summary
+# statistics are computed inside SQLite and only the summary row comes back.
+#
+#   stddev(x[, count])       sample standard deviation, as DataFrame.describe() reports it
+#   quantile(x, q[, count])  exact q-quantile, interpolated like numpy's default
+#
+# The optional count lets a query group readings by value first and feed
+# each distinct value once with its count. Readings are whole numbers, so
+# an aggregate then sees a few hundred rows however long the history is,
+# and its memory is bounded by the number of distinct values.
+
+DESCRIBE_QUANTILES = (0.25, 0.5, 0.75)
+
+
+class StdDev:
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value, count=1):
+        if value is None or not count:
+            return
+        # Merge count copies of value into the running mean and squared deviations
+        n = self.n + count
+        delta = value - self.mean
+        self.mean += delta * count / n
+        self.m2 += delta * delta * self.n * count / n
+        self.n = n
+
+    def finalize(self):
+        if self.n < 2:
+            return None
+        return math.sqrt(self.m2 / (self.n - 1))
+
+
+class Quantile:
+    def __init__(self):
+        self.counts = {}
+        self.q = None
+
+    def step(self, value, q, count=1):
+        if value is None or not count:
+            return
+        self.q = q
+        self.counts[value] = self.counts.get(value, 0) + count
+
+    def finalize(self):
+        if not self.counts:
+            return None
+        total = sum(self.counts.values())
+        position = (total - 1) * self.q
+        lower = math.floor(position)
+        upper = min(lower + 1, total - 1)
+
+        # Values at sorted positions lower and upper, walking the counts once
+        low = high = None
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if low is None and seen > lower:
+                low = value
+            if seen > upper:
+                high = value
+                break
+        return low + (position - lower) * (high - low)
+
+
+def register(conn):
+    for arguments in (1, 2):
+        conn.create_aggregate('stddev', arguments, StdDev)
+    for arguments in (2, 3):
+        conn.create_aggregate('quantile', arguments, Quantile)
+    return conn
+
+
+def describe(conn, table, column, where='1', params=()):
+    """DataFrame.describe() of one reading column as (statistic, value) pairs
+
+    where and params select the rows, e.g. 'user_id = ?' and (user_id,).
+    """
+    quantiles = ", ".join(f"quantile(value, {q}, n)" for q in DESCRIBE_QUANTILES)
+    row = conn.execute(f'''
+        SELECT COALESCE(SUM(n), 0), TOTAL(value * n) / SUM(n), stddev(value, n), MIN(value),
+               {quantiles}, MAX(value)
+        FROM (
+            SELECT {column} AS value, COUNT(*) AS n
+            FROM {table}
+            WHERE {where} AND {column} IS NOT NULL
+            GROUP BY {column}
+        )
+    ''', params).fetchone()
+    labels = ['count', 'mean', 'std', 'min'] + [f"{q:.0%}" for q in DESCRIBE_QUANTILES] + ['max']
+    return [(label, math.nan if value is None else float(value)) for label, value in zip(labels, row)]
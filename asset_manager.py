@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageTk
+
+# Shared image cache for the UI. Each source image is decoded once, and
+# every resized variant is kept in a bounded LRU keyed by name and size,
+# so modules and windows that show the same picture share one PhotoImage.
+# Resized asset variants are also written as PNG thumbnails. A later run
+# can then open a small file instead of decoding and resampling the
+# original again.
+
+ASSET_DIR = 'assets'
+THUMBNAIL_DIR = os.path.join(ASSET_DIR, '.thumbnails')
+CACHE_SIZE = 32
+
+
+class AssetManager:
+    def __init__(self, asset_dir=ASSET_DIR, thumbnail_dir=None, cache_size=CACHE_SIZE):
+        self.asset_dir = asset_dir
+        self.thumbnail_dir = thumbnail_dir
+        self.cache_size = cache_size
+        self._sources = {}
+        self._images = OrderedDict()
+        self._photos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, cache, key, value):
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def _lookup(self, cache, key):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        return None
+
+    def _source(self, name):
+        image = self._sources.get(name)
+        if image is None:
+            with Image.open(os.path.join(self.asset_dir, name)) as f:
+                image = f.copy()
+            self._sources[name] = image
+        return image
+
+    def _thumbnail_path(self, name, size):
+        stem = os.path.splitext(name)[0]
+        return os.path.join(self.thumbnail_dir, f"{stem}_{size[0]}x{size[1]}.png")
+
+    def _load_thumbnail(self, name, size):
+        path = self._thumbnail_path(name, size)
+        try:
+            # A thumbnail older than its source is stale
+            if os.path.getmtime(path) < os.path.getmtime(os.path.join(self.asset_dir, name)):
+                return None
+            with Image.open(path) as f:
+                return f.copy()
+        except OSError:
+            return None
+
+    def _save_thumbnail(self, name, size, image):
+        path = self._thumbnail_path(name, size)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            image.save(path, format='PNG')
+        except OSError:
+            # A read-only install just resizes again next time
+            pass
+
+    def image(self, name, size=None):
+        """The asset as a PIL image, resized to size (width, height) if given"""
+        key = (name, size)
+        image = self._lookup(self._images, key)
+        if image is not None:
+            return image
+        if size is None:
+            return self._remember(self._images, key, self._source(name))
+        if self.thumbnail_dir:
+            image = self._load_thumbnail(name, size)
+            if image is not None:
+                return self._remember(self._images, key, image)
+        image = self._source(name).resize(size, Image.LANCZOS)
+        if self.thumbnail_dir:
+            self._save_thumbnail(name, size, image)
+        return self._remember(self._images, key, image)
+
+    def photo(self, name, size=None):
+        """A PhotoImage of the asset, or None if it is missing or unreadable
+
+        Call from the Tk thread once the root window exists.
+        """
+        key = (name, size)
+        photo = self._lookup(self._photos, key)
+        if photo is not None:
+            return photo
+        try:
+            image = self.image(name, size)
+        except OSError:
+            return None
+        return self._remember(self._photos, key, ImageTk.PhotoImage(image))
+
+    def clear(self):
+        with self._lock:
+            self._sources.clear()
+            self._images.clear()
+            self._photos.clear()
+
+
+assets = AssetManager(thumbnail_dir=THUMBNAIL_DIR)
@@ -1,43 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
+from schema import migrate
+from db_worker import InlineExecutor
 import hashlib
-from PIL import Image, ImageTk
+from asset_manager import assets
 import os
 
 class AuthModule:
-    def __init__(self, db_conn, on_login_success):
+    def __init__(self, db_conn, on_login_success, executor=None):
         self.conn = db_conn
+        self.executor = executor or InlineExecutor(db_conn)
         self.on_login_success = on_login_success
         self.create_tables()
         self.load_images()
         
     def load_images(self):
-        try:
-            self.logo_img = Image.open("assets/health_logo.png").resize((120, 120))
-            self.logo_photo = ImageTk.PhotoImage(self.logo_img)
-            
-            self.bg_img = Image.open("assets/auth_bg.jpg").resize((800, 600))
-            self.bg_photo = ImageTk.PhotoImage(self.bg_img)
-        except:
-            # Fallback if images not found
-            self.logo_photo = None
-            self.bg_photo = None
+        # None if an image is missing; the screens then draw without it
+        self.logo_photo = assets.photo("health_logo.png", (120, 120))
+        self.bg_photo = assets.photo("auth_bg.jpg", (800, 600))
         
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                full_name TEXT,
-                age INTEGER,
-                gender TEXT,
-                diabetes_type TEXT
-            )
-        ''')
-        self.conn.commit()
+        migrate(self.conn)
 
     def hash_password(self, password):
         return hashlib.sha256(password.encode()).hexdigest()
@@ -155,12 +139,16 @@ class AuthModule:
         
         hashed_password = self.hash_password(password)
         
-        cursor = self.conn.cursor()
+        self.executor.submit(self._find_user, username, hashed_password,
+                             on_done=self._on_login_result)
+
+    def _find_user(self, conn, username, hashed_password):
+        cursor = conn.cursor()
         cursor.execute('SELECT id, username, full_name FROM users WHERE username = ? AND password = ?', 
                       (username, hashed_password))
-        
-        user = cursor.fetchone()
-        
+        return cursor.fetchone()
+
+    def _on_login_result(self, user):
         if user:
             self.on_login_success({
                 'id': user[0],
@@ -190,14 +178,25 @@ class AuthModule:
         
         hashed_password = self.hash_password(password)
         
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO users (username, password, full_name, age, gender, diabetes_type)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (username, hashed_password, full_name, age, gender, diabetes_type))
-            self.conn.commit()
-            messagebox.showinfo("Success", "Registration successful! Please login.")
-            self.show_login(self.parent)
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", "Username already exists")
\ No newline at end of file
+        self.executor.submit(self._insert_user,
+                             (username, hashed_password, full_name, age, gender, diabetes_type),
+                             on_done=self._on_registered,
+                             on_error=self._on_register_error)
+
+    def _insert_user(self, conn, values):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO users (username, password, full_name, age, gender, diabetes_type)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', values)
+        conn.commit()
+
+    def _on_registered(self, _):
+        messagebox.showinfo("Success", "Registration successful! Please login.")
+        self.show_login(self.parent)
+
+    def _on_register_error(self, error):
+        if isinstance(error, sqlite3.IntegrityError):
+            messagebox.showerror("Error", "Username already exists")
+        else:
+            messagebox.showerror("Database Error", str(error))
\ No newline at end of file
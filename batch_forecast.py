@@ -0,0 +1,185 @@
+import argparse
+import sys
+import time
+import numpy as np
+from datetime import date, datetime, timedelta
+from db import DB_PATH, connect
+from schema import TREND_VALUES
+from trend_model import fit_trends
+
+# Forecasts for every user in one pass, for nightly jobs. By default each
+# user's all-time trend comes straight from trend_stats (one row per user);
+# with a window the readings inside it are streamed and summed per user
+# with np.bincount. Either way all users are fitted together with array
+# operations and the results replace the predictions table in a single
+# transaction.
+
+MIN_READINGS = 3
+CHUNK_SIZE = 200000
+
+KIND_TABLES = {kind: (table, y1, y2) for table, (kind, y1, y2) in TREND_VALUES.items()}
+
+
+class BatchResult:
+    def __init__(self, kind):
+        self.kind = kind
+        self.users = 0
+        self.readings = 0
+        self.rows = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        return (f"{self.kind}: {self.users:,} users forecast from {self.readings:,} readings, "
+                f"{self.rows:,} rows written in {self.elapsed:.2f}s")
+
+
+def _day_number(day):
+    return (day - date(1970, 1, 1)).days
+
+
+def load_stats(conn, kind):
+    """All-time sums from trend_stats: (user_ids, n, Σx, Σx², Σy, Σxy, newest ts)"""
+    table = KIND_TABLES[kind][0]
+    cursor = conn.cursor()
+    # MAX(ts) is one seek per user on the (user_id, ts) index
+    cursor.execute(f'''
+        SELECT user_id, n, sum_x, sum_xx, sum_y1, sum_y2, sum_xy1, sum_xy2,
+               (SELECT MAX(ts) FROM {table} WHERE user_id = trend_stats.user_id)
+        FROM trend_stats
+        WHERE kind = ? AND n > 0
+    ''', (kind,))
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 9)
+    return rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4:6], rows[:, 6:8], rows[:, 8]
+
+
+def stream_sums(conn, kind, since_ts, chunk_size=CHUNK_SIZE):
+    """Sums and newest ts per user over readings with ts >= since_ts, streamed in chunks"""
+    table, y1, y2 = KIND_TABLES[kind]
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT user_id, ts / 86400, {y1}, {y2}, ts
+        FROM {table}
+        WHERE ts >= ?
+    ''', (since_ts,))
+
+    parts = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = np.array(rows, dtype=np.int64)
+        users, group = np.unique(chunk[:, 0], return_inverse=True)
+        x = chunk[:, 1].astype(float)
+        y = chunk[:, 2:4].astype(float)
+        last_ts = np.zeros(len(users), dtype=np.int64)
+        np.maximum.at(last_ts, group, chunk[:, 4])
+        # Integer terms summed in float64 stay exact below 2**53
+        sums = [np.bincount(group, minlength=len(users)),
+                np.bincount(group, x), np.bincount(group, x * x)]
+        sums += [np.bincount(group, y[:, i]) for i in range(2)]
+        sums += [np.bincount(group, x * y[:, i]) for i in range(2)]
+        parts.append((users, np.column_stack(sums), last_ts))
+
+    if not parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty, np.zeros((0, 2), np.int64), np.zeros((0, 2), np.int64), empty
+
+    # A user can appear in several chunks; merge their partial sums
+    users, group = np.unique(np.concatenate([u for u, _, _ in parts]), return_inverse=True)
+    stacked = np.concatenate([s for _, s, _ in parts])
+    totals = np.column_stack([np.bincount(group, stacked[:, i], minlength=len(users))
+                              for i in range(stacked.shape[1])]).astype(np.int64)
+    last_ts = np.zeros(len(users), dtype=np.int64)
+    np.maximum.at(last_ts, group, np.concatenate([t for _, _, t in parts]))
+    return users, totals[:, 0], totals[:, 1], totals[:, 2], totals[:, 3:5], totals[:, 5:7], last_ts
+
+
+def forecast(sums, days_ahead):
+    """Forecast the days after each user's last reading
+
+    Returns (user_ids, dates, values): dates shaped (users, days_ahead) and
+    values shaped (users, days_ahead, 2).
+    """
+    user_ids, n, sum_x, sum_xx, sum_y, sum_xy, last_ts = sums
+    keep = n >= MIN_READINGS
+    user_ids, n, sum_x, sum_xx = user_ids[keep], n[keep], sum_x[keep], sum_xx[keep]
+    slope, intercept = fit_trends(n, sum_x, sum_xx, sum_y[keep], sum_xy[keep])
+
+    days = (last_ts[keep] // 86400)[:, None] + np.arange(1, days_ahead + 1)
+    values = intercept[:, None, :] + slope[:, None, :] * days[:, :, None]
+    # Users share most of their dates: format each distinct day once
+    unique_days, index = np.unique(days, return_inverse=True)
+    names = np.array([(date(1970, 1, 1) + timedelta(days=int(day))).strftime('%Y-%m-%d')
+                      for day in unique_days], dtype=object)
+    dates = names[index].reshape(days.shape)
+    return user_ids, dates, values
+
+
+def write_predictions(conn, kind, user_ids, dates, values):
+    """Replace kind's predictions; the caller commits"""
+    created_at = datetime.now().isoformat(timespec='seconds')
+    conn.execute('DELETE FROM predictions WHERE kind = ?', (kind,))
+    y2 = values[:, :, 1].ravel().tolist() if kind == 'bp' else [None] * dates.size
+    rows = zip(np.repeat(user_ids, dates.shape[1]).tolist(), dates.ravel().tolist(),
+               values[:, :, 0].ravel().tolist(), y2)
+    conn.executemany(f'''
+        INSERT INTO predictions (user_id, kind, date, y1, y2, created_at)
+        VALUES (?, '{kind}', ?, ?, ?, '{created_at}')
+    ''', rows)
+    return dates.size
+
+
+def forecast_all(conn, kinds=('bp', 'bs'), days_ahead=7, window_days=None, today=None,
+                 chunk_size=CHUNK_SIZE):
+    """Forecast every user for each kind in one transaction and return BatchResults
+
+    today only places the start of the window; forecasts always begin the
+    day after each user's last reading.
+    """
+    results = []
+    today = today or date.today()
+    try:
+        for kind in kinds:
+            result = BatchResult(kind)
+            start = time.perf_counter()
+            if window_days:
+                since = (_day_number(today) - window_days + 1) * 86400
+                sums = stream_sums(conn, kind, since, chunk_size)
+            else:
+                sums = load_stats(conn, kind)
+            result.readings = int(sums[1].sum())
+            user_ids, dates, values = forecast(sums, days_ahead)
+            result.users = len(user_ids)
+            result.rows = write_predictions(conn, kind, user_ids, dates, values)
+            result.elapsed = time.perf_counter() - start
+            results.append(result)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Forecast readings for every user into the predictions table")
+    parser.add_argument('--kind', choices=['bp', 'bs', 'all'], default='all')
+    parser.add_argument('--days-ahead', type=int, default=7)
+    parser.add_argument('--window-days', type=int,
+                        help="fit only the last N days of readings instead of the full history")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--db', default=DB_PATH, help="database path")
+    args = parser.parse_args(argv)
+
+    kinds = ('bp', 'bs') if args.kind == 'all' else (args.kind,)
+    conn = connect(args.db)
+    try:
+        for result in forecast_all(conn, kinds, args.days_ahead, args.window_days,
+                                   chunk_size=args.chunk_size):
+            print(result.summary())
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from db import DB_PATH, connect
+from parallel_jobs import prepare_database, run_sharded
+
+# Headless export of BP and BS reports for a cohort of users, for example
+# from a nightly job. Reports are written by report_engine across a process
+# pool; each worker keeps its pooled trend figures and fpdf's font metrics
+# for every document it writes.
+#
+# A manifest next to the reports records the reading_versions counter and
+# profile each report was made from. Users whose readings and profile are
+# unchanged since their last report are skipped, so a repeated export only
+# writes what changed.
+
+KINDS = ('bp', 'bs')
+MANIFEST = 'manifest.json'
+
+
+class ExportResult:
+    def __init__(self, out):
+        self.out = out
+        self.users = 0
+        self.written = 0
+        self.unchanged = 0
+        self.empty = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def summary(self):
+        lines = [
+            f"Users in cohort: {self.users:,}",
+            f"Reports written: {self.written:,}",
+            f"Unchanged, skipped: {self.unchanged:,}",
+            f"No readings: {self.empty:,}",
+            f"Failed: {len(self.errors):,}",
+            f"Output: {self.out} in {self.elapsed:.1f}s",
+        ]
+        for user_id, kind, error in self.errors[:5]:
+            lines.append(f"  user {user_id} {kind}: {error}")
+        return "\n".join(lines)
+
+
+def select_cohort(conn, diabetes_types=None, min_age=None, max_age=None):
+    """Ids of users matching every given filter, in id order; all users by default"""
+    condition, params = ['1'], []
+    if diabetes_types:
+        condition.append(f"diabetes_type IN ({', '.join('?' * len(diabetes_types))})")
+        params.extend(diabetes_types)
+    if min_age is not None:
+        condition.append('age >= ?')
+        params.append(min_age)
+    if max_age is not None:
+        condition.append('age <= ?')
+        params.append(max_age)
+    return [row[0] for row in conn.execute(
+        f"SELECT id FROM users WHERE {' AND '.join(condition)} ORDER BY id", params)]
+
+
+def report_name(user_id, username, kind):
+    return f"{kind}_report_{user_id}_{username}.pdf"
+
+
+def report_stamps(conn, user_ids, kinds, start=None, end=None):
+    """{(user_id, kind): stamp} of what each report shows; equal stamps mean an identical report"""
+    wanted = set(user_ids)
+    stamps = {}
+    for kind in kinds:
+        for user_id, username, full_name, diabetes_type, version in conn.execute('''
+            SELECT u.id, u.username, u.full_name, u.diabetes_type, COALESCE(v.version, 0)
+            FROM users u
+            LEFT JOIN reading_versions v ON v.user_id = u.id AND v.kind = ?
+            ORDER BY u.id
+        ''', (kind,)):
+            if user_id in wanted:
+                stamps[user_id, kind] = [version, username, full_name, diabetes_type, start, end]
+    return stamps
+
+
+def export_user(conn, user_id, stale, out_dir, start, end):
+    """Write the user's stale reports into out_dir; {kind: file name, or None without readings}"""
+    from report_engine import write_report
+    username = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+    written = {}
+    for kind in stale[user_id]:
+        name = report_name(user_id, username, kind)
+        result = write_report(conn, user_id, kind, os.path.join(out_dir, name), start, end)
+        written[kind] = None if result is None else name
+    return written
+
+
+def _key(user_id, kind):
+    return f"{kind}/{user_id}"
+
+
+def _load_manifest(out, archive):
+    """The previous export's manifest and the report files it still has"""
+    if archive:
+        if not os.path.exists(out):
+            return {}, set()
+        with zipfile.ZipFile(out) as zf:
+            names = set(zf.namelist())
+            if MANIFEST not in names:
+                return {}, names
+            return json.loads(zf.read(MANIFEST)), names
+    path = os.path.join(out, MANIFEST)
+    if not os.path.exists(path):
+        return {}, set()
+    with open(path) as f:
+        return json.load(f), set(os.listdir(out))
+
+
+def _save_archive(out, staging, written, removed, manifest):
+    # Zip entries cannot be replaced in place: copy the kept ones into a new archive
+    partial = out + '.partial'
+    dropped = {MANIFEST} | set(written) | removed
+    with zipfile.ZipFile(partial, 'w', zipfile.ZIP_DEFLATED) as new:
+        if os.path.exists(out):
+            with zipfile.ZipFile(out) as old:
+                for info in old.infolist():
+                    if info.filename not in dropped:
+                        new.writestr(info, old.read(info))
+        for name in written:
+            new.write(os.path.join(staging, name), name)
+        new.writestr(MANIFEST, json.dumps(manifest, indent=1))
+    os.replace(partial, out)
+
+
+def _save_manifest(out_dir, manifest):
+    partial = os.path.join(out_dir, MANIFEST + '.partial')
+    with open(partial, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(partial, os.path.join(out_dir, MANIFEST))
+
+
+def export_reports(user_ids, out, kinds=KINDS, start=None, end=None, db_path=DB_PATH, workers=None,
+                   force=False, progress=None):
+    """Write the kinds of report for user_ids into out and return an ExportResult
+
+    out is a directory, or a zip archive if it ends in '.zip'. Reports whose
+    stamp matches the manifest are skipped unless force is set. start and
+    end limit the reports to those days, as in report_engine.write_report.
+    """
+    started = time.perf_counter()
+    archive = out.lower().endswith('.zip')
+    result = ExportResult(out)
+    result.users = len(user_ids)
+
+    prepare_database(db_path)
+    conn = connect(db_path, readonly=True)
+    try:
+        stamps = report_stamps(conn, user_ids, kinds, start, end)
+    finally:
+        conn.close()
+
+    manifest, present = _load_manifest(out, archive)
+    stale = {}
+    for (user_id, kind), stamp in stamps.items():
+        entry = manifest.get(_key(user_id, kind))
+        if (not force and entry is not None and entry['stamp'] == stamp
+                and (entry['file'] is None or entry['file'] in present)):
+            result.unchanged += 1
+            continue
+        stale.setdefault(user_id, []).append(kind)
+
+    # Zip exports are written to a staging directory first
+    out_dir = tempfile.mkdtemp(prefix='reports-') if archive else out
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        written = []
+        # Earlier reports that were renamed or whose readings are all gone
+        removed = set()
+        for user_result in run_sharded(export_user, list(stale), stale, out_dir, start, end,
+                                       db_path=db_path, workers=workers, progress=progress):
+            user_id = user_result.user_id
+            if user_result.error:
+                for kind in stale[user_id]:
+                    manifest.pop(_key(user_id, kind), None)
+                    result.errors.append((user_id, kind, user_result.error))
+                continue
+            for kind, name in user_result.value.items():
+                previous = manifest.get(_key(user_id, kind))
+                if previous is not None and previous['file'] not in (None, name):
+                    removed.add(previous['file'])
+                manifest[_key(user_id, kind)] = {'stamp': stamps[user_id, kind], 'file': name}
+                if name is None:
+                    result.empty += 1
+                else:
+                    written.append(name)
+                    result.written += 1
+
+        if archive:
+            # An unchanged archive is left as it is
+            if stale or not os.path.exists(out):
+                _save_archive(out, out_dir, written, removed, manifest)
+        else:
+            for name in removed & present:
+                os.remove(os.path.join(out_dir, name))
+            _save_manifest(out_dir, manifest)
+    finally:
+        if archive:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _print_progress(done, total):
+    print(f"\r{done:,}/{total:,} users", end='' if done < total else '\n', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export BP and BS PDF reports for a cohort of users")
+    parser.add_argument('--out', default='reports', help="output directory, or a .zip archive")
+    parser.add_argument('--kind', choices=['bp', 'bs', 'all'], default='all')
+    parser.add_argument('--diabetes-type', action='append', dest='diabetes_types',
+                        help="only users with this diabetes type (repeatable)")
+    parser.add_argument('--min-age', type=int, help="only users at least this old")
+    parser.add_argument('--max-age', type=int, help="only users at most this old")
+    parser.add_argument('--users', type=int, nargs='+', help="user ids (default: the whole cohort)")
+    parser.add_argument('--start', help="first day of the reports, YYYY-MM-DD (default: first reading)")
+    parser.add_argument('--end', help="last day of the reports, YYYY-MM-DD (default: last reading)")
+    parser.add_argument('--force', action='store_true', help="rewrite reports even if nothing changed")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--db', default=DB_PATH, help="database path")
+    args = parser.parse_args(argv)
+
+    try:
+        prepare_database(args.db)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    conn = connect(args.db, readonly=True)
+    try:
+        user_ids = select_cohort(conn, args.diabetes_types, args.min_age, args.max_age)
+    finally:
+        conn.close()
+    if args.users:
+        chosen = set(args.users)
+        user_ids = [user_id for user_id in user_ids if user_id in chosen]
+
+    kinds = KINDS if args.kind == 'all' else (args.kind,)
+    result = export_reports(user_ids, args.out, kinds, args.start, args.end, db_path=args.db,
+                            workers=args.workers, force=args.force, progress=_print_progress)
+    print(result.summary())
+    return 1 if result.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
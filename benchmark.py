@@ -0,0 +1,389 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+
+# Headless benchmarks for the app's hot paths. Each case runs in a fresh
+# child process against a generated database, so peak RSS is per case and
+# nothing cached by one case speeds up the next. Results are written as
+# JSON; pass --compare with an earlier results file to flag regressions.
+#
+#   python benchmark.py --sizes 1000 10000 --output after.json --compare before.json
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+try:
+    import resource
+except ImportError:
+    # Windows has no getrusage; peak RSS is reported as null there
+    resource = None
+
+SIZES = [100, 1000, 10000, 100000]
+USERS = 5
+SEED = 7
+# Fixed so every run and every commit benchmarks identical data
+END_DATE = datetime(2025, 1, 1)
+READINGS_PER_DAY = 4
+HISTORY_PAGES = 10
+REGRESSION_THRESHOLD = 1.25
+# Sub-millisecond cases are noisy; smaller slowdowns are never flagged
+MIN_REGRESSION_MS = 1.0
+
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA')
+
+
+def fixture_path(data_dir, size, users=USERS, seed=SEED):
+    """Return a database with size BP and BS readings per user, generating it once"""
+    path = os.path.abspath(os.path.join(data_dir, f"bench_{size}_{users}_{seed}.db"))
+    if os.path.exists(path):
+        return path
+
+    from db import connect
+    from generate_test_data import generate
+    os.makedirs(data_dir, exist_ok=True)
+    partial = path + ".tmp"
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(partial + suffix):
+            os.remove(partial + suffix)
+    conn = connect(partial)
+    generate(conn, users, size, size, days=max(1, size // READINGS_PER_DAY),
+             end=END_DATE, seed=seed, progress=lambda message: None)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.close()
+    os.replace(partial, path)
+    return path
+
+
+class _Silent:
+    """Stands in for tkinter.messagebox so module code runs without a display"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _HeadlessTree:
+    """The subset of ttk.Treeview that PagedHistoryView uses"""
+
+    def __init__(self):
+        self.items = []
+        self.values = {}
+        self.top = 0.0
+
+    def configure(self, **options):
+        pass
+
+    def get_children(self, item=''):
+        return tuple(self.items)
+
+    def insert(self, parent, index, iid, values):
+        if index == 'end':
+            self.items.append(iid)
+        else:
+            self.items.insert(index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        dropped = set(iids)
+        self.items = [iid for iid in self.items if iid not in dropped]
+        for iid in iids:
+            del self.values[iid]
+
+    def exists(self, iid):
+        return iid in self.values
+
+    def index(self, iid):
+        return self.items.index(iid)
+
+    def yview(self):
+        return (self.top, 1.0)
+
+    def yview_moveto(self, fraction):
+        self.top = fraction
+
+    def see(self, iid):
+        pass
+
+    def winfo_exists(self):
+        return True
+
+
+class _HeadlessScrollbar:
+    def set(self, first, last):
+        pass
+
+
+def _first_user(conn):
+    row = conn.execute('SELECT id, username FROM users ORDER BY id LIMIT 1').fetchone()
+    return {'id': row[0], 'username': row[1]}
+
+
+def _history_view(conn, table, columns):
+    from db_worker import InlineExecutor
+    from history_view import PagedHistoryView
+    return PagedHistoryView(_HeadlessTree(), _HeadlessScrollbar(), InlineExecutor(conn),
+                            table, columns, _first_user(conn)['id'])
+
+
+def case_history_open(conn):
+    """First page of BP history, as load_data and show_reading_history open it"""
+    history = _history_view(conn, 'bp_readings', ['id', 'date', 'time', 'systolic', 'diastolic', 'pulse', 'notes'])
+    history.reload()
+    return lambda: history.reload()
+
+
+def case_history_scroll(conn):
+    """Scroll down through the history, jump to its middle and scroll back up"""
+    history = _history_view(conn, 'bp_readings', ['date', 'time', 'systolic', 'diastolic'])
+    user_id = _first_user(conn)['id']
+    low, high = conn.execute('SELECT MIN(ts), MAX(ts) FROM bp_readings WHERE user_id = ?',
+                             (user_id,)).fetchone()
+
+    def run():
+        history.reload()
+        for _ in range(HISTORY_PAGES):
+            if history._at_end:
+                break
+            history._on_scroll('0.95', '1.0')
+        history.jump_to((low + high) // 2)
+        for _ in range(2):
+            history._on_scroll('0.0', '0.05')
+    return run
+
+
+def _predict(conn, kind, cold=True):
+    from predict_module import PredictModule
+    predict = PredictModule(conn)
+    user_id = _first_user(conn)['id']
+    method = predict.predict_bp if kind == 'bp' else predict.predict_bs
+
+    def run():
+        if cold:
+            predict.clear_cache()
+        method(user_id, include_visualization=True)
+    return run
+
+
+def case_predict_bp(conn):
+    return _predict(conn, 'bp')
+
+
+def case_predict_bs(conn):
+    return _predict(conn, 'bs')
+
+
+def case_predict_cached(conn):
+    """A repeated BP prediction with no new readings"""
+    run = _predict(conn, 'bp', cold=False)
+    run()
+    return run
+
+
+def _report_module(conn, module_name, class_name):
+    import importlib
+    module = importlib.import_module(module_name)
+    module.messagebox = _Silent()
+    instance = getattr(module, class_name)(conn)
+    instance.current_user = _first_user(conn)
+
+    def run():
+        instance.generate_report()
+    return run
+
+
+def case_report_bp(conn):
+    return _report_module(conn, 'bp_module', 'BPModule')
+
+
+def case_report_bs(conn):
+    return _report_module(conn, 'bs_module', 'BSModule')
+
+
+def _trend_image(conn, kind):
+    from main import HealthMonitorApp
+    from predict_module import PredictModule
+    # Only the figure code is needed, not a window
+    app = HealthMonitorApp.__new__(HealthMonitorApp)
+    predict = PredictModule(conn)
+    user_id = _first_user(conn)['id']
+    if kind == 'bp':
+        return lambda: app._bp_trend_image(predict.prepare_bp_data(user_id))
+    return lambda: app._bs_trend_image(predict.prepare_bs_data(user_id))
+
+
+def case_trends_bp(conn):
+    return _trend_image(conn, 'bp')
+
+
+def case_trends_bs(conn):
+    return _trend_image(conn, 'bs')
+
+
+def case_startup(conn):
+    """A fresh interpreter importing main, i.e. everything loaded before the login screen"""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    # Fails the case if startup pulls in the libraries meant to load lazily
+    script = ("import sys, main; "
+              "sys.exit(','.join(m for m in main.PREWARM_MODULES if m in sys.modules) or None)")
+    return lambda: subprocess.run([sys.executable, '-c', script], cwd=app_dir, check=True)
+
+
+CASES = {
+    'startup': case_startup,
+    'history_open': case_history_open,
+    'history_scroll': case_history_scroll,
+    'predict_bp': case_predict_bp,
+    'predict_bs': case_predict_bs,
+    'predict_cached': case_predict_cached,
+    'report_bp': case_report_bp,
+    'report_bs': case_report_bs,
+    'trends_bp': case_trends_bp,
+    'trends_bs': case_trends_bs,
+}
+
+
+def _peak_rss_kib():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _measure(name, db_path, repeat, results):
+    """Child process body: run one case in a scratch directory for its files"""
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        os.chdir(workdir)
+        try:
+            results.put(_time_case(name, db_path, repeat))
+        except Exception:
+            results.put({'error': traceback.format_exc()})
+        finally:
+            os.chdir(os.path.dirname(db_path))
+
+
+def _time_case(name, db_path, repeat):
+    from db import connect
+    conn = connect(db_path)
+
+    queries = []
+    run = CASES[name](conn)
+    baseline = _peak_rss_kib()
+
+    def count(statement):
+        if not statement.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            queries.append(statement)
+
+    times = []
+    for i in range(repeat):
+        conn.set_trace_callback(count if i == 0 else None)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    conn.set_trace_callback(None)
+    conn.close()
+
+    peak = _peak_rss_kib()
+    return {
+        'wall_ms_min': round(min(times) * 1000, 3),
+        'wall_ms_median': round(statistics.median(times) * 1000, 3),
+        'peak_rss_kib': peak,
+        'rss_growth_kib': None if peak is None else peak - baseline,
+        'queries': len(queries),
+    }
+
+
+def run_case(name, db_path, repeat):
+    results = multiprocessing.Queue()
+    child = multiprocessing.Process(target=_measure, args=(name, db_path, repeat, results))
+    child.start()
+    try:
+        result = results.get()
+    finally:
+        child.join()
+    if 'error' in result:
+        raise RuntimeError(f"{name} failed:\n{result['error']}")
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print per-case timing ratios against baseline and return the regressions"""
+    before = {(r['case'], r['size']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'case':<16}{'size':>8}{'before ms':>12}{'after ms':>12}{'ratio':>8}")
+    for result in results['results']:
+        old = before.get((result['case'], result['size']))
+        if old is None:
+            continue
+        ratio = result['wall_ms_median'] / max(old['wall_ms_median'], 1e-6)
+        slower = result['wall_ms_median'] - old['wall_ms_median'] > MIN_REGRESSION_MS
+        regressed = ratio > threshold and slower
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{result['case']:<16}{result['size']:>8}{old['wall_ms_median']:>12.1f}"
+              f"{result['wall_ms_median']:>12.1f}{ratio:>8.2f}{flag}")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Health Monitor Pro hot paths headlessly")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="BP and BS readings per user in each generated database")
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case")
+    parser.add_argument('--data-dir', default='bench_data', help="where generated databases are kept")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="earlier results file to check for regressions")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = {
+        'commit': _git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'users': USERS,
+        'seed': SEED,
+        'repeat': args.repeat,
+        'results': [],
+    }
+    for size in args.sizes:
+        print(f"Preparing database with {size:,} readings per user...")
+        db_path = fixture_path(args.data_dir, size)
+        for name in args.cases:
+            result = dict(case=name, size=size, **run_case(name, db_path, args.repeat))
+            results['results'].append(result)
+            print(f"  {name:<16}{result['wall_ms_median']:>10.3f} ms  "
+                  f"{result['queries']:>4} queries  peak {result['peak_rss_kib'] or 0:,} KiB")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
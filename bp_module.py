@@ -1,48 +1,38 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import sqlite3
+from schema import migrate, reading_timestamp
+from db_worker import InlineExecutor
+from history_view import PagedHistoryView
+from importer import import_readings
 from datetime import datetime
-from fpdf import FPDF
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from PIL import Image, ImageTk
+from asset_manager import assets
+from rollups import DEFAULT_RANGE, TREND_RANGES, day_number, range_start, summarize
 import os
 
 class BPModule:
-    def __init__(self, db_conn):
+    REPORT_COLUMNS = ["ID", "Date", "Time", "Systolic", "Diastolic", "Pulse", "Notes", "Timestamp"]
+    
+    def __init__(self, db_conn, executor=None):
         self.conn = db_conn
+        self.executor = executor or InlineExecutor(db_conn)
+        self.trend_view = None
+        self.trend_window = None
+        self.trend_range = DEFAULT_RANGE
         self.create_tables()
-        self.load_images()
         
     def load_images(self):
-        try:
-            self.bp_icon = Image.open("assets/bp_icon.png").resize((30, 30))
-            self.bp_icon = ImageTk.PhotoImage(self.bp_icon)
-        except:
-            self.bp_icon = None
+        # Loaded when the interface is first shown, not at startup
+        self.bp_icon = assets.photo("bp_icon.png", (30, 30))
         
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bp_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                systolic INTEGER NOT NULL,
-                diastolic INTEGER NOT NULL,
-                pulse INTEGER,
-                notes TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        self.conn.commit()
+        migrate(self.conn)
 
     def show_interface(self, parent, user, on_back):
         self.parent = parent
         self.current_user = user
         self.on_back = on_back
+        self.load_images()
         
         for widget in parent.winfo_children():
             widget.destroy()
@@ -133,6 +123,8 @@ class BPModule:
                   command=self.generate_report).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Show Trends", style='Secondary.TButton',
                   command=self.show_trends).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Import File", style='Secondary.TButton',
+                  command=self.import_file).pack(side=tk.LEFT, padx=5)
         
         # History frame
         history_frame = ttk.LabelFrame(content_frame, text=" HISTORY ", style='Card.TFrame')
@@ -160,7 +152,7 @@ class BPModule:
         # Scrollbars
         y_scroll = ttk.Scrollbar(history_frame, orient=tk.VERTICAL, command=self.tree.yview)
         x_scroll = ttk.Scrollbar(history_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscroll=y_scroll.set, xscroll=x_scroll.set)
+        self.tree.configure(xscroll=x_scroll.set)
         
         # Layout
         self.tree.grid(row=0, column=0, sticky="nsew")
@@ -170,6 +162,12 @@ class BPModule:
         history_frame.grid_rowconfigure(0, weight=1)
         history_frame.grid_columnconfigure(0, weight=1)
         
+        # History is paged in as the user scrolls
+        self.history = PagedHistoryView(self.tree, y_scroll, self.executor, 'bp_readings',
+                                        ['id', 'date', 'time', 'systolic', 'diastolic', 'pulse', 'notes'],
+                                        user['id'])
+        self.history.build_jump_bar(history_frame).grid(row=2, column=0, columnspan=2, sticky="w", pady=(5, 0))
+        
         # Context menu
         self.context_menu = tk.Menu(parent, tearoff=0)
         self.context_menu.add_command(label="Delete Reading", command=self.delete_reading)
@@ -178,22 +176,26 @@ class BPModule:
         self.load_data()
 
     def load_data(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT id, date, time, systolic, diastolic, pulse, notes 
+        self.history.reload()
+
+    @staticmethod
+    def fetch_trend_rows(conn, user_id, since_ts=None):
+        """Readings oldest first, only those from since_ts on if given; served by the (user_id, ts) index"""
+        since = '' if since_ts is None else 'AND ts >= ?'
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, date, time, systolic, diastolic, pulse, notes, ts 
             FROM bp_readings 
-            WHERE user_id = ?
-            ORDER BY date DESC, time DESC
-        ''', (self.current_user['id'],))
-        
-        rows = cursor.fetchall()
-        self.report_data = pd.DataFrame(rows, columns=["ID", "Date", "Time", "Systolic", "Diastolic", "Pulse", "Notes"])
-        
-        for row in rows:
-            self.tree.insert("", tk.END, values=row)
+            WHERE user_id = ? {since}
+            ORDER BY ts, id
+        ''', (user_id,) if since_ts is None else (user_id, since_ts))
+        return cursor.fetchall()
+
+    def _fetch_trends(self, conn, user_id, range_label):
+        import pandas as pd
+        start = range_start(range_label)
+        rows = self.fetch_trend_rows(conn, user_id, None if start is None else day_number(start) * 86400)
+        return pd.DataFrame(rows, columns=self.REPORT_COLUMNS), summarize(conn, user_id, 'bp', start=start)
 
     def add_reading(self):
         date = self.date_entry.get()
@@ -210,24 +212,38 @@ class BPModule:
             systolic = int(systolic)
             diastolic = int(diastolic)
             pulse = int(pulse) if pulse else None
-            
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO bp_readings (user_id, date, time, systolic, diastolic, pulse, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (self.current_user['id'], date, time, systolic, diastolic, pulse, notes))
-            self.conn.commit()
-            
-            self.load_data()
+            ts = reading_timestamp(date, time)
+        except ValueError as e:
+            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
+            return
+        
+        values = (self.current_user['id'], date, time, systolic, diastolic, pulse, notes, ts)
+        self.executor.submit(self._insert_reading, values,
+                             on_done=lambda reading_id: self._on_reading_added(reading_id, values))
+
+    def _insert_reading(self, conn, values):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO bp_readings (user_id, date, time, systolic, diastolic, pulse, notes, ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', values)
+        conn.commit()
+        return cursor.lastrowid
+
+    def _on_reading_added(self, reading_id, values):
+        user_id, date, time, systolic, diastolic, pulse, notes, ts = values
+        
+        # Patch the visible page instead of reloading
+        if self.tree.winfo_exists():
+            self.history.insert_reading((reading_id, ts, reading_id, date, time, systolic, diastolic, pulse, notes))
+        self._refresh_trends()
+        if self.systolic_entry.winfo_exists():
             self.systolic_entry.delete(0, tk.END)
             self.diastolic_entry.delete(0, tk.END)
             self.pulse_entry.delete(0, tk.END)
             self.notes_entry.delete(0, tk.END)
-            
-            messagebox.showinfo("Success", "Reading added successfully")
-            
-        except ValueError as e:
-            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
+        
+        messagebox.showinfo("Success", "Reading added successfully")
 
     def delete_reading(self):
         selected = self.tree.selection()
@@ -235,14 +251,40 @@ class BPModule:
             return
         
         item = selected[0]
-        reading_id = self.tree.item(item, "values")[0]
+        _, reading_id = self.history.reading_key(item)
         
         if messagebox.askyesno("Confirm", "Delete this reading?"):
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM bp_readings WHERE id = ? AND user_id = ?", 
-                          (reading_id, self.current_user['id']))
-            self.conn.commit()
+            self.executor.submit(self._delete_reading, reading_id, self.current_user['id'],
+                                 on_done=lambda _: self._on_reading_deleted(reading_id))
+
+    def _delete_reading(self, conn, reading_id, user_id):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM bp_readings WHERE id = ? AND user_id = ?", 
+                      (reading_id, user_id))
+        conn.commit()
+
+    def _on_reading_deleted(self, reading_id):
+        self._refresh_trends()
+        if self.tree.winfo_exists():
+            self.history.remove_reading(reading_id)
+
+    def import_file(self):
+        path = filedialog.askopenfilename(
+            title="Import Blood Pressure Readings",
+            filetypes=[("Reading exports", "*.csv *.txt *.jsonl *.ndjson"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        self.executor.submit(import_readings, self.current_user['id'], 'bp', path,
+                             on_done=self._on_import_done,
+                             on_error=lambda e: messagebox.showerror("Import Failed", str(e)))
+
+    def _on_import_done(self, result):
+        # Imported rows can land anywhere in the history
+        if self.tree.winfo_exists():
             self.load_data()
+        self._refresh_trends()
+        messagebox.showinfo("Import Complete", result.summary())
 
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
@@ -251,81 +293,43 @@ class BPModule:
             self.context_menu.post(event.x_root, event.y_root)
 
     def generate_report(self):
-        if self.report_data.empty:
+        # The whole history is streamed into the PDF on the worker thread
+        self.executor.submit(self._generate_report, self.current_user['id'], self.current_user['username'],
+                             on_done=self._on_report_done,
+                             on_error=lambda e: messagebox.showerror("Report Failed", str(e)))
+
+    def _generate_report(self, conn, user_id, username):
+        from report_engine import write_report
+        full_name = conn.execute('SELECT full_name FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+        filename = f"bp_report_{full_name or username}_{datetime.now().strftime('%Y%m%d')}.pdf"
+        return filename, write_report(conn, user_id, 'bp', filename)
+
+    def _on_report_done(self, report):
+        filename, result = report
+        if result is None:
             messagebox.showwarning("No Data", "No data available to generate report")
             return
-        
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT full_name FROM users WHERE id = ?', (self.current_user['id'],))
-        user_name = cursor.fetchone()[0] or self.current_user['username']
-        
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        
-        # Header
-        pdf.set_fill_color(44, 62, 80)  # Dark blue
-        pdf.set_text_color(255, 255, 255)  # White
-        pdf.cell(0, 10, f"Blood Pressure Report for {user_name}", 0, 1, 'C', 1)
-        pdf.ln(10)
-        
-        # Summary statistics
-        pdf.set_font("Arial", 'B', 12)
-        pdf.set_text_color(0, 0, 0)  # Black
-        pdf.cell(0, 10, "Summary Statistics", 0, 1)
-        pdf.set_font("Arial", size=10)
-        
-        stats = self.report_data[['Systolic', 'Diastolic', 'Pulse']].describe().round(1)
-        for index, row in stats.iterrows():
-            pdf.cell(0, 6, f"{index}: Systolic={row['Systolic']}, Diastolic={row['Diastolic']}, Pulse={row['Pulse']}", 0, 1)
-        
-        pdf.ln(10)
-        
-        # Recent readings table
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Recent Readings", 0, 1)
-        pdf.set_font("Arial", size=8)
-        
-        # Table header
-        pdf.set_fill_color(200, 220, 255)  # Light blue
-        headers = ["Date", "Time", "Systolic", "Diastolic", "Pulse", "Notes"]
-        widths = [25, 20, 20, 20, 15, 90]
-        
-        for header, width in zip(headers, widths):
-            pdf.cell(width, 6, header, 1, 0, 'C', 1)
-        pdf.ln()
-        
-        # Table rows
-        pdf.set_fill_color(255, 255, 255)  # White
-        for _, row in self.report_data.head(20).iterrows():
-            pdf.cell(25, 6, str(row['Date']), 1)
-            pdf.cell(20, 6, str(row['Time']), 1)
-            
-            # Color code based on BP values
-            systolic = row['Systolic']
-            diastolic = row['Diastolic']
-            
-            if systolic >= 140 or diastolic >= 90:
-                pdf.set_text_color(255, 0, 0)  # Red for high
-            elif systolic >= 120 or diastolic >= 80:
-                pdf.set_text_color(255, 165, 0)  # Orange for elevated
-            else:
-                pdf.set_text_color(0, 128, 0)  # Green for normal
-                
-            pdf.cell(20, 6, str(systolic), 1)
-            pdf.cell(20, 6, str(diastolic), 1)
-            pdf.set_text_color(0, 0, 0)  # Black
-            
-            pdf.cell(15, 6, str(row['Pulse']), 1)
-            pdf.cell(90, 6, str(row['Notes'])[:40], 1)
-            pdf.ln()
-        
-        filename = f"bp_report_{user_name}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        pdf.output(filename)
-        messagebox.showinfo("Report Generated", f"Report saved as {filename}")
+        messagebox.showinfo("Report Generated", f"Report saved as {filename}\n\n{result.summary()}")
 
     def show_trends(self):
-        if self.report_data.empty:
+        # One trend window per module; it follows new and deleted readings
+        if self.trend_view is not None:
+            self.trend_window.lift()
+            return
+        self._load_trends(self._show_trends)
+
+    def _load_trends(self, on_done):
+        # Only the selected range is read, with its stats from the rollups
+        self.executor.submit(self._fetch_trends, self.current_user['id'], self.trend_range,
+                             on_done=on_done)
+
+    def _show_trends(self, trends):
+        from trend_renderer import BPTrendLayout, TrendWindow
+        df, stats = trends
+        if self.trend_view is not None:
+            self.trend_view.refresh(df, stats)
+            return
+        if df.empty and TREND_RANGES[self.trend_range] is None:
             messagebox.showwarning("No Data", "No data available to show trends")
             return
         
@@ -334,67 +338,41 @@ class BPModule:
         trend_window.geometry("900x700")
         trend_window.resizable(True, True)
         
-        # Apply theme
-        try:
-            plt.style.use('seaborn')
-        except:
-            plt.style.use('ggplot')
-        
-        df = self.report_data.copy()
-        df['DateTime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'])
-        df = df.sort_values('DateTime')
-        
-        # Create figure with subplots
-        fig = plt.figure(figsize=(10, 8))
-        gs = fig.add_gridspec(3, 1, height_ratios=[2, 2, 1])
-        
-        ax1 = fig.add_subplot(gs[0])
-        ax2 = fig.add_subplot(gs[1])
-        ax3 = fig.add_subplot(gs[2])
-        
-        # Blood pressure plot
-        ax1.plot(df['DateTime'], df['Systolic'], label='Systolic', color='#e74c3c', linewidth=2, marker='o')
-        ax1.plot(df['DateTime'], df['Diastolic'], label='Diastolic', color='#3498db', linewidth=2, marker='o')
-        
-        # Add healthy range bands
-        ax1.axhspan(90, 120, color='#2ecc71', alpha=0.1, label='Normal')
-        ax1.axhspan(120, 140, color='#f39c12', alpha=0.1, label='Elevated')
-        ax1.axhspan(140, 200, color='#e74c3c', alpha=0.1, label='High')
-        
-        ax1.set_ylabel('mmHg', fontweight='bold')
-        ax1.set_title('Blood Pressure Trend', fontweight='bold')
-        ax1.legend(loc='upper left')
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        
-        # Pulse plot
-        ax2.plot(df['DateTime'], df['Pulse'], label='Pulse', color='#9b59b6', linewidth=2, marker='o')
-        ax2.set_ylabel('BPM', fontweight='bold')
-        ax2.set_title('Pulse Trend', fontweight='bold')
-        ax2.grid(True, linestyle='--', alpha=0.7)
-        
-        # Summary statistics
-        stats = df[['Systolic', 'Diastolic', 'Pulse']].describe().round(1)
-        stats_text = []
-        for col in ['Systolic', 'Diastolic', 'Pulse']:
-            stats_text.append(
-                f"{col}: Min={stats.loc['min', col]}, Max={stats.loc['max', col]}, "
-                f"Avg={stats.loc['mean', col]}"
-            )
-        
-        ax3.axis('off')
-        ax3.text(0.05, 0.5, "\n".join(stats_text), 
-                fontsize=10, va='center', ha='left')
-        
-        plt.tight_layout()
-        
-        # Embed plot in Tkinter window
-        canvas = FigureCanvasTkAgg(fig, master=trend_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # Pooled, pre-styled figure; handed back when the window closes
+        self.trend_window = trend_window
+        self.trend_view = TrendWindow(trend_window, BPTrendLayout)
+        self.trend_view.widget.pack(fill=tk.BOTH, expand=True)
+        self.trend_view.show(df, stats)
+        trend_window.bind('<Destroy>', lambda event: self._on_trends_closed(event, trend_window))
         
         # Toolbar and close button
         toolbar_frame = ttk.Frame(trend_window)
         toolbar_frame.pack(fill=tk.X, padx=10, pady=10)
         
+        self.trend_view.build_range_bar(toolbar_frame, self.trend_range,
+                                        self._on_trend_range).pack(side=tk.LEFT)
         ttk.Button(toolbar_frame, text="Close", 
-                  command=trend_window.destroy).pack(side=tk.RIGHT)
\ No newline at end of file
+                  command=trend_window.destroy).pack(side=tk.RIGHT)
+
+    def _on_trends_closed(self, event, window):
+        # <Destroy> also fires for every child of the window
+        if event.widget is window and self.trend_view is not None:
+            self.trend_view.release()
+            self.trend_view = None
+            self.trend_window = None
+
+    def _on_trend_range(self, label):
+        self.trend_range = label
+        self._load_trends(self._show_trend_range)
+
+    def _show_trend_range(self, trends):
+        if self.trend_view is not None:
+            self.trend_view.show(*trends)
+
+    def _refresh_trends(self):
+        if self.trend_view is not None:
+            self._load_trends(self._update_trends)
+
+    def _update_trends(self, trends):
+        if self.trend_view is not None:
+            self.trend_view.refresh(*trends)
\ No newline at end of file
@@ -1,48 +1,38 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import sqlite3
+from schema import migrate, reading_timestamp
+from db_worker import InlineExecutor
+from history_view import PagedHistoryView
+from importer import import_readings
 from datetime import datetime
-from fpdf import FPDF
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from PIL import Image, ImageTk
+from asset_manager import assets
+from rollups import DEFAULT_RANGE, TREND_RANGES, day_number, range_start, summarize
 import os
 
 class BSModule:
-    def __init__(self, db_conn):
+    REPORT_COLUMNS = ["ID", "Date", "Time", "Glucose", "Type", "Meal", "Notes", "Timestamp"]
+    
+    def __init__(self, db_conn, executor=None):
         self.conn = db_conn
+        self.executor = executor or InlineExecutor(db_conn)
+        self.trend_view = None
+        self.trend_window = None
+        self.trend_range = DEFAULT_RANGE
         self.create_tables()
-        self.load_images()
         
     def load_images(self):
-        try:
-            self.bs_icon = Image.open("assets/bs_icon.png").resize((30, 30))
-            self.bs_icon = ImageTk.PhotoImage(self.bs_icon)
-        except:
-            self.bs_icon = None
+        # Loaded when the interface is first shown, not at startup
+        self.bs_icon = assets.photo("bs_icon.png", (30, 30))
         
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bs_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                glucose_level INTEGER NOT NULL,
-                measurement_type TEXT NOT NULL,
-                meal_context TEXT,
-                notes TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        ''')
-        self.conn.commit()
+        migrate(self.conn)
 
     def show_interface(self, parent, user, on_back):
         self.parent = parent
         self.current_user = user
         self.on_back = on_back
+        self.load_images()
         
         for widget in parent.winfo_children():
             widget.destroy()
@@ -137,6 +127,8 @@ class BSModule:
                   command=self.generate_report).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Show Trends", style='Secondary.TButton',
                   command=self.show_trends).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Import File", style='Secondary.TButton',
+                  command=self.import_file).pack(side=tk.LEFT, padx=5)
         
         # History frame
         history_frame = ttk.LabelFrame(content_frame, text=" HISTORY ", style='Card.TFrame')
@@ -165,7 +157,7 @@ class BSModule:
         # Scrollbars
         y_scroll = ttk.Scrollbar(history_frame, orient=tk.VERTICAL, command=self.tree.yview)
         x_scroll = ttk.Scrollbar(history_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscroll=y_scroll.set, xscroll=x_scroll.set)
+        self.tree.configure(xscroll=x_scroll.set)
         
         # Layout
         self.tree.grid(row=0, column=0, sticky="nsew")
@@ -175,6 +167,12 @@ class BSModule:
         history_frame.grid_rowconfigure(0, weight=1)
         history_frame.grid_columnconfigure(0, weight=1)
         
+        # History is paged in as the user scrolls
+        self.history = PagedHistoryView(self.tree, y_scroll, self.executor, 'bs_readings',
+                                        ['id', 'date', 'time', 'glucose_level', 'measurement_type', 'meal_context', 'notes'],
+                                        user['id'])
+        self.history.build_jump_bar(history_frame).grid(row=2, column=0, columnspan=2, sticky="w", pady=(5, 0))
+        
         # Context menu
         self.context_menu = tk.Menu(parent, tearoff=0)
         self.context_menu.add_command(label="Delete Reading", command=self.delete_reading)
@@ -183,22 +181,26 @@ class BSModule:
         self.load_data()
 
     def load_data(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT id, date, time, glucose_level, measurement_type, meal_context, notes 
+        self.history.reload()
+
+    @staticmethod
+    def fetch_trend_rows(conn, user_id, since_ts=None):
+        """Readings oldest first, only those from since_ts on if given; served by the (user_id, ts) index"""
+        since = '' if since_ts is None else 'AND ts >= ?'
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, date, time, glucose_level, measurement_type, meal_context, notes, ts 
             FROM bs_readings 
-            WHERE user_id = ?
-            ORDER BY date DESC, time DESC
-        ''', (self.current_user['id'],))
-        
-        rows = cursor.fetchall()
-        self.report_data = pd.DataFrame(rows, columns=["ID", "Date", "Time", "Glucose", "Type", "Meal", "Notes"])
-        
-        for row in rows:
-            self.tree.insert("", tk.END, values=row)
+            WHERE user_id = ? {since}
+            ORDER BY ts, id
+        ''', (user_id,) if since_ts is None else (user_id, since_ts))
+        return cursor.fetchall()
+
+    def _fetch_trends(self, conn, user_id, range_label):
+        import pandas as pd
+        start = range_start(range_label)
+        rows = self.fetch_trend_rows(conn, user_id, None if start is None else day_number(start) * 86400)
+        return pd.DataFrame(rows, columns=self.REPORT_COLUMNS), summarize(conn, user_id, 'bs', start=start)
 
     def add_reading(self):
         date = self.date_entry.get()
@@ -217,24 +219,38 @@ class BSModule:
                 raise ValueError("Measurement type is required")
             
             glucose = int(glucose)
-            
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT INTO bs_readings (user_id, date, time, glucose_level, measurement_type, meal_context, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (self.current_user['id'], date, time, glucose, measurement_type, meal_context, notes))
-            self.conn.commit()
-            
-            self.load_data()
+            ts = reading_timestamp(date, time)
+        except ValueError as e:
+            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
+            return
+        
+        values = (self.current_user['id'], date, time, glucose, measurement_type, meal_context, notes, ts)
+        self.executor.submit(self._insert_reading, values,
+                             on_done=lambda reading_id: self._on_reading_added(reading_id, values))
+
+    def _insert_reading(self, conn, values):
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO bs_readings (user_id, date, time, glucose_level, measurement_type, meal_context, notes, ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', values)
+        conn.commit()
+        return cursor.lastrowid
+
+    def _on_reading_added(self, reading_id, values):
+        user_id, date, time, glucose, measurement_type, meal_context, notes, ts = values
+        
+        # Patch the visible page instead of reloading
+        if self.tree.winfo_exists():
+            self.history.insert_reading((reading_id, ts, reading_id, date, time, glucose, measurement_type, meal_context, notes))
+        self._refresh_trends()
+        if self.glucose_entry.winfo_exists():
             self.glucose_entry.delete(0, tk.END)
             self.measurement_type.set('')
             self.meal_context.set('')
             self.notes_entry.delete(0, tk.END)
-            
-            messagebox.showinfo("Success", "Reading added successfully")
-            
-        except ValueError as e:
-            messagebox.showerror("Input Error", f"Invalid input: {str(e)}")
+        
+        messagebox.showinfo("Success", "Reading added successfully")
 
     def delete_reading(self):
         selected = self.tree.selection()
@@ -242,14 +258,40 @@ class BSModule:
             return
         
         item = selected[0]
-        reading_id = self.tree.item(item, "values")[0]
+        _, reading_id = self.history.reading_key(item)
         
         if messagebox.askyesno("Confirm", "Delete this reading?"):
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM bs_readings WHERE id = ? AND user_id = ?", 
-                          (reading_id, self.current_user['id']))
-            self.conn.commit()
+            self.executor.submit(self._delete_reading, reading_id, self.current_user['id'],
+                                 on_done=lambda _: self._on_reading_deleted(reading_id))
+
+    def _delete_reading(self, conn, reading_id, user_id):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM bs_readings WHERE id = ? AND user_id = ?", 
+                      (reading_id, user_id))
+        conn.commit()
+
+    def _on_reading_deleted(self, reading_id):
+        self._refresh_trends()
+        if self.tree.winfo_exists():
+            self.history.remove_reading(reading_id)
+
+    def import_file(self):
+        path = filedialog.askopenfilename(
+            title="Import Blood Sugar Readings",
+            filetypes=[("Reading exports", "*.csv *.txt *.jsonl *.ndjson"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        self.executor.submit(import_readings, self.current_user['id'], 'bs', path,
+                             on_done=self._on_import_done,
+                             on_error=lambda e: messagebox.showerror("Import Failed", str(e)))
+
+    def _on_import_done(self, result):
+        # Imported rows can land anywhere in the history
+        if self.tree.winfo_exists():
             self.load_data()
+        self._refresh_trends()
+        messagebox.showinfo("Import Complete", result.summary())
 
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
@@ -258,111 +300,43 @@ class BSModule:
             self.context_menu.post(event.x_root, event.y_root)
 
     def generate_report(self):
-        if self.report_data.empty:
+        # The whole history is streamed into the PDF on the worker thread
+        self.executor.submit(self._generate_report, self.current_user['id'], self.current_user['username'],
+                             on_done=self._on_report_done,
+                             on_error=lambda e: messagebox.showerror("Report Failed", str(e)))
+
+    def _generate_report(self, conn, user_id, username):
+        from report_engine import write_report
+        full_name = conn.execute('SELECT full_name FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+        filename = f"bs_report_{full_name or username}_{datetime.now().strftime('%Y%m%d')}.pdf"
+        return filename, write_report(conn, user_id, 'bs', filename)
+
+    def _on_report_done(self, report):
+        filename, result = report
+        if result is None:
             messagebox.showwarning("No Data", "No data available to generate report")
             return
-        
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT full_name, diabetes_type FROM users WHERE id = ?', (self.current_user['id'],))
-        user_data = cursor.fetchone()
-        user_name = user_data[0] or self.current_user['username']
-        diabetes_type = user_data[1] or "Not specified"
-        
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        
-        # Header
-        pdf.set_fill_color(44, 62, 80)  # Dark blue
-        pdf.set_text_color(255, 255, 255)  # White
-        pdf.cell(0, 10, f"Blood Sugar Report for {user_name}", 0, 1, 'C', 1)
-        pdf.cell(0, 10, f"Diabetes Type: {diabetes_type}", 0, 1, 'C', 1)
-        pdf.ln(10)
-        
-        # Summary statistics
-        pdf.set_font("Arial", 'B', 12)
-        pdf.set_text_color(0, 0, 0)  # Black
-        pdf.cell(0, 10, "Summary Statistics", 0, 1)
-        pdf.set_font("Arial", size=10)
-        
-        stats = self.report_data[['Glucose']].describe().round(1)
-        for index, row in stats.iterrows():
-            pdf.cell(0, 6, f"{index}: {row['Glucose']} mg/dL", 0, 1)
-        
-        pdf.ln(5)
-        
-        # Glucose interpretation
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Glucose Level Interpretation", 0, 1)
-        pdf.set_font("Arial", size=10)
-        
-        interpretation = [
-            "Normal fasting glucose: 70-99 mg/dL",
-            "Prediabetes (fasting): 100-125 mg/dL",
-            "Diabetes (fasting): 126+ mg/dL",
-            "Normal post-meal (2h): <140 mg/dL",
-            "Prediabetes post-meal: 140-199 mg/dL",
-            "Diabetes post-meal: 200+ mg/dL"
-        ]
-        
-        for line in interpretation:
-            pdf.cell(0, 6, line, 0, 1)
-        
-        pdf.ln(10)
-        
-        # Recent readings table
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Recent Readings", 0, 1)
-        pdf.set_font("Arial", size=8)
-        
-        # Table header
-        pdf.set_fill_color(200, 220, 255)  # Light blue
-        headers = ["Date", "Time", "Glucose", "Type", "Meal", "Notes"]
-        widths = [25, 20, 25, 30, 25, 65]
-        
-        for header, width in zip(headers, widths):
-            pdf.cell(width, 6, header, 1, 0, 'C', 1)
-        pdf.ln()
-        
-        # Table rows
-        pdf.set_fill_color(255, 255, 255)  # White
-        for _, row in self.report_data.head(20).iterrows():
-            pdf.cell(25, 6, str(row['Date']), 1)
-            pdf.cell(20, 6, str(row['Time']), 1)
-            
-            # Color code based on glucose values
-            glucose = row['Glucose']
-            measurement_type = row['Type']
-            
-            if measurement_type == "Fasting":
-                if glucose >= 126:
-                    pdf.set_text_color(255, 0, 0)  # Red for diabetic
-                elif glucose >= 100:
-                    pdf.set_text_color(255, 165, 0)  # Orange for prediabetic
-                else:
-                    pdf.set_text_color(0, 128, 0)  # Green for normal
-            else:  # Post-meal or random
-                if glucose >= 200:
-                    pdf.set_text_color(255, 0, 0)
-                elif glucose >= 140:
-                    pdf.set_text_color(255, 165, 0)
-                else:
-                    pdf.set_text_color(0, 128, 0)
-                    
-            pdf.cell(25, 6, str(glucose), 1)
-            pdf.set_text_color(0, 0, 0)  # Black
-            
-            pdf.cell(30, 6, str(row['Type']), 1)
-            pdf.cell(25, 6, str(row['Meal']), 1)
-            pdf.cell(65, 6, str(row['Notes'])[:35], 1)
-            pdf.ln()
-        
-        filename = f"bs_report_{user_name}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        pdf.output(filename)
-        messagebox.showinfo("Report Generated", f"Report saved as {filename}")
+        messagebox.showinfo("Report Generated", f"Report saved as {filename}\n\n{result.summary()}")
 
     def show_trends(self):
-        if self.report_data.empty:
+        # One trend window per module; it follows new and deleted readings
+        if self.trend_view is not None:
+            self.trend_window.lift()
+            return
+        self._load_trends(self._show_trends)
+
+    def _load_trends(self, on_done):
+        # Only the selected range is read, with its stats from the rollups
+        self.executor.submit(self._fetch_trends, self.current_user['id'], self.trend_range,
+                             on_done=on_done)
+
+    def _show_trends(self, trends):
+        from trend_renderer import BSTrendLayout, TrendWindow
+        df, stats = trends
+        if self.trend_view is not None:
+            self.trend_view.refresh(df, stats)
+            return
+        if df.empty and TREND_RANGES[self.trend_range] is None:
             messagebox.showwarning("No Data", "No data available to show trends")
             return
         
@@ -371,78 +345,41 @@ class BSModule:
         trend_window.geometry("900x700")
         trend_window.resizable(True, True)
         
-        # Apply theme
-        try:
-            plt.style.use('seaborn')
-        except:
-            plt.style.use('ggplot')
-        
-        df = self.report_data.copy()
-        df['DateTime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'])
-        df = df.sort_values('DateTime')
-        
-        # Create figure with subplots
-        fig = plt.figure(figsize=(10, 8))
-        gs = fig.add_gridspec(3, 1, height_ratios=[3, 2, 1])
-        
-        ax1 = fig.add_subplot(gs[0])
-        ax2 = fig.add_subplot(gs[1])
-        ax3 = fig.add_subplot(gs[2])
-        
-        # Define colors for different measurement types
-        colors = {
-            'Fasting': '#3498db',
-            'Before Meal': '#9b59b6',
-            'After Meal': '#e74c3c',
-            'Before Bed': '#f39c12',
-            'Random': '#2ecc71'
-        }
-        
-        # Glucose plot with different colors for measurement types
-        for m_type, group in df.groupby('Type'):
-            ax1.plot(group['DateTime'], group['Glucose'], 
-                    'o-', label=m_type, color=colors.get(m_type, '#333333'), 
-                    markersize=5, linewidth=2)
-        
-        # Add healthy range bands
-        ax1.axhspan(70, 99, color='#2ecc71', alpha=0.1, label='Normal')
-        ax1.axhspan(100, 125, color='#f39c12', alpha=0.1, label='Prediabetes')
-        ax1.axhspan(126, 300, color='#e74c3c', alpha=0.1, label='Diabetes')
-        
-        ax1.set_ylabel('Glucose (mg/dL)', fontweight='bold')
-        ax1.set_title('Blood Sugar Trend', fontweight='bold')
-        ax1.legend(loc='upper left')
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        
-        # Measurement type distribution
-        type_counts = df['Type'].value_counts()
-        ax2.bar(type_counts.index, type_counts.values, 
-               color=[colors.get(t, '#333333') for t in type_counts.index])
-        ax2.set_ylabel('Count', fontweight='bold')
-        ax2.set_title('Measurement Distribution', fontweight='bold')
-        
-        # Summary statistics
-        stats = df[['Glucose']].describe().round(1)
-        stats_text = [
-            f"Glucose: Min={stats.loc['min', 'Glucose']}, Max={stats.loc['max', 'Glucose']}",
-            f"Average: {stats.loc['mean', 'Glucose']}",
-            f"Readings: {len(df)}"
-        ]
-        
-        ax3.axis('off')
-        ax3.text(0.05, 0.5, "\n".join(stats_text), 
-                fontsize=10, va='center', ha='left')
-        
-        plt.tight_layout()
-        
-        # Embed plot in Tkinter window
-        canvas = FigureCanvasTkAgg(fig, master=trend_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        # Pooled, pre-styled figure; handed back when the window closes
+        self.trend_window = trend_window
+        self.trend_view = TrendWindow(trend_window, BSTrendLayout)
+        self.trend_view.widget.pack(fill=tk.BOTH, expand=True)
+        self.trend_view.show(df, stats)
+        trend_window.bind('<Destroy>', lambda event: self._on_trends_closed(event, trend_window))
         
         # Toolbar and close button
         toolbar_frame = ttk.Frame(trend_window)
         toolbar_frame.pack(fill=tk.X, padx=10, pady=10)
         
+        self.trend_view.build_range_bar(toolbar_frame, self.trend_range,
+                                        self._on_trend_range).pack(side=tk.LEFT)
         ttk.Button(toolbar_frame, text="Close", 
-                  command=trend_window.destroy).pack(side=tk.RIGHT)
\ No newline at end of file
+                  command=trend_window.destroy).pack(side=tk.RIGHT)
+
+    def _on_trends_closed(self, event, window):
+        # <Destroy> also fires for every child of the window
+        if event.widget is window and self.trend_view is not None:
+            self.trend_view.release()
+            self.trend_view = None
+            self.trend_window = None
+
+    def _on_trend_range(self, label):
+        self.trend_range = label
+        self._load_trends(self._show_trend_range)
+
+    def _show_trend_range(self, trends):
+        if self.trend_view is not None:
+            self.trend_view.show(*trends)
+
+    def _refresh_trends(self):
+        if self.trend_view is not None:
+            self._load_trends(self._update_trends)
+
+    def _update_trends(self, trends):
+        if self.trend_view is not None:
+            self.trend_view.refresh(*trends)
\ No newline at end of file
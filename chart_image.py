@@ -0,0 +1,63 @@
+from io import BytesIO
+import base64
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Charts for the prediction and trend windows are drawn at the size they
+# are shown and kept as raw RGBA pixels. Showing one is a straight copy
+# into a PhotoImage, with no PNG encode, decode or resample. PNG or base64
+# is only produced when a chart is exported.
+#
+# Figures here are made without pyplot, so they hold no global state and
+# are freed as soon as the ChartImage has copied their pixels.
+
+CHART_SIZE = (700, 400)
+CHART_DPI = 100
+
+
+def new_figure(size=CHART_SIZE, dpi=CHART_DPI):
+    """A figure of exactly size pixels, attached to an Agg canvas"""
+    fig = Figure(figsize=(size[0] / dpi, size[1] / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+class ChartImage:
+    def __init__(self, width, height, rgba):
+        self.width = width
+        self.height = height
+        self.rgba = rgba
+        self._photo = None
+
+    @classmethod
+    def from_figure(cls, fig):
+        fig.canvas.draw()
+        width, height = fig.canvas.get_width_height()
+        return cls(width, height, bytes(fig.canvas.buffer_rgba()))
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def to_pil(self):
+        from PIL import Image
+        return Image.frombuffer('RGBA', self.size, self.rgba, 'raw', 'RGBA', 0, 1)
+
+    def photo(self):
+        """A PhotoImage of the chart, made once; call from the Tk thread"""
+        if self._photo is None:
+            from PIL import ImageTk
+            self._photo = ImageTk.PhotoImage(self.to_pil())
+        return self._photo
+
+    def to_png(self):
+        img = BytesIO()
+        self.to_pil().save(img, format='PNG')
+        return img.getvalue()
+
+    def to_base64(self):
+        return base64.b64encode(self.to_png()).decode('utf-8')
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_png())
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+from schema import migrate
+from aggregates import register
+
+DB_PATH = 'health_monitor.db'
+
+# Connection tuning applied to every connection handed out by this module
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
+_local = threading.local()
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def configure(conn, readonly=False):
+    """Apply the standard pragmas to a freshly opened connection"""
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    if not readonly:
+        # WAL lets history, summary and prediction reads run alongside a
+        # writer; NORMAL sync is durable across app crashes in WAL mode.
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE_BYTES}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA foreign_keys = ON')
+    # stddev() and quantile() for summaries computed inside SQLite
+    register(conn)
+    return conn
+
+
+def connect(path=DB_PATH, readonly=False):
+    """Open a new tuned connection; the schema is migrated on first write open"""
+    if readonly:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True,
+                               timeout=BUSY_TIMEOUT_MS / 1000)
+        return configure(conn, readonly=True)
+
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+    configure(conn)
+    with _migrate_lock:
+        if path not in _migrated:
+            migrate(conn)
+            _migrated.add(path)
+    return conn
+
+
+def get_connection(path=DB_PATH):
+    """Return this thread's shared connection to path, opening it if needed"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = connect(path)
+    return conn
+
+
+def close_connection(path=DB_PATH):
+    connections = getattr(_local, 'connections', {})
+    conn = connections.pop(path, None)
+    if conn is not None:
+        conn.close()
@@ -0,0 +1,109 @@
+import queue
+import threading
+from concurrent.futures import Future
+from tkinter import messagebox
+from db import DB_PATH, get_connection
+
+# Jobs are plain functions called as fn(conn, *args) on a worker thread
+# that owns its own connection. Results travel back through a queue that
+# the Tk main loop drains with root.after, so on_done/on_error callbacks
+# always run on the UI thread and may touch widgets directly.
+
+
+def show_db_error(error):
+    messagebox.showerror("Database Error", str(error))
+
+
+class QueryExecutor:
+    def __init__(self, root, path=DB_PATH, workers=2, poll_interval=15):
+        self.root = root
+        self.path = path
+        self.poll_interval = poll_interval
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._pending = 0
+        self._polling = False
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name=f"db-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        conn = get_connection(self.path)
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            fn, args, future, on_done, on_error = job
+            if not future.set_running_or_notify_cancel():
+                self._results.put((future, on_done, on_error))
+                continue
+            try:
+                future.set_result(fn(conn, *args))
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                future.set_exception(e)
+            self._results.put((future, on_done, on_error))
+        conn.close()
+
+    def submit(self, fn, *args, on_done=None, on_error=show_db_error):
+        future = Future()
+        self._pending += 1
+        self._jobs.put((fn, args, future, on_done, on_error))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_interval, self._poll)
+        return future
+
+    def _poll(self):
+        while True:
+            try:
+                future, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            _deliver(future, on_done, on_error)
+
+        if self._pending:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._jobs.put(None)
+
+
+class InlineExecutor:
+    """Runs jobs immediately on the caller's connection (scripts, tests)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def submit(self, fn, *args, on_done=None, on_error=show_db_error):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn(self.conn, *args))
+        except Exception as e:
+            if self.conn.in_transaction:
+                self.conn.rollback()
+            future.set_exception(e)
+        _deliver(future, on_done, on_error)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def _deliver(future, on_done, on_error):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        if on_error is not None:
+            on_error(error)
+    elif on_done is not None:
+        on_done(future.result())
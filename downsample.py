@@ -0,0 +1,42 @@
+import numpy as np
+
+# Level-of-detail reduction for line charts. A chart can only show so much
+# per pixel column, so decimate() splits the x range into one bucket per
+# column and keeps each bucket's first, last, lowest and highest point
+# (the M4 scheme). The drawn line then looks the same as the full series:
+# single-reading spikes such as a hypoglycemic low are always kept, but a
+# chart never draws more than four points per column.
+
+POINTS_PER_COLUMN = 4
+
+
+def decimate(x, y, columns, x_range=None):
+    """Indices of the points of (x, y) to draw across columns pixel columns
+
+    x must be sorted and y free of NaN. x_range is the (low, high) x span the
+    columns cover, by default that of x. All indices are returned when the
+    series is already small enough.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    columns = max(int(columns), 1)
+    if n <= POINTS_PER_COLUMN * columns:
+        return np.arange(n)
+
+    low, high = x_range if x_range is not None else (x[0], x[-1])
+    if high <= low:
+        return np.unique([0, int(np.argmin(y)), int(np.argmax(y)), n - 1])
+    bucket = np.clip(((x - low) / (high - low) * columns).astype(np.int64), 0, columns - 1)
+
+    # x is sorted, so each bucket is one contiguous run of points
+    first = np.r_[True, bucket[1:] != bucket[:-1]]
+    starts = np.flatnonzero(first)
+    ends = np.r_[starts[1:], n] - 1
+    run = np.cumsum(first) - 1
+    keep = [starts, ends]
+    for extreme in (np.minimum, np.maximum):
+        # First point of each run that reaches the run's extreme
+        hits = np.flatnonzero(y == extreme.reduceat(y, starts)[run])
+        keep.append(hits[np.r_[True, run[hits][1:] != run[hits][:-1]]])
+    return np.unique(np.concatenate(keep))
@@ -1,169 +1,233 @@
+import argparse
+import hashlib
 import sqlite3
-import random
+import sys
+import time
+import numpy as np
 from datetime import datetime, timedelta
-import hashlib
+from db import DB_PATH, connect
+from schema import create_rollup_triggers, drop_rollup_triggers, rebuild_rollups
+
+# Synthetic data for demos and load testing. Values for every reading are
+# drawn with NumPy in one pass per batch of users and written with
+# executemany inside a single transaction, so fixtures with millions of
+# readings take seconds. The same --seed and --end always produce the same
+# data; without --end the readings end now, so they differ from day to day.
+
+DEMO_USERS = [
+    ("john_doe", "password123", "John Doe", 45, "Male", "Type 2"),
+    ("jane_smith", "securepass", "Jane Smith", 32, "Female", "Type 1"),
+    ("mike_johnson", "test1234", "Mike Johnson", 58, "Male", "Prediabetes"),
+    ("sarah_williams", "health123", "Sarah Williams", 29, "Female", "Gestational"),
+    ("david_brown", "demo123", "David Brown", 50, "Male", "None")
+]
+
+DIABETES_TYPES = ["Type 1", "Type 2", "Prediabetes", "Gestational", "None"]
+MEASUREMENT_TYPES = ["Fasting", "Before Meal", "After Meal", "Before Bed", "Random"]
+MEAL_CONTEXTS = ["Breakfast", "Lunch", "Dinner"]
+BP_NOTES = ["", "After exercise", "Before bed", "Morning reading", ""]
+BS_NOTES = ["", "Felt dizzy", "After workout", "Stressful day", ""]
+
+# Glucose range (low, high) by diabetes type, for Fasting / After Meal / other
+GLUCOSE_RANGES = {
+    "Type 1": ((80, 180), (120, 250), (70, 200)),
+    "Type 2": ((100, 160), (140, 220), (90, 180)),
+    "Prediabetes": ((90, 130), (120, 180), (80, 150)),
+    "Gestational": ((70, 100), (80, 140), (70, 120)),
+    "None": ((70, 100), (80, 140), (70, 120)),
+}
+
+# Readings are taken between these hours
+WAKING_START_HOUR = 6
+WAKING_HOURS = 17
+
+ROWS_PER_BATCH = 500000
+
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-def generate_users(conn):
-    users = [
-        ("john_doe", hash_password("password123"), "John Doe", 45, "Male", "Type 2"),
-        ("jane_smith", hash_password("securepass"), "Jane Smith", 32, "Female", "Type 1"),
-        ("mike_johnson", hash_password("test1234"), "Mike Johnson", 58, "Male", "Prediabetes"),
-        ("sarah_williams", hash_password("health123"), "Sarah Williams", 29, "Female", "Gestational"),
-        ("david_brown", hash_password("demo123"), "David Brown", 50, "Male", "None")
-    ]
-    
+
+def user_profiles(count, rng):
+    """Return (username, password, full_name, age, gender, diabetes_type) tuples"""
+    users = [(u, hash_password(p), n, a, g, d) for u, p, n, a, g, d in DEMO_USERS[:count]]
+    extra = count - len(users)
+    if extra > 0:
+        ages = rng.integers(18, 86, extra)
+        genders = rng.choice(["Male", "Female"], extra)
+        types = rng.choice(DIABETES_TYPES, extra)
+        for i in range(extra):
+            n = len(DEMO_USERS) + i + 1
+            users.append((f"user{n}", hash_password(f"password{n}"), f"Test User {n}",
+                          int(ages[i]), str(genders[i]), str(types[i])))
+    return users
+
+
+def generate_users(conn, count, rng):
+    """Insert count users and return {user_id: diabetes_type} for them"""
     cursor = conn.cursor()
+    last_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]
     cursor.executemany('''
         INSERT INTO users (username, password, full_name, age, gender, diabetes_type)
         VALUES (?, ?, ?, ?, ?, ?)
-    ''', users)
-    conn.commit()
+    ''', user_profiles(count, rng))
+    cursor.execute('SELECT id, diabetes_type FROM users WHERE id > ? ORDER BY id', (last_id,))
+    return dict(cursor.fetchall())
 
-def generate_bp_readings(conn, user_id, num_readings=30):
-    cursor = conn.cursor()
-    base_date = datetime.now() - timedelta(days=num_readings)
-    
-    for i in range(num_readings):
-        date = (base_date + timedelta(days=i)).strftime("%Y-%m-%d")
-        time = datetime.strptime(f"{random.randint(6,22)}:{random.randint(0,59):02d}", "%H:%M").strftime("%H:%M")
-        
-        # Generate realistic BP values with some variation
-        if random.random() < 0.8:  # 80% normal readings
-            systolic = random.randint(100, 130)
-            diastolic = random.randint(60, 85)
-        else:  # 20% elevated/high readings
-            systolic = random.randint(135, 160)
-            diastolic = random.randint(85, 100)
-            
-        pulse = random.randint(60, 100)
-        notes = random.choice(["", "After exercise", "Before bed", "Morning reading", ""])
-        
-        cursor.execute('''
-            INSERT INTO bp_readings (user_id, date, time, systolic, diastolic, pulse, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, date, time, systolic, diastolic, pulse, notes))
-    
-    conn.commit()
-
-def generate_bs_readings(conn, user_id, diabetes_type, num_readings=50):
-    cursor = conn.cursor()
-    base_date = datetime.now() - timedelta(days=num_readings//2)  # More readings per day
-    
-    measurement_types = ["Fasting", "Before Meal", "After Meal", "Before Bed", "Random"]
-    meal_contexts = ["", "Breakfast", "Lunch", "Dinner", "Snack"]
-    
-    for i in range(num_readings):
-        date = (base_date + timedelta(days=i//2)).strftime("%Y-%m-%d")
-        time = datetime.strptime(f"{random.randint(6,22)}:{random.randint(0,59):02d}", "%H:%M").strftime("%H:%M")
-        
-        measurement_type = random.choice(measurement_types)
-        meal_ctx = meal_contexts[measurement_types.index(measurement_type)] if measurement_type in ["Before Meal", "After Meal"] else ""
-        
-        # Generate glucose levels based on diabetes type
-        if diabetes_type == "Type 1":
-            if measurement_type == "Fasting":
-                glucose = random.randint(80, 180)  # Wider range for Type 1
-            elif measurement_type == "After Meal":
-                glucose = random.randint(120, 250)
-            else:
-                glucose = random.randint(70, 200)
-        elif diabetes_type == "Type 2":
-            if measurement_type == "Fasting":
-                glucose = random.randint(100, 160)
-            elif measurement_type == "After Meal":
-                glucose = random.randint(140, 220)
-            else:
-                glucose = random.randint(90, 180)
-        elif diabetes_type == "Prediabetes":
-            if measurement_type == "Fasting":
-                glucose = random.randint(90, 130)
-            elif measurement_type == "After Meal":
-                glucose = random.randint(120, 180)
-            else:
-                glucose = random.randint(80, 150)
-        else:  # Normal or gestational
-            if measurement_type == "Fasting":
-                glucose = random.randint(70, 100)
-            elif measurement_type == "After Meal":
-                glucose = random.randint(80, 140)
-            else:
-                glucose = random.randint(70, 120)
-        
-        notes = random.choice(["", "Felt dizzy", "After workout", "Stressful day", ""])
-        
-        cursor.execute('''
-            INSERT INTO bs_readings (user_id, date, time, glucose_level, measurement_type, meal_context, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, date, time, glucose, measurement_type, meal_ctx, notes))
-    
-    conn.commit()
-
-def main():
-    conn = sqlite3.connect('health_monitor.db')
-    
-    # Create tables if they don't exist
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            full_name TEXT,
-            age INTEGER,
-            gender TEXT,
-            diabetes_type TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bp_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            systolic INTEGER NOT NULL,
-            diastolic INTEGER NOT NULL,
-            pulse INTEGER,
-            notes TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bs_readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            glucose_level INTEGER NOT NULL,
-            measurement_type TEXT NOT NULL,
-            meal_context TEXT,
-            notes TEXT,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    ''')
-    
-    conn.commit()
-    
-    # Generate synthetic data
-    print("Generating test users...")
-    generate_users(conn)
-    
-    # Get user IDs and their diabetes types
-    cursor.execute("SELECT id, diabetes_type FROM users")
-    users = cursor.fetchall()
-    
-    for user_id, diabetes_type in users:
-        print(f"Generating data for user {user_id} ({diabetes_type})...")
-        generate_bp_readings(conn, user_id)
-        generate_bs_readings(conn, user_id, diabetes_type)
-    
-    print("Synthetic data generation complete!")
-    conn.close()
+
+def reading_times(rng, users, readings, end_ts, span_seconds):
+    """Return a (users, readings) array of epoch seconds, oldest first per user
+
+    Readings are evenly spaced across the span with random jitter, then each
+    day is squeezed into waking hours and rounded to the minute the app stores.
+    """
+    step = span_seconds / readings
+    offsets = (np.arange(readings) + rng.random((users, readings))) * step
+    ts = (end_ts - span_seconds + offsets).astype(np.int64)
+    day, second = np.divmod(ts, 86400)
+    second = WAKING_START_HOUR * 3600 + second * WAKING_HOURS // 24
+    return day * 86400 + second // 60 * 60
+
+
+def date_time_strings(ts):
+    """Vectorized 'YYYY-MM-DD' and 'HH:MM' strings for an array of epoch seconds"""
+    chars = ts.astype('datetime64[s]').astype('datetime64[m]').astype('U16').view('U1')
+    chars = chars.reshape(-1, 16)
+    dates = np.ascontiguousarray(chars[:, :10]).view('U10').ravel()
+    times = np.ascontiguousarray(chars[:, 11:]).view('U5').ravel()
+    return dates.tolist(), times.tolist()
+
+
+def generate_bp_readings(conn, rng, user_ids, readings, end_ts, span_seconds):
+    ts = reading_times(rng, len(user_ids), readings, end_ts, span_seconds).ravel()
+    size = ts.size
+
+    # 80% normal readings, 20% elevated/high
+    elevated = rng.random(size) >= 0.8
+    systolic = np.where(elevated, rng.integers(135, 161, size), rng.integers(100, 131, size))
+    diastolic = np.where(elevated, rng.integers(85, 101, size), rng.integers(60, 86, size))
+    pulse = rng.integers(60, 101, size)
+    notes = np.array(BP_NOTES)[rng.integers(0, len(BP_NOTES), size)]
+
+    dates, times = date_time_strings(ts)
+    rows = zip(np.repeat(user_ids, readings).tolist(), dates, times, systolic.tolist(),
+               diastolic.tolist(), pulse.tolist(), notes.tolist(), ts.tolist())
+    conn.executemany('''
+        INSERT INTO bp_readings (user_id, date, time, systolic, diastolic, pulse, notes, ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return size
+
+
+def generate_bs_readings(conn, rng, user_ids, diabetes_types, readings, end_ts, span_seconds):
+    ts = reading_times(rng, len(user_ids), readings, end_ts, span_seconds).ravel()
+    size = ts.size
+
+    kind = rng.integers(0, len(MEASUREMENT_TYPES), size)
+    # Range column 0 = Fasting, 1 = After Meal, 2 = anything else
+    column = np.where(kind == 0, 0, np.where(kind == 2, 1, 2))
+    ranges = np.array([GLUCOSE_RANGES.get(t, GLUCOSE_RANGES["None"]) for t in diabetes_types])
+    user_index = np.repeat(np.arange(len(user_ids)), readings)
+    low = ranges[user_index, column, 0]
+    high = ranges[user_index, column, 1]
+    glucose = low + (rng.random(size) * (high - low + 1)).astype(np.int64)
+
+    with_meal = (kind == 1) | (kind == 2)
+    meal = np.where(with_meal, np.array(MEAL_CONTEXTS)[rng.integers(0, len(MEAL_CONTEXTS), size)], "")
+    notes = np.array(BS_NOTES)[rng.integers(0, len(BS_NOTES), size)]
+
+    dates, times = date_time_strings(ts)
+    rows = zip(np.repeat(user_ids, readings).tolist(), dates, times, glucose.tolist(),
+               np.array(MEASUREMENT_TYPES)[kind].tolist(), meal.tolist(), notes.tolist(),
+               ts.tolist())
+    conn.executemany('''
+        INSERT INTO bs_readings (user_id, date, time, glucose_level, measurement_type, meal_context, notes, ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return size
+
+
+def generate(conn, users=5, bp_readings=30, bs_readings=50, days=None, cadence_hours=None,
+             end=None, seed=0, progress=print):
+    """Fill conn with users and readings in one transaction and return the row count
+
+    Readings are spread evenly over `days` ending at `end` (default now), or
+    placed every `cadence_hours` if that is given instead.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now()
+    end_ts = int((end - datetime(1970, 1, 1)).total_seconds())
+
+    def span(readings, per_day):
+        if cadence_hours:
+            return readings * cadence_hours * 3600
+        # Without a span, BP is taken daily and BS twice a day
+        return (days or max(1, readings // per_day)) * 86400
+
+    total = 0
+    try:
+        progress(f"Generating {users} users...")
+        types = generate_users(conn, users, rng)
+        user_ids = list(types)
+        total += users
+
+        # Rollups are rebuilt in one grouped pass at the end, which is far
+        # cheaper than their triggers firing for every generated reading
+        drop_rollup_triggers(conn)
+
+        # Bound memory by drawing a batch of users at a time
+        per_user = max(bp_readings, bs_readings, 1)
+        batch = max(1, ROWS_PER_BATCH // per_user)
+        for start in range(0, users, batch):
+            ids = user_ids[start:start + batch]
+            if bp_readings:
+                total += generate_bp_readings(conn, rng, ids, bp_readings, end_ts, span(bp_readings, 1))
+            if bs_readings:
+                total += generate_bs_readings(conn, rng, ids, [types[i] for i in ids],
+                                              bs_readings, end_ts, span(bs_readings, 2))
+            progress(f"  users {start + 1}-{start + len(ids)} of {users}: {total:,} rows")
+        if user_ids:
+            rebuild_rollups(conn, first_user=min(user_ids))
+        create_rollup_triggers(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return total
+
+
+def _end_of_day(value):
+    return datetime.strptime(value, '%Y-%m-%d') + timedelta(days=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic users and readings")
+    parser.add_argument('--users', type=int, default=5, help="number of users (first 5 are the demo accounts)")
+    parser.add_argument('--bp-readings', type=int, default=30, help="BP readings per user")
+    parser.add_argument('--bs-readings', type=int, default=50, help="BS readings per user")
+    parser.add_argument('--days', type=int, help="span of days the readings cover, ending at --end")
+    parser.add_argument('--end', type=_end_of_day,
+                        help="last day of readings, YYYY-MM-DD (default: now); fix it for repeatable fixtures")
+    parser.add_argument('--cadence-hours', type=float, help="hours between readings (overrides --days)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--db', default=DB_PATH, help="database path")
+    args = parser.parse_args(argv)
+
+    # Opening through the factory creates or upgrades the tables
+    conn = connect(args.db)
+    start = time.perf_counter()
+    try:
+        total = generate(conn, args.users, args.bp_readings, args.bs_readings,
+                         args.days, args.cadence_hours, end=args.end, seed=args.seed)
+    except sqlite3.IntegrityError:
+        print(f"{args.db} already has these users; use --db to write a new file.")
+        return 1
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"Synthetic data generation complete! {total:,} rows in {elapsed:.1f}s "
+          f"({total / elapsed:,.0f} rows/sec)")
+    return 0
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
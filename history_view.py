@@ -0,0 +1,200 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+from db_worker import show_db_error
+from schema import reading_timestamp
+
+# Treeview wrapper that shows a reading history a page at a time. Pages are
+# fetched newest-first with keyset pagination on (ts, id), which the
+# (user_id, ts) indexes serve directly, so the cost of opening or scrolling
+# the history does not grow with its length. Only max_pages pages are kept
+# as Treeview items; scrolling near either edge loads the next page and
+# drops the one furthest away.
+
+LOAD_THRESHOLD = 0.1
+
+
+class PagedHistoryView:
+    def __init__(self, tree, scrollbar, executor, table, columns, user_id,
+                 page_size=200, max_pages=3):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.executor = executor
+        self.table = table
+        self.columns = columns
+        self.user_id = user_id
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+        self._keys = {}
+        self._generation = 0
+        self._loading = False
+        self._at_start = True
+        self._at_end = False
+
+        self.tree.configure(yscrollcommand=self._on_scroll)
+
+    def build_jump_bar(self, parent):
+        """Add a 'Jump to date' entry to parent and return its frame"""
+        frame = ttk.Frame(parent)
+        ttk.Label(frame, text="Jump to date", style='FormLabel.TLabel').pack(side=tk.LEFT, padx=(0, 5))
+        entry = ttk.Entry(frame, style='Form.TEntry', width=12)
+        entry.pack(side=tk.LEFT)
+        entry.insert(0, "YYYY-MM-DD")
+
+        def jump():
+            try:
+                ts = reading_timestamp(entry.get(), "23:59:59")
+            except ValueError:
+                messagebox.showerror("Input Error", "Date must be in YYYY-MM-DD format")
+                return
+            self.jump_to(ts)
+
+        entry.bind("<Return>", lambda event: jump())
+        ttk.Button(frame, text="Go", style='Secondary.TButton', command=jump).pack(side=tk.LEFT, padx=5)
+        ttk.Button(frame, text="Latest", style='Secondary.TButton',
+                   command=self.reload).pack(side=tk.LEFT)
+        return frame
+
+    def reload(self):
+        """Show the newest page again"""
+        self._reset()
+        self._at_start = True
+        self._load(older=True, key=None)
+
+    def jump_to(self, ts):
+        """Show readings taken at or before ts, with newer pages loadable above"""
+        self._reset()
+        self._at_start = False
+        self._load(older=True, key=(ts + 1, 0))
+
+    def insert_reading(self, row):
+        """Show a just-saved reading (id, ts, *values) at its sorted position"""
+        key = (row[1], row[0])
+        children = self.tree.get_children()
+        if children:
+            # Readings outside the loaded window appear when paged in
+            if key > self._keys[children[0]] and not self._at_start:
+                return
+            if key < self._keys[children[-1]] and not self._at_end:
+                return
+
+        # Items are newest first, so search for the first older key
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._keys[children[mid]] > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        self._insert(row, lo)
+        self.tree.see(str(row[0]))
+
+    def reading_key(self, iid):
+        """Return the (ts, id) of a displayed item"""
+        return self._keys[iid]
+
+    def remove_reading(self, reading_id):
+        iid = str(reading_id)
+        if self.tree.exists(iid):
+            del self._keys[iid]
+            self.tree.delete(iid)
+
+    def _reset(self):
+        self._generation += 1
+        self._loading = False
+        self._at_end = False
+        self._keys.clear()
+        self.tree.delete(*self.tree.get_children())
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading:
+            return
+        if float(last) >= 1 - LOAD_THRESHOLD and not self._at_end:
+            self._load(older=True, key=self._edge_key(-1))
+        elif float(first) <= LOAD_THRESHOLD and not self._at_start:
+            self._load(older=False, key=self._edge_key(0))
+
+    def _edge_key(self, index):
+        children = self.tree.get_children()
+        return self._keys[children[index]] if children else None
+
+    def _load(self, older, key):
+        self._loading = True
+        self.executor.submit(self._fetch_page, older, key,
+                             on_done=lambda rows, g=self._generation: self._on_page(g, older, rows),
+                             on_error=lambda e, g=self._generation: self._on_page_error(g, e))
+
+    def _fetch_page(self, conn, older, key):
+        select = f"SELECT id, ts, {', '.join(self.columns)} FROM {self.table}"
+        if key is None:
+            where, params = "WHERE user_id = ?", (self.user_id,)
+        elif older:
+            where = "WHERE user_id = ? AND (ts < ? OR (ts = ? AND id < ?))"
+            params = (self.user_id, key[0], key[0], key[1])
+        else:
+            where = "WHERE user_id = ? AND (ts > ? OR (ts = ? AND id > ?))"
+            params = (self.user_id, key[0], key[0], key[1])
+        order = "ORDER BY ts DESC, id DESC" if older else "ORDER BY ts ASC, id ASC"
+        cursor = conn.cursor()
+        cursor.execute(f"{select} {where} {order} LIMIT ?", params + (self.page_size,))
+        return cursor.fetchall()
+
+    def _on_page(self, generation, older, rows):
+        if generation != self._generation or not self.tree.winfo_exists():
+            return
+        self._loading = False
+
+        if len(rows) < self.page_size:
+            if older:
+                self._at_end = True
+            else:
+                self._at_start = True
+        if not rows:
+            return
+
+        # Keep whatever the user is looking at in place while items change
+        children = self.tree.get_children()
+        anchor = ''
+        if children:
+            top = int(float(self.tree.yview()[0]) * len(children))
+            anchor = children[min(top, len(children) - 1)]
+
+        if older:
+            for row in rows:
+                self._insert(row, tk.END)
+            self._trim(from_top=True)
+        else:
+            for row in rows:
+                self._insert(row, 0)
+            self._trim(from_top=False)
+
+        if anchor and self.tree.exists(anchor):
+            self.tree.yview_moveto(self.tree.index(anchor) / len(self.tree.get_children()))
+
+    def _on_page_error(self, generation, error):
+        # Let the next scroll retry the page
+        if generation == self._generation:
+            self._loading = False
+        show_db_error(error)
+
+    def _insert(self, row, index):
+        iid = str(row[0])
+        if self.tree.exists(iid):
+            return
+        self._keys[iid] = (row[1], row[0])
+        self.tree.insert("", index, iid=iid, values=row[2:])
+
+    def _trim(self, from_top):
+        children = self.tree.get_children()
+        excess = len(children) - self.page_size * self.max_pages
+        if excess <= 0:
+            return
+        dropped = children[:excess] if from_top else children[-excess:]
+        for iid in dropped:
+            del self._keys[iid]
+        self.tree.delete(*dropped)
+        if from_top:
+            self._at_start = False
+        else:
+            self._at_end = False
@@ -0,0 +1,346 @@
+import argparse
+import calendar
+import csv
+import json
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from db import DB_PATH, connect
+
+# Streaming import of BP and BS readings from CSV, JSON Lines and meter
+# export files. Rows are parsed one at a time, validated and normalized,
+# then written in large executemany batches that skip any reading the user
+# already has at the same timestamp.
+
+BATCH_SIZE = 10000
+MAX_REJECTS_KEPT = 100
+HEADER_SCAN_ROWS = 20
+MMOL_TO_MG_DL = 18.0
+
+MEASUREMENT_TYPES = ["Fasting", "Before Meal", "After Meal", "Before Bed", "Random"]
+MEAL_CONTEXTS = ["", "Breakfast", "Lunch", "Dinner", "Snack"]
+
+# Column names seen in our own exports and common meter/cuff software
+FIELD_ALIASES = {
+    'date': ('date', 'reading date'),
+    'time': ('time', 'reading time'),
+    'datetime': ('datetime', 'date time', 'date/time', 'timestamp', 'device timestamp',
+                 'measured at', 'timestamp (yyyy-mm-ddthh:mm:ss)'),
+    'systolic': ('systolic', 'sys', 'systolic (mmhg)', 'systolic_mmhg'),
+    'diastolic': ('diastolic', 'dia', 'diastolic (mmhg)', 'diastolic_mmhg'),
+    'pulse': ('pulse', 'pulse (bpm)', 'heart rate', 'heart_rate', 'hr'),
+    'glucose_level': ('glucose', 'glucose_level', 'glucose level', 'glucose (mg/dl)', 'bg',
+                      'blood glucose', 'historic glucose mg/dl', 'scan glucose mg/dl',
+                      'glucose value (mg/dl)'),
+    'glucose_mmol': ('glucose (mmol/l)', 'glucose_mmol', 'historic glucose mmol/l',
+                     'scan glucose mmol/l', 'glucose value (mmol/l)'),
+    'measurement_type': ('measurement_type', 'measurement type', 'type', 'tag'),
+    'meal_context': ('meal_context', 'meal context', 'meal'),
+    'notes': ('notes', 'note', 'comment', 'comments'),
+}
+_ALIAS_LOOKUP = {alias: field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+# Fractional seconds and a UTC offset (or Z) right after the time of day.
+# Readings are kept in wall-clock time, so an offset is dropped, not applied.
+_FRACTION = re.compile(r'(\d{2}:\d{2}:\d{2})\.\d+')
+_UTC_OFFSET = re.compile(r'(\d{2}:\d{2}(?::\d{2})?)\s*(?:Z|[+-]\d{2}:?\d{2})$')
+
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M %p", "%m-%d-%Y %I:%M %p", "%d.%m.%Y %H:%M",
+    "%Y%m%d %H:%M", "%Y%m%d%H%M",
+]
+# All-digit values this long are epoch seconds (1973 to 2286); shorter or
+# longer ones are compact dates such as 202401010800
+EPOCH_DIGITS = (9, 10)
+
+KINDS = {
+    'bp': {
+        'table': 'bp_readings',
+        'columns': ('systolic', 'diastolic', 'pulse', 'notes'),
+    },
+    'bs': {
+        'table': 'bs_readings',
+        'columns': ('glucose_level', 'measurement_type', 'meal_context', 'notes'),
+    },
+}
+
+
+class ImportResult:
+    def __init__(self, path):
+        self.path = path
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.rejects = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, line_no, reason):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REJECTS_KEPT:
+            self.rejects.append((line_no, reason))
+
+    def summary(self):
+        lines = [
+            f"Rows read: {self.read}",
+            f"Imported: {self.inserted}",
+            f"Duplicates skipped: {self.duplicates}",
+            f"Rejected: {self.rejected}",
+            f"Throughput: {self.rows_per_sec:,.0f} rows/sec",
+        ]
+        for line_no, reason in self.rejects[:5]:
+            lines.append(f"  line {line_no}: {reason}")
+        return "\n".join(lines)
+
+
+def _canonical(name):
+    return _ALIAS_LOOKUP.get(str(name).strip().lower())
+
+
+def detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    return 'jsonl' if ext in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def iter_csv(path):
+    """Yield (line_no, record) for each data row, skipping any meter preamble"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(8192)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+
+        fields = None
+        for row in reader:
+            if reader.line_num > HEADER_SCAN_ROWS:
+                break
+            mapped = [_canonical(cell) for cell in row]
+            if sum(1 for field in mapped if field) >= 2:
+                fields = mapped
+                break
+        if fields is None:
+            raise ValueError(f"No recognizable header row in {path}")
+
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            record = {}
+            for field, value in zip(fields, row):
+                # Meter exports can map several columns to one field
+                # (historic vs scan glucose); keep whichever is filled
+                if field and (field not in record or _blank(record[field])):
+                    record[field] = value
+            yield reader.line_num, record
+
+
+def iter_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, ValueError(f"invalid JSON: {e.msg}")
+                continue
+            if not isinstance(obj, dict):
+                yield line_no, ValueError("not a JSON object")
+                continue
+            record = {}
+            for key, value in obj.items():
+                field = _canonical(key)
+                if field:
+                    record[field] = value
+            yield line_no, record
+
+
+def _blank(value):
+    return value is None or str(value).strip() == ''
+
+
+def _parse_int(record, field, low, high, required=True):
+    value = record.get(field)
+    if _blank(value):
+        if required:
+            raise ValueError(f"missing {field}")
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{field} {value} is not a number")
+    number = round(number)
+    if not low <= number <= high:
+        raise ValueError(f"{field} {number} outside {low}-{high}")
+    return number
+
+
+class _DateParser:
+    # Files use one format throughout, so remember the last one that worked
+    def __init__(self):
+        self.last_format = DATETIME_FORMATS[0]
+
+    def parse(self, record):
+        if not _blank(record.get('datetime')):
+            value = str(record['datetime']).strip()
+        elif not _blank(record.get('date')) and not _blank(record.get('time')):
+            value = f"{str(record['date']).strip()} {str(record['time']).strip()}"
+        else:
+            raise ValueError("missing date/time")
+
+        if value.isdigit() and len(value) in EPOCH_DIGITS:
+            return datetime(1970, 1, 1) + timedelta(seconds=int(value))
+        value = _UTC_OFFSET.sub(r'\1', _FRACTION.sub(r'\1', value))
+        for fmt in [self.last_format] + DATETIME_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            self.last_format = fmt
+            return parsed
+        raise ValueError(f"unrecognized date/time '{value}'")
+
+
+def _choice(value, options, default):
+    # Match the app's spelling where possible, otherwise keep the label as is
+    if _blank(value):
+        return default
+    value = str(value).strip()
+    for option in options:
+        if option.lower() == value.lower():
+            return option
+    return value
+
+
+def normalize(kind, record, dates):
+    """Turn a parsed record into the column values stored for kind"""
+    # The app stores readings to the minute, and ts must match date and time
+    moment = dates.parse(record).replace(second=0, microsecond=0)
+    ts = calendar.timegm(moment.timetuple())
+    notes = '' if _blank(record.get('notes')) else str(record['notes']).strip()
+
+    if kind == 'bp':
+        systolic = _parse_int(record, 'systolic', 50, 300)
+        diastolic = _parse_int(record, 'diastolic', 30, 200)
+        if diastolic >= systolic:
+            raise ValueError("diastolic must be below systolic")
+        pulse = _parse_int(record, 'pulse', 20, 250, required=False)
+        values = (systolic, diastolic, pulse, notes)
+    else:
+        if _blank(record.get('glucose_level')) and not _blank(record.get('glucose_mmol')):
+            record = dict(record, glucose_level=float(record['glucose_mmol']) * MMOL_TO_MG_DL)
+        glucose = _parse_int(record, 'glucose_level', 10, 1000)
+        measurement_type = _choice(record.get('measurement_type'), MEASUREMENT_TYPES, "Random")
+        meal_context = _choice(record.get('meal_context'), MEAL_CONTEXTS, "")
+        values = (glucose, measurement_type, meal_context, notes)
+
+    return (moment.strftime("%Y-%m-%d"), moment.strftime("%H:%M")) + values + (ts,)
+
+
+def _insert_sql(kind):
+    spec = KINDS[kind]
+    columns = ('user_id', 'date', 'time') + spec['columns'] + ('ts',)
+    placeholders = ", ".join("?" for _ in columns)
+    return f'''
+        INSERT INTO {spec['table']} ({", ".join(columns)})
+        SELECT {placeholders}
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {spec['table']} WHERE user_id = ? AND ts = ?
+        )
+    '''
+
+
+def import_readings(conn, user_id, kind, path, fmt='auto', batch_size=BATCH_SIZE, progress=None):
+    """Import a reading file for one user and return an ImportResult"""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown reading kind '{kind}'")
+    if fmt == 'auto':
+        fmt = detect_format(path)
+    records = iter_jsonl(path) if fmt == 'jsonl' else iter_csv(path)
+
+    result = ImportResult(path)
+    sql = _insert_sql(kind)
+    dates = _DateParser()
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        # Rows inserted earlier in the transaction are visible to NOT EXISTS,
+        # so duplicates inside the file are skipped too
+        cursor = conn.cursor()
+        cursor.executemany(sql, batch)
+        conn.commit()
+        result.inserted += cursor.rowcount
+        result.duplicates += len(batch) - cursor.rowcount
+        batch.clear()
+        if progress:
+            progress(result)
+
+    try:
+        for line_no, record in records:
+            result.read += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                values = normalize(kind, record, dates)
+            except (ValueError, TypeError) as e:
+                result.reject(line_no, str(e))
+                continue
+            batch.append((user_id,) + values + (user_id, values[-1]))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        result.elapsed = time.perf_counter() - start
+
+    return result
+
+
+def find_user_id(conn, user):
+    row = conn.execute('SELECT id FROM users WHERE username = ? OR id = ?', (user, user)).fetchone()
+    if row is None:
+        raise ValueError(f"No such user '{user}'")
+    return row[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import blood pressure or blood sugar readings")
+    parser.add_argument('kind', choices=sorted(KINDS), help="bp or bs readings")
+    parser.add_argument('files', nargs='+', help="CSV, JSON Lines or meter export files")
+    parser.add_argument('--user', required=True, help="username or user id to import for")
+    parser.add_argument('--format', choices=['auto', 'csv', 'jsonl'], default='auto')
+    parser.add_argument('--db', default=DB_PATH, help="database path")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        user_id = find_user_id(conn, args.user)
+    except ValueError as e:
+        parser.error(str(e))
+
+    for path in args.files:
+        print(f"Importing {path}...")
+        result = import_readings(conn, user_id, args.kind, path, args.format, args.batch_size)
+        print(result.summary())
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
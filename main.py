@@ -1,20 +1,38 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
+from schema import migrate
+from db import get_connection
+from db_worker import QueryExecutor
+from history_view import PagedHistoryView
 from auth_module import AuthModule
 from bp_module import BPModule
 from bs_module import BSModule
-from predict_module import PredictModule
-from PIL import Image, ImageTk
+from asset_manager import assets
+from rollups import summarize, summarize_types
 import os
-import base64
-from io import BytesIO
-import io
-import matplotlib.pyplot as plt
-import pandas as pd
-from sklearn.linear_model import LinearRegression
+import importlib
+import threading
 from datetime import datetime, timedelta
 
+# NumPy, pandas, matplotlib and fpdf are imported where they are first used,
+# so the login screen only waits for tkinter, sqlite3 and PIL. After login
+# they are loaded on a background thread, ahead of the first chart or report.
+PREWARM_MODULES = ('numpy', 'pandas', 'matplotlib.pyplot', 'matplotlib.backends.backend_tkagg',
+                   'fpdf', 'predict_module')
+
+
+def prewarm_imports():
+    for name in PREWARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # Reported by the feature that needs it, when it is used
+            pass
+
+# Days covered by the statistics on the health summary
+SUMMARY_DAYS = 30
+
 class HealthMonitorApp:
     def __init__(self, root):
         self.root = root
@@ -23,14 +41,19 @@ class HealthMonitorApp:
         self.root.minsize(1000, 700)
         
         # Database connection
-        self.conn = sqlite3.connect('health_monitor.db')
+        self.conn = get_connection()
         self.create_tables()
         
+        # Queries run on worker threads; results come back via root.after
+        self.executor = QueryExecutor(self.root)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Initialize modules
-        self.auth_module = AuthModule(self.conn, self.on_login_success)
-        self.bp_module = BPModule(self.conn)
-        self.bs_module = BSModule(self.conn)
-        self.predict_module = PredictModule(self.conn)
+        self.auth_module = AuthModule(self.conn, self.on_login_success, self.executor)
+        self.bp_module = BPModule(self.conn, self.executor)
+        self.bs_module = BSModule(self.conn, self.executor)
+        self._predict_module = None
+        self._predict_lock = threading.Lock()
         
         # Configure styles
         self.configure_styles()
@@ -38,41 +61,21 @@ class HealthMonitorApp:
         # Start with login screen
         self.auth_module.show_login(self.root)
     
+    @property
+    def predict_module(self):
+        # Created on first use; worker threads may get here first
+        with self._predict_lock:
+            if self._predict_module is None:
+                from predict_module import PredictModule
+                self._predict_module = PredictModule(self.conn)
+            return self._predict_module
+    
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                full_name TEXT,
-                age INTEGER,
-                gender TEXT,
-                diabetes_type TEXT
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bp_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                systolic INTEGER NOT NULL,
-                diastolic INTEGER NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bs_readings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                time TEXT NOT NULL,
-                glucose_level INTEGER NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        self.conn.commit()
+        migrate(self.conn)
+    
+    def on_close(self):
+        self.executor.shutdown()
+        self.root.destroy()
     
     def configure_styles(self):
         self.style = ttk.Style()
@@ -150,6 +153,7 @@ class HealthMonitorApp:
     def on_login_success(self, user):
         self.current_user = user
         self.show_main_menu()
+        threading.Thread(target=prewarm_imports, name='prewarm', daemon=True).start()
     
     def show_main_menu(self):
         self.clear_window()
@@ -263,16 +267,6 @@ class HealthMonitorApp:
                                 ["date", "time", "glucose_level"])
     
     def show_reading_history(self, table_name, title, columns, db_columns):
-        cursor = self.conn.cursor()
-        cursor.execute(f'''
-            SELECT {", ".join(db_columns)} 
-            FROM {table_name} 
-            WHERE user_id = ? 
-            ORDER BY date DESC, time DESC
-        ''', (self.current_user['id'],))
-        
-        records = cursor.fetchall()
-        
         history_window = tk.Toplevel(self.root)
         history_window.title(title)
         history_window.geometry("800x500")
@@ -288,55 +282,71 @@ class HealthMonitorApp:
             tree.heading(col, text=col)
             tree.column(col, width=150, anchor='center')
         
-        for record in records:
-            tree.insert('', tk.END, values=record)
-        
         scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscroll=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         tree.pack(fill=tk.BOTH, expand=True)
         
+        # Rows are paged in as the user scrolls
+        history = PagedHistoryView(tree, scrollbar, self.executor, table_name,
+                                   db_columns, self.current_user['id'])
+        
         btn_frame = ttk.Frame(history_window)
         btn_frame.pack(pady=10)
         
+        history.build_jump_bar(btn_frame).pack(side=tk.LEFT, padx=(0, 20))
         ttk.Button(btn_frame, text="Close", style='Secondary.TButton',
-                  command=history_window.destroy).pack()
+                  command=history_window.destroy).pack(side=tk.LEFT)
+        
+        history.reload()
     
     def show_bp_predictions(self):
-        result = self.predict_module.predict_bp(self.current_user['id'], include_visualization=True)
+        # The worker reads one trend_stats row, or nothing if the forecast is cached
+        user_id = self.current_user['id']
+        self.executor.submit(lambda conn: self.predict_module.prefetch(user_id, 'bp', conn, 'forecast', 7, True),
+                             on_done=self._show_bp_prediction_result)
+    
+    def _show_bp_prediction_result(self, prefetched):
+        result = self.predict_module.resolve(
+            prefetched, lambda stats: self.predict_module.forecast_from_stats('bp', stats, 7, True))
         
         if not result:
             messagebox.showinfo("Info", "Not enough data to make predictions. Please record at least 3 readings.")
             return
             
-        predictions, img_data = result
+        predictions, chart = result
         
         self.create_prediction_window(
             "Blood Pressure Predictions",
             "7-Day Blood Pressure Forecast",
             [('date', 'Date', 150), ('systolic', 'Systolic (mmHg)', 150), ('diastolic', 'Diastolic (mmHg)', 150)],
             predictions,
-            img_data
+            chart
         )
     
     def show_bs_predictions(self):
-        result = self.predict_module.predict_bs(self.current_user['id'], include_visualization=True)
+        user_id = self.current_user['id']
+        self.executor.submit(lambda conn: self.predict_module.prefetch(user_id, 'bs', conn, 'forecast', 7, True),
+                             on_done=self._show_bs_prediction_result)
+    
+    def _show_bs_prediction_result(self, prefetched):
+        result = self.predict_module.resolve(
+            prefetched, lambda stats: self.predict_module.forecast_from_stats('bs', stats, 7, True))
         
         if not result:
             messagebox.showinfo("Info", "Not enough data to make predictions. Please record at least 3 readings.")
             return
             
-        predictions, img_data = result
+        predictions, chart = result
         
         self.create_prediction_window(
             "Blood Sugar Predictions",
             "7-Day Blood Sugar Forecast",
             [('date', 'Date', 200), ('glucose', 'Glucose (mg/dL)', 200)],
             predictions,
-            img_data
+            chart
         )
     
-    def create_prediction_window(self, title, heading, columns, data, img_data=None):
+    def create_prediction_window(self, title, heading, columns, data, chart=None):
         pred_window = tk.Toplevel(self.root)
         pred_window.title(title)
         pred_window.geometry("800x600")
@@ -369,11 +379,9 @@ class HealthMonitorApp:
         graph_frame = ttk.Frame(notebook)
         notebook.add(graph_frame, text="Graph View")
         
-        if img_data:
-            img_bytes = base64.b64decode(img_data)
-            img = Image.open(BytesIO(img_bytes))
-            img = img.resize((700, 400), Image.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
+        if chart:
+            # Rendered at display size, so this is a straight pixel copy
+            photo = chart.photo()
             
             img_label = ttk.Label(graph_frame, image=photo)
             img_label.image = photo  # Keep reference
@@ -400,17 +408,63 @@ class HealthMonitorApp:
         bp_frame = ttk.Frame(notebook)
         notebook.add(bp_frame, text="Blood Pressure")
         
+        # BS Summary tab
+        bs_frame = ttk.Frame(notebook)
+        notebook.add(bs_frame, text="Blood Sugar")
+        
+        # Close button
+        btn_frame = ttk.Frame(summary_window)
+        btn_frame.pack(pady=10)
+        
+        ttk.Button(btn_frame, text="Close", style='Secondary.TButton',
+                  command=summary_window.destroy).pack()
+        
+        def fill_summary(latest):
+            if not summary_window.winfo_exists():
+                return
+            bp_data, bs_data, bp_stats, bs_stats, bs_types = latest
+            self._fill_bp_summary(bp_frame, bp_data, bp_stats)
+            self._fill_bs_summary(bs_frame, bs_data, bs_stats, bs_types)
+        
+        self.executor.submit(self._fetch_latest_readings, self.current_user['id'],
+                             on_done=fill_summary)
+    
+    def _fetch_latest_readings(self, conn, user_id):
         # Get latest BP reading
-        cursor = self.conn.cursor()
+        cursor = conn.cursor()
         cursor.execute('''
             SELECT systolic, diastolic, date, time 
             FROM bp_readings 
             WHERE user_id = ? 
-            ORDER BY date DESC, time DESC 
+            ORDER BY ts DESC 
             LIMIT 1
-        ''', (self.current_user['id'],))
+        ''', (user_id,))
         bp_data = cursor.fetchone()
         
+        # Get latest BS reading
+        cursor.execute('''
+            SELECT glucose_level, date, time 
+            FROM bs_readings 
+            WHERE user_id = ? 
+            ORDER BY ts DESC 
+            LIMIT 1
+        ''', (user_id,))
+        bs_data = cursor.fetchone()
+        
+        # Recent statistics come from the rollups, not the readings
+        since = datetime.now().date() - timedelta(days=SUMMARY_DAYS - 1)
+        return (bp_data, bs_data, summarize(conn, user_id, 'bp', start=since),
+                summarize(conn, user_id, 'bs', start=since), summarize_types(conn, user_id, start=since))
+    
+    def _add_stats_card(self, parent, lines):
+        stats_frame = ttk.Frame(parent, style='Card.TFrame')
+        stats_frame.pack(fill=tk.X, padx=50, pady=10)
+        
+        ttk.Label(stats_frame, text=f"Last {SUMMARY_DAYS} Days", style='CardTitle.TLabel').pack()
+        for line in lines:
+            ttk.Label(stats_frame, text=line, font=('Arial', 11)).pack(pady=2)
+    
+    def _fill_bp_summary(self, bp_frame, bp_data, bp_stats):
         if bp_data:
             systolic, diastolic, date, time = bp_data
             bp_status = self.get_bp_status(systolic, diastolic)
@@ -427,26 +481,24 @@ class HealthMonitorApp:
             ttk.Label(status_frame, text=bp_status, 
                      font=('Arial', 12)).pack(pady=5)
             
+            systolic, diastolic = bp_stats['systolic'], bp_stats['diastolic']
+            if systolic.n:
+                self._add_stats_card(bp_frame, [
+                    f"Average: {systolic.mean:.0f}/{diastolic.mean:.0f} mmHg",
+                    f"Median: {systolic.percentile(0.5):.0f}/{diastolic.percentile(0.5):.0f} mmHg",
+                    f"Range: {systolic.min:.0f}-{systolic.max:.0f} / {diastolic.min:.0f}-{diastolic.max:.0f} mmHg",
+                    f"Readings: {systolic.n}"
+                ])
+            else:
+                self._add_stats_card(bp_frame, ["No readings in this period"])
+            
             # Add BP trends button
             ttk.Button(bp_frame, text="View Trends", style='Primary.TButton',
                       command=self.show_bp_trends).pack(pady=10)
         else:
             ttk.Label(bp_frame, text="No blood pressure readings recorded yet", style='CardText.TLabel').pack(pady=50)
-        
-        # BS Summary tab
-        bs_frame = ttk.Frame(notebook)
-        notebook.add(bs_frame, text="Blood Sugar")
-        
-        # Get latest BS reading
-        cursor.execute('''
-            SELECT glucose_level, date, time 
-            FROM bs_readings 
-            WHERE user_id = ? 
-            ORDER BY date DESC, time DESC 
-            LIMIT 1
-        ''', (self.current_user['id'],))
-        bs_data = cursor.fetchone()
-        
+    
+    def _fill_bs_summary(self, bs_frame, bs_data, bs_stats, bs_types):
         if bs_data:
             glucose, date, time = bs_data
             bs_status = self.get_bs_status(glucose)
@@ -463,18 +515,22 @@ class HealthMonitorApp:
             ttk.Label(status_frame, text=bs_status, 
                      font=('Arial', 12)).pack(pady=5)
             
+            glucose = bs_stats['glucose_level']
+            if glucose.n:
+                self._add_stats_card(bs_frame, [
+                    f"Average: {glucose.mean:.0f} mg/dL (median {glucose.percentile(0.5):.0f})",
+                    f"Range: {glucose.min:.0f}-{glucose.max:.0f} mg/dL",
+                    f"Readings: {glucose.n}"
+                ] + [f"{m_type}: {summary.mean:.0f} mg/dL average over {summary.n}"
+                     for m_type, summary in sorted(bs_types.items())])
+            else:
+                self._add_stats_card(bs_frame, ["No readings in this period"])
+            
             # Add BS trends button
             ttk.Button(bs_frame, text="View Trends", style='Primary.TButton',
                       command=self.show_bs_trends).pack(pady=10)
         else:
             ttk.Label(bs_frame, text="No blood sugar readings recorded yet", style='CardText.TLabel').pack(pady=50)
-        
-        # Close button
-        btn_frame = ttk.Frame(summary_window)
-        btn_frame.pack(pady=10)
-        
-        ttk.Button(btn_frame, text="Close", style='Secondary.TButton',
-                  command=summary_window.destroy).pack()
     
     def get_bp_status(self, systolic, diastolic):
         if systolic < 90 or diastolic < 60:
@@ -499,115 +555,97 @@ class HealthMonitorApp:
             return "Diabetes Range"
     
     def show_bp_trends(self):
-        data = self.predict_module.prepare_bp_data(self.current_user['id'])
-        if data is None or len(data) < 3:
+        user_id = self.current_user['id']
+        self.executor.submit(lambda conn: self.predict_module.prefetch(user_id, 'bp', conn, 'trend'),
+                             on_done=self._show_bp_trends)
+    
+    def _show_bp_trends(self, prefetched):
+        chart = self.predict_module.resolve(prefetched, self._bp_trend_image)
+        if chart is None:
             messagebox.showinfo("Info", "Not enough data to show trends. Please record at least 3 readings.")
             return
         
-        last_day = data['days_since_first'].max()
-        future_days = pd.DataFrame(range(last_day + 1, last_day + 8), columns=['days_since_first'])
+        self._show_trend_window("Blood Pressure Trends", chart)
+    
+    def _bp_trend_image(self, data):
+        if data is None or len(data) < 3:
+            return None
         
-        model_sys = LinearRegression()
-        model_dia = LinearRegression()
-        model_sys.fit(data[['days_since_first']], data['systolic'])
-        model_dia.fit(data[['days_since_first']], data['diastolic'])
+        import numpy as np
+        from trend_model import fit_trend
+        last_day = data['days_since_first'].max()
+        future_days = np.arange(last_day + 1, last_day + 8)
         
-        sys_pred = model_sys.predict(future_days)
-        dia_pred = model_dia.predict(future_days)
+        model = fit_trend(data['days_since_first'], data['systolic'], data['diastolic'])
+        pred = model.predict(future_days)
+        sys_pred, dia_pred = pred[:, 0], pred[:, 1]
         
-        img_data = self._generate_bp_visualization(data, future_days, sys_pred, dia_pred)
-        self._show_trend_window("Blood Pressure Trends", img_data)
+        return self._generate_bp_visualization(data, future_days, sys_pred, dia_pred)
 
     def show_bs_trends(self):
-        data = self.predict_module.prepare_bs_data(self.current_user['id'])
-        if data is None or len(data) < 3:
+        user_id = self.current_user['id']
+        self.executor.submit(lambda conn: self.predict_module.prefetch(user_id, 'bs', conn, 'trend'),
+                             on_done=self._show_bs_trends)
+    
+    def _show_bs_trends(self, prefetched):
+        chart = self.predict_module.resolve(prefetched, self._bs_trend_image)
+        if chart is None:
             messagebox.showinfo("Info", "Not enough data to show trends. Please record at least 3 readings.")
             return
         
+        self._show_trend_window("Blood Sugar Trends", chart)
+    
+    def _bs_trend_image(self, data):
+        if data is None or len(data) < 3:
+            return None
+        
+        import numpy as np
+        from trend_model import fit_trend
         last_day = data['days_since_first'].max()
-        future_days = pd.DataFrame(range(last_day + 1, last_day + 8), columns=['days_since_first'])
+        future_days = np.arange(last_day + 1, last_day + 8)
         
-        model = LinearRegression()
-        model.fit(data[['days_since_first']], data['glucose'])
-        pred = model.predict(future_days)
+        pred = fit_trend(data['days_since_first'], data['glucose']).predict(future_days)
         
-        img_data = self._generate_bs_visualization(data, future_days, pred)
-        self._show_trend_window("Blood Sugar Trends", img_data)
+        return self._generate_bs_visualization(data, future_days, pred)
 
     def _generate_bp_visualization(self, historical_data, future_days, sys_pred, dia_pred):
-        plt.figure(figsize=(12, 6))
-        
-        # Plot historical data
-        plt.plot(historical_data['datetime'], historical_data['systolic'], 
-                'b-o', label='Historical Systolic')
-        plt.plot(historical_data['datetime'], historical_data['diastolic'], 
-                'g-o', label='Historical Diastolic')
-        
-        # Prepare future dates
-        last_date = historical_data['datetime'].max()
-        future_dates = [last_date + timedelta(days=int(days-historical_data['days_since_first'].max())) 
-                       for days in future_days['days_since_first']]
-        
-        # Plot predictions
-        plt.plot(future_dates, sys_pred, 'b--o', label='Predicted Systolic')
-        plt.plot(future_dates, dia_pred, 'g--o', label='Predicted Diastolic')
-        
-        # Formatting
-        plt.title('Blood Pressure Trend and Prediction')
-        plt.xlabel('Date')
-        plt.ylabel('Blood Pressure (mmHg)')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        return self._fig_to_base64()
+        from trend_renderer import BPForecastLayout
+        return self._render_forecast(BPForecastLayout, historical_data, future_days,
+                                     [historical_data['systolic'], historical_data['diastolic']],
+                                     [sys_pred, dia_pred])
     
     def _generate_bs_visualization(self, historical_data, future_days, pred):
-        plt.figure(figsize=(12, 6))
-        
-        # Plot historical data
-        plt.plot(historical_data['datetime'], historical_data['glucose'], 
-                'r-o', label='Historical Glucose')
+        from trend_renderer import BSForecastLayout
+        return self._render_forecast(BSForecastLayout, historical_data, future_days,
+                                     [historical_data['glucose']], [pred])
+    
+    def _render_forecast(self, layout_class, historical_data, future_days, history, forecast):
+        import matplotlib.dates as mdates
+        from trend_renderer import figures
         
         # Prepare future dates
         last_date = historical_data['datetime'].max()
         future_dates = [last_date + timedelta(days=int(days-historical_data['days_since_first'].max())) 
-                       for days in future_days['days_since_first']]
-        
-        # Plot predictions
-        plt.plot(future_dates, pred, 'r--o', label='Predicted Glucose')
-        
-        # Formatting
-        plt.title('Blood Sugar Trend and Prediction')
-        plt.xlabel('Date')
-        plt.ylabel('Glucose Level (mg/dL)')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        return self._fig_to_base64()
-    
-    def _fig_to_base64(self):
-        img = io.BytesIO()
-        plt.savefig(img, format='png')
-        img.seek(0)
-        plt.close()
-        return base64.b64encode(img.getvalue()).decode('utf-8')
+                       for days in future_days]
+        
+        # Pooled figure: only the line data changes between charts
+        layout = figures.acquire(layout_class)
+        try:
+            layout.update(mdates.date2num(historical_data['datetime']), history,
+                          mdates.date2num(future_dates), forecast)
+            return layout.render()
+        finally:
+            figures.release(layout)
 
-    def _show_trend_window(self, title, img_data):
+    def _show_trend_window(self, title, chart):
         trend_window = tk.Toplevel(self.root)
         trend_window.title(title)
         trend_window.geometry("800x500")
         
         ttk.Label(trend_window, text=title, style='AuthTitle.TLabel').pack(pady=10)
         
-        if img_data:
-            img_bytes = base64.b64decode(img_data)
-            img = Image.open(BytesIO(img_bytes))
-            img = img.resize((700, 400), Image.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
+        if chart:
+            photo = chart.photo()
             
             img_label = ttk.Label(trend_window, image=photo)
             img_label.image = photo
@@ -647,11 +685,26 @@ class HealthMonitorApp:
         profile_frame.pack(fill=tk.X, pady=10, padx=50)
         
         # Get full user data from database
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (self.current_user['id'],))
-        user_data = cursor.fetchone()
+        self.executor.submit(self._fetch_user, self.current_user['id'],
+                             on_done=lambda user_data: self._fill_profile(profile_frame, user_data))
         
-        if user_data:
+        # Edit button
+        btn_frame = ttk.Frame(content_frame)
+        btn_frame.pack(pady=20)
+        
+        ttk.Button(btn_frame, text="Edit Profile", style='Primary.TButton',
+                  command=self.edit_profile).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(btn_frame, text="Change Password", style='Secondary.TButton',
+                  command=self.change_password).pack(side=tk.LEFT, padx=5)
+    
+    def _fetch_user(self, conn, user_id):
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+        return cursor.fetchone()
+    
+    def _fill_profile(self, profile_frame, user_data):
+        if user_data and profile_frame.winfo_exists():
             # Display user information
             fields = [
                 ("Username", user_data[1]),
@@ -669,16 +722,6 @@ class HealthMonitorApp:
                          style='AuthLabel.TLabel', width=15, anchor='e').pack(side=tk.LEFT)
                 ttk.Label(row_frame, text=value,
                          style='AuthTitle.TLabel', anchor='w').pack(side=tk.LEFT, padx=10)
-        
-        # Edit button
-        btn_frame = ttk.Frame(content_frame)
-        btn_frame.pack(pady=20)
-        
-        ttk.Button(btn_frame, text="Edit Profile", style='Primary.TButton',
-                  command=self.edit_profile).pack(side=tk.LEFT, padx=5)
-        
-        ttk.Button(btn_frame, text="Change Password", style='Secondary.TButton',
-                  command=self.change_password).pack(side=tk.LEFT, padx=5)
     
     def edit_profile(self):
         edit_window = tk.Toplevel(self.root)
@@ -686,9 +729,12 @@ class HealthMonitorApp:
         edit_window.geometry("500x400")
         
         # Get current user data
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (self.current_user['id'],))
-        user_data = cursor.fetchone()
+        self.executor.submit(self._fetch_user, self.current_user['id'],
+                             on_done=lambda user_data: self._build_edit_form(edit_window, user_data))
+    
+    def _build_edit_form(self, edit_window, user_data):
+        if not edit_window.winfo_exists():
+            return
         
         # Form fields
         fields = [
@@ -731,23 +777,30 @@ class HealthMonitorApp:
             diabetes_type = self.edit_vars['diabetes_type'].get()
             
             age = int(age) if age else None
-            
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                UPDATE users 
-                SET full_name = ?, age = ?, gender = ?, diabetes_type = ?
-                WHERE id = ?
-            ''', (full_name, age, gender, diabetes_type, self.current_user['id']))
-            self.conn.commit()
-            
+        except ValueError:
+            messagebox.showerror("Error", "Age must be a number")
+            return
+        
+        def on_saved(_):
             # Update current user data
             self.current_user['full_name'] = full_name
             
             window.destroy()
             self.show_profile()
             messagebox.showinfo("Success", "Profile updated successfully")
-        except ValueError:
-            messagebox.showerror("Error", "Age must be a number")
+        
+        self.executor.submit(self._update_profile,
+                             (full_name, age, gender, diabetes_type, self.current_user['id']),
+                             on_done=on_saved)
+    
+    def _update_profile(self, conn, values):
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE users 
+            SET full_name = ?, age = ?, gender = ?, diabetes_type = ?
+            WHERE id = ?
+        ''', values)
+        conn.commit()
     
     def change_password(self):
         pass_window = tk.Toplevel(self.root)
@@ -795,24 +848,33 @@ class HealthMonitorApp:
             messagebox.showerror("Error", "New passwords don't match")
             return
         
+        hashed_current = self.auth_module.hash_password(current_pass)
+        hashed_new = self.auth_module.hash_password(new_pass)
+        
+        def on_result(changed):
+            if not changed:
+                messagebox.showerror("Error", "Current password is incorrect")
+                return
+            messagebox.showinfo("Success", "Password changed successfully")
+            window.destroy()
+        
+        self.executor.submit(self._change_password, self.current_user['id'], hashed_current, hashed_new,
+                             on_done=on_result)
+    
+    def _change_password(self, conn, user_id, hashed_current, hashed_new):
         # Verify current password
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT password FROM users WHERE id = ?', (self.current_user['id'],))
+        cursor = conn.cursor()
+        cursor.execute('SELECT password FROM users WHERE id = ?', (user_id,))
         db_password = cursor.fetchone()[0]
         
-        hashed_current = self.auth_module.hash_password(current_pass)
         if hashed_current != db_password:
-            messagebox.showerror("Error", "Current password is incorrect")
-            return
+            return False
         
         # Update password
-        hashed_new = self.auth_module.hash_password(new_pass)
         cursor.execute('UPDATE users SET password = ? WHERE id = ?', 
-                      (hashed_new, self.current_user['id']))
-        self.conn.commit()
-        
-        messagebox.showinfo("Success", "Password changed successfully")
-        window.destroy()
+                      (hashed_new, user_id))
+        conn.commit()
+        return True
     
     def logout(self):
         self.current_user = None
@@ -821,12 +883,9 @@ class HealthMonitorApp:
 if __name__ == '__main__':
     root = tk.Tk()
     
-    try:
-        img = Image.open("assets/app_icon.png")
-        photo = ImageTk.PhotoImage(img)
+    photo = assets.photo("app_icon.png")
+    if photo:
         root.iconphoto(False, photo)
-    except:
-        pass
     
     app = HealthMonitorApp(root)
     root.mainloop()
@@ -0,0 +1,290 @@
+import math
+import numpy as np
+
+# Picks the best of several cheap forecasting models for one user's
+# readings with rolling-origin cross-validation: each fold trains on the
+# readings before an origin and is scored on the readings right after it,
+# so no fold ever sees its own future.
+#
+# The regression candidates differ only in their features, and their
+# normal equations at every origin come from prefix sums of f·fᵀ and f·y.
+# Every fold's fit is then one small batched solve, with no refitting
+# loop. Exponential smoothing levels are computed for the whole series in
+# vectorized blocks, and a fold's forecast is just the level at its origin.
+
+CV_FOLDS = 5
+MIN_TRAIN = 3
+SMOOTHING_ALPHAS = (0.1, 0.3, 0.5)
+# Reading hours grouped as night, morning, afternoon and evening
+TIME_OF_DAY_BUCKETS = 4
+# Small ridge on non-intercept terms so folds missing a category still solve
+RIDGE = 1e-3
+
+MEASUREMENT_TYPES = ["Fasting", "Before Meal", "After Meal", "Before Bed", "Random"]
+
+KIND_COLUMNS = {
+    'bp': ('bp_readings', ('systolic', 'diastolic')),
+    'bs': ('bs_readings', ('glucose_level',)),
+}
+
+
+class Series:
+    """One user's readings: ts (n,), values (n, targets), types (n,) codes or None"""
+
+    def __init__(self, ts, values, types=None):
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.ts), -1)
+        self.types = None if types is None else np.asarray(types, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def load_series(conn, user_id, kind, since_ts=None):
+    """The user's readings in time order, only those after since_ts if given"""
+    table, columns = KIND_COLUMNS[kind]
+    extra = ', measurement_type' if kind == 'bs' else ''
+    since = '' if since_ts is None else 'AND ts > ?'
+    params = (user_id,) if since_ts is None else (user_id, since_ts)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT ts, {", ".join(columns)}{extra}
+        FROM {table}
+        WHERE user_id = ? {since}
+        ORDER BY ts, id
+    ''', params)
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    ts = [row[0] for row in rows]
+    values = [row[1:1 + len(columns)] for row in rows]
+    types = None
+    if kind == 'bs':
+        codes = {name: i for i, name in enumerate(MEASUREMENT_TYPES)}
+        # Labels from other meters count as Random
+        types = [codes.get(row[-1], codes["Random"]) for row in rows]
+    return Series(ts, values, types)
+
+
+def _one_hot(codes, size):
+    # Drop the first category; it is absorbed by the intercept
+    return (codes[:, None] == np.arange(1, size)[None, :]).astype(float)
+
+
+def _features(name, series, first_ts=None):
+    # Days are counted from the first reading the model was trained on
+    days = (series.ts - (series.ts[0] if first_ts is None else first_ts)) / 86400.0
+    ones = np.ones((len(series), 1))
+    if name == 'mean':
+        return ones
+    trend = np.column_stack([ones, days])
+    if name == 'linear':
+        return trend
+    if name == 'time_of_day':
+        hours = (series.ts % 86400) // 3600
+        return np.column_stack([trend, _one_hot(hours * TIME_OF_DAY_BUCKETS // 24, TIME_OF_DAY_BUCKETS)])
+    if name == 'measurement_type':
+        return np.column_stack([trend, _one_hot(series.types, len(MEASUREMENT_TYPES))])
+    raise ValueError(f"Unknown model '{name}'")
+
+
+def candidates(series):
+    names = ['mean', 'linear', 'time_of_day']
+    if series.types is not None:
+        names.append('measurement_type')
+    return names + ['exp_smoothing']
+
+
+def _ridge(p):
+    penalty = np.full(p, RIDGE)
+    penalty[0] = 0.0
+    return np.diag(penalty)
+
+
+def _solve(gram, moments):
+    """Least-squares coefficients from stacked normal equations (..., p, p) and (..., p, k)"""
+    return np.linalg.solve(gram + _ridge(gram.shape[-1]), moments)
+
+
+def smoothed_levels(values, alpha, level=None):
+    """Simple exponential smoothing level after each reading
+
+    The level starts at the given one, or the first value if there is none.
+
+    Within a block, level_j = (1-α)^j · ((1-α)·carry + α·Σ (1-α)^-i · y_i), so
+    each block is one cumulative sum; blocks are short enough for (1-α)^-i
+    to stay finite.
+    """
+    values = np.asarray(values, dtype=float)
+    decay = 1 - alpha
+    block = max(1, int(600 / -math.log(decay)))
+    levels = np.empty_like(values)
+    carry = values[0] if level is None else level
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        i = np.arange(len(chunk))[:, None]
+        growth = decay ** -i
+        levels[start:start + len(chunk)] = decay ** i * (decay * carry + alpha * np.cumsum(chunk * growth, axis=0))
+        carry = levels[start + len(chunk) - 1]
+    return levels
+
+
+def _folds(n):
+    """Rolling origins and the test index block after each one"""
+    min_train = min(max(MIN_TRAIN, n // 2), n - 1)
+    horizon = max(1, (n - min_train) // CV_FOLDS)
+    origins = np.arange(min_train, n - horizon + 1, horizon)[:CV_FOLDS]
+    tests = origins[:, None] + np.arange(horizon)[None, :]
+    return origins, tests
+
+
+def _regression_folds(features, values, origins, tests):
+    # Gram and moment matrices summed between consecutive origins, then
+    # accumulated, give every origin's normal equations in one pass
+    outer = features[:, :, None] * features[:, None, :]
+    cross = features[:, :, None] * values[:, None, :]
+    bounds = np.concatenate([[0], origins])
+    gram = np.cumsum(np.add.reduceat(outer[:origins[-1]], bounds[:-1]), axis=0)
+    moments = np.cumsum(np.add.reduceat(cross[:origins[-1]], bounds[:-1]), axis=0)
+    coef = _solve(gram, moments)
+    return np.einsum('fhp,fpk->fhk', features[tests], coef)
+
+
+def _scores(actual, predicted):
+    errors = actual - predicted
+    mae = np.abs(errors).mean(axis=(0, 1))
+    rmse = np.sqrt((errors ** 2).mean(axis=(0, 1)))
+    total = ((actual - actual.mean(axis=(0, 1))) ** 2).sum(axis=(0, 1))
+    residual = (errors ** 2).sum(axis=(0, 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(total > 0, 1 - residual / total, np.where(residual == 0, 1.0, 0.0))
+    return mae, rmse, r2
+
+
+def cross_validate(series):
+    """Return {model: (mae, rmse, r2, alpha)}; metric arrays have one entry per target"""
+    origins, tests = _folds(len(series))
+    actual = series.values[tests]
+    results = {}
+    for name in candidates(series):
+        if name == 'exp_smoothing':
+            best = None
+            for alpha in SMOOTHING_ALPHAS:
+                levels = smoothed_levels(series.values, alpha)
+                predicted = np.broadcast_to(levels[origins - 1][:, None, :], actual.shape)
+                scores = _scores(actual, predicted) + (alpha,)
+                if best is None or scores[1].sum() < best[1].sum():
+                    best = scores
+            results[name] = best
+        else:
+            predicted = _regression_folds(_features(name, series), series.values, origins, tests)
+            results[name] = _scores(actual, predicted) + (None,)
+    return results
+
+
+class SelectedModel:
+    """The winning model for one target, refitted on the whole series
+
+    Regression models keep their normal equations rather than just the
+    coefficients, so readings added later extend the fit exactly without
+    revisiting the history.
+    """
+
+    def __init__(self, name, target, first_ts, alpha=None):
+        self.name = name
+        self.target = target
+        self.first_ts = first_ts
+        self.alpha = alpha
+        self.level = None
+        self.gram = None
+        self.moments = None
+        # ts of the newest reading folded in; forecasts start the day after
+        self.last_ts = None
+
+    @classmethod
+    def fit(cls, name, series, target, alpha=None):
+        model = cls(name, target, int(series.ts[0]), alpha)
+        model.update(series)
+        return model
+
+    def update(self, series):
+        """Fold readings newer than everything seen so far into the model"""
+        if not len(series):
+            return
+        self.last_ts = int(series.ts[-1])
+        values = series.values[:, self.target]
+        if self.name == 'exp_smoothing':
+            self.level = smoothed_levels(values[:, None], self.alpha, self.level)[-1, 0]
+            return
+        features = _features(self.name, series, self.first_ts)
+        if self.gram is None:
+            self.gram = np.zeros((features.shape[1], features.shape[1]))
+            self.moments = np.zeros(features.shape[1])
+        self.gram += features.T @ features
+        self.moments += features.T @ values
+
+    @property
+    def coef(self):
+        return _solve(self.gram, self.moments[:, None])[:, 0]
+
+    @property
+    def mix(self):
+        # Forecasts assume the user's usual mix of times of day / reading types;
+        # the intercept row of the Gram matrix holds each feature's sum
+        return self.gram[0, 2:] / self.gram[0, 0]
+
+    def to_bytes(self):
+        if self.name == 'exp_smoothing':
+            params = [self.alpha, self.level]
+        else:
+            params = np.concatenate([self.gram.ravel(), self.moments])
+        return np.asarray(params, dtype='<f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, name, target, first_ts, blob, last_ts=None):
+        params = np.frombuffer(blob, dtype='<f8')
+        if name == 'exp_smoothing':
+            model = cls(name, target, first_ts, float(params[0]))
+            model.level = float(params[1])
+            model.last_ts = last_ts
+            return model
+        model = cls(name, target, first_ts)
+        model.last_ts = last_ts
+        # p² Gram entries followed by p moments
+        p = int(math.isqrt(len(params)))
+        model.gram = params[:p * p].reshape(p, p).copy()
+        model.moments = params[p * p:].copy()
+        return model
+
+    def predict_days(self, day_numbers):
+        """Forecast at midday of each day number (days since 1970-01-01)"""
+        day_numbers = np.asarray(day_numbers, dtype=float)
+        if self.name == 'exp_smoothing':
+            return np.full(len(day_numbers), self.level)
+        coef = self.coef
+        if self.name == 'mean':
+            return np.full(len(day_numbers), coef[0])
+        days = day_numbers + 0.5 - self.first_ts / 86400.0
+        return coef[0] + coef[1] * days + self.mix @ coef[2:]
+
+
+def select_models(series, labels):
+    """Cross-validate every candidate and return one evaluation dict per target label"""
+    scores = cross_validate(series)
+    results = {}
+    for target, label in enumerate(labels):
+        # Lowest RMSE wins; ties go to the simpler model listed first
+        name = min(scores, key=lambda model: scores[model][1][target])
+        mae, rmse, r2, alpha = scores[name]
+        results[label] = {
+            'model': label,
+            'selected': name,
+            'mae': round(float(mae[target]), 2),
+            'rmse': round(float(rmse[target]), 2),
+            'r2': round(float(r2[target]), 2),
+            'candidates': {model: {'mae': round(float(s[0][target]), 2),
+                                   'rmse': round(float(s[1][target]), 2)}
+                           for model, s in scores.items()},
+            'model_object': SelectedModel.fit(name, series, target, alpha),
+        }
+    return results
@@ -0,0 +1,143 @@
+import json
+from datetime import datetime
+from model_selection import SelectedModel, load_series, select_models
+
+# Keeps each user's selected forecast models in the fitted_models table so
+# a restart or a new PredictModule does not redo cross-validation. A stored
+# model covers the readings up to its watermark. Readings added after it
+# are folded in incrementally, and only those readings are read.
+#
+# reading_versions counts edits and deletes separately from other writes.
+# The stored models are only extended when no reading was edited and the
+# trend_stats count grew by exactly the readings after the watermark, so
+# nothing was backdated. Otherwise they are reselected from the full
+# history, as they are once the history has grown enough since the last
+# selection.
+
+MODEL_FORMAT = 1
+MIN_READINGS = 3
+# Re-run cross-validation once the history has grown by this fraction
+RESELECT_GROWTH = 0.25
+
+TARGETS = {'bp': ['systolic', 'diastolic'], 'bs': ['glucose']}
+
+
+class StoredModel:
+    def __init__(self, row):
+        (self.target, self.model, self.format, self.first_ts, self.watermark, self.data_version,
+         self.edits, self.n, self.selected_n, self.mae, self.rmse, self.r2, self.candidates, self.params) = row
+
+
+class ModelStore:
+    def __init__(self, conn, readonly=False):
+        self.conn = conn
+        # Read-only connections (worker processes) can use stored models but never save
+        self.readonly = readonly
+
+    def load(self, user_id, kind, conn=None):
+        """Stored models by target, or None unless every target has a current one"""
+        cursor = (conn or self.conn).cursor()
+        cursor.execute('''
+            SELECT target, model, format, first_ts, watermark, data_version, edits, n, selected_n,
+                   mae, rmse, r2, candidates, params
+            FROM fitted_models
+            WHERE user_id = ? AND kind = ?
+        ''', (user_id, kind))
+        stored = {row[0]: StoredModel(row) for row in cursor.fetchall()}
+        if sorted(stored) != sorted(TARGETS[kind]):
+            return None
+        if any(model.format != MODEL_FORMAT for model in stored.values()):
+            return None
+        # Targets are always saved together, so they share a watermark
+        if len({(model.watermark, model.data_version) for model in stored.values()}) != 1:
+            return None
+        return stored
+
+    def fetch(self, user_id, kind, conn=None):
+        """Read what evaluate needs: (stored, series, versions); safe on a worker thread
+
+        With usable stored models, series holds only the readings after their
+        watermark (None if there are none). Otherwise stored is None and
+        series is the full history.
+        """
+        conn = conn or self.conn
+        # Read before the readings, so a concurrent write can only force a reselect
+        row = conn.execute('SELECT version, edits FROM reading_versions WHERE user_id = ? AND kind = ?',
+                           (user_id, kind)).fetchone()
+        versions = row or (0, 0)
+        stored = self.load(user_id, kind, conn)
+        if stored is not None:
+            current = next(iter(stored.values()))
+            if versions[0] == current.data_version:
+                return stored, None, versions
+            if versions[1] == current.edits:
+                new = load_series(conn, user_id, kind, since_ts=current.watermark)
+                total = conn.execute('SELECT n FROM trend_stats WHERE user_id = ? AND kind = ?',
+                                     (user_id, kind)).fetchone()
+                total = total[0] if total else 0
+                appended_only = total == current.n + (len(new) if new is not None else 0)
+                if appended_only and total <= current.selected_n * (1 + RESELECT_GROWTH):
+                    return stored, new, versions
+        return None, load_series(conn, user_id, kind), versions
+
+    def evaluate(self, user_id, kind, fetched):
+        """Selected models and metrics in select_models form, saving any change
+
+        Returns None when the user has too few readings.
+        """
+        stored, series, versions = fetched
+        labels = TARGETS[kind]
+        if stored is None:
+            if series is None or len(series) < MIN_READINGS:
+                return None
+            results = select_models(series, labels)
+            self.save(user_id, kind, results, int(series.ts[-1]), versions, len(series), len(series))
+            return results
+
+        results = {}
+        for index, label in enumerate(labels):
+            record = stored[label]
+            model = SelectedModel.from_bytes(record.model, index, record.first_ts, record.params,
+                                             record.watermark)
+            if series is not None:
+                model.update(series)
+            results[label] = {
+                'model': label,
+                'selected': record.model,
+                'mae': record.mae,
+                'rmse': record.rmse,
+                'r2': record.r2,
+                'candidates': json.loads(record.candidates),
+                'model_object': model,
+            }
+        if series is not None:
+            current = stored[labels[0]]
+            self.save(user_id, kind, results, int(series.ts[-1]), versions, current.n + len(series),
+                      current.selected_n)
+        return results
+
+    def save(self, user_id, kind, results, watermark, versions, n, selected_n):
+        if self.readonly:
+            return
+        created_at = datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for label, result in results.items():
+            model = result['model_object']
+            rows.append((user_id, kind, label, model.name, MODEL_FORMAT, model.first_ts, watermark,
+                         versions[0], versions[1], n, selected_n, result['mae'], result['rmse'], result['r2'],
+                         json.dumps(result['candidates']), model.to_bytes(), created_at))
+        self.conn.executemany('''
+            INSERT OR REPLACE INTO fitted_models
+                (user_id, kind, target, model, format, first_ts, watermark, data_version, edits,
+                 n, selected_n, mae, rmse, r2, candidates, params, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        self.conn.commit()
+
+    def clear(self, user_id=None):
+        """Forget stored models for one user, or for everyone"""
+        if user_id is None:
+            self.conn.execute('DELETE FROM fitted_models')
+        else:
+            self.conn.execute('DELETE FROM fitted_models WHERE user_id = ?', (user_id,))
+        self.conn.commit()
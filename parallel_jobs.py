@@ -0,0 +1,184 @@
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from db import DB_PATH, connect
+
+# Runs a per-user job for many users across a process pool. User ids are
+# split into shards; each worker process opens one read-only connection
+# and runs the job for every user in a shard. Results come back in the
+# order the ids were given, whatever order the shards finish in.
+#
+# Jobs are module-level functions called as job(conn, user_id, *args) so
+# they can be pickled; they should write files rather than the database.
+# Workers only read, so the schema is migrated once, up front, with a
+# read-write connection.
+
+SHARDS_PER_WORKER = 4
+
+_worker_conn = None
+
+
+class UserResult:
+    def __init__(self, user_id, value=None, error=None):
+        self.user_id = user_id
+        self.value = value
+        self.error = error
+
+
+def _open_worker_connection(db_path):
+    global _worker_conn
+    _worker_conn = connect(db_path, readonly=True)
+
+
+def _run_shard(job, user_ids, args):
+    results = []
+    for user_id in user_ids:
+        try:
+            results.append(UserResult(user_id, job(_worker_conn, user_id, *args)))
+        except Exception as e:
+            # One bad user should not sink the whole population job
+            results.append(UserResult(user_id, error=f"{type(e).__name__}: {e}"))
+    return results
+
+
+def prepare_database(db_path=DB_PATH):
+    """Migrate db_path to the current schema, so read-only connections find every table"""
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No database at {db_path}")
+    connect(db_path).close()
+
+
+def run_sharded(job, user_ids, *args, db_path=DB_PATH, workers=None, shard_size=None,
+                progress=None):
+    """Run job(conn, user_id, *args) for every user and return UserResults in input order
+
+    workers defaults to the CPU count; 1 runs everything in this process.
+    progress, if given, is called as progress(users_done, users_total).
+    """
+    user_ids = list(user_ids)
+    workers = workers or os.cpu_count() or 1
+    if not user_ids:
+        return []
+    prepare_database(db_path)
+    if shard_size is None:
+        # Several shards per worker so a slow shard does not leave cores idle
+        shard_size = max(1, math.ceil(len(user_ids) / (workers * SHARDS_PER_WORKER)))
+    shards = [user_ids[i:i + shard_size] for i in range(0, len(user_ids), shard_size)]
+
+    if workers == 1:
+        _open_worker_connection(db_path)
+        results = []
+        try:
+            for shard in shards:
+                results.extend(_run_shard(job, shard, args))
+                if progress:
+                    progress(len(results), len(user_ids))
+        finally:
+            _worker_conn.close()
+        return results
+
+    shard_results = [None] * len(shards)
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_connection,
+                             initargs=(db_path,)) as pool:
+        futures = {pool.submit(_run_shard, job, shard, args): index
+                   for index, shard in enumerate(shards)}
+        for future in as_completed(futures):
+            index = futures[future]
+            shard_results[index] = future.result()
+            done += len(shards[index])
+            if progress:
+                progress(done, len(user_ids))
+    return [result for shard in shard_results for result in shard]
+
+
+def all_user_ids(db_path=DB_PATH):
+    conn = connect(db_path, readonly=True)
+    try:
+        return [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def evaluate_user(conn, user_id, kind):
+    """Cross-validated metrics of the user's selected models, or None with too few readings"""
+    from model_store import ModelStore
+    from predict_module import PredictModule
+    predict = PredictModule(conn, model_store=ModelStore(conn, readonly=True))
+    method = predict.predict_bp if kind == 'bp' else predict.predict_bs
+    result = method(user_id, evaluate=True)
+    if result is None:
+        return None
+    evaluation = result[1]
+    if kind == 'bs':
+        evaluation = {'glucose': evaluation}
+    return {target: {k: v for k, v in metrics.items() if k != 'model_object'}
+            for target, metrics in evaluation.items()}
+
+
+def report_user(conn, user_id, kind, out_dir):
+    """Write the user's PDF report into out_dir and return its path, or None without data"""
+    from report_engine import write_report
+    username = conn.execute('SELECT username FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+    path = os.path.join(out_dir, f"{kind}_report_{user_id}_{username}.pdf")
+    if write_report(conn, user_id, kind, path) is None:
+        return None
+    return path
+
+
+def _print_progress(done, total):
+    print(f"\r{done:,}/{total:,} users", end='' if done < total else '\n', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run per-user jobs in parallel across processes")
+    parser.add_argument('job', choices=['evaluate', 'reports'])
+    parser.add_argument('kind', choices=['bp', 'bs'])
+    parser.add_argument('--users', type=int, nargs='+', help="user ids (default: every user)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--shard-size', type=int, help="users per task")
+    parser.add_argument('--out-dir', default='reports', help="where report PDFs are written")
+    parser.add_argument('--output', help="CSV file for evaluation metrics")
+    parser.add_argument('--db', default=DB_PATH, help="database path")
+    args = parser.parse_args(argv)
+
+    try:
+        prepare_database(args.db)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    user_ids = args.users or all_user_ids(args.db)
+    if args.job == 'reports':
+        os.makedirs(args.out_dir, exist_ok=True)
+        job, job_args = report_user, (args.kind, args.out_dir)
+    else:
+        job, job_args = evaluate_user, (args.kind,)
+
+    start = time.perf_counter()
+    results = run_sharded(job, user_ids, *job_args, db_path=args.db, workers=args.workers,
+                          shard_size=args.shard_size, progress=_print_progress)
+    elapsed = time.perf_counter() - start
+
+    errors = [r for r in results if r.error]
+    for result in errors[:10]:
+        print(f"user {result.user_id}: {result.error}")
+    done = sum(1 for r in results if r.value is not None)
+    print(f"{done:,} of {len(results):,} users done, {len(errors):,} failed, in {elapsed:.1f}s")
+
+    if args.job == 'evaluate' and args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user_id', 'target', 'model', 'mae', 'rmse', 'r2'])
+            for result in results:
+                for target, metrics in (result.value or {}).items():
+                    writer.writerow([result.user_id, target, metrics['selected'], metrics['mae'],
+                                     metrics['rmse'], metrics['r2']])
+        print(f"Metrics written to {args.output}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
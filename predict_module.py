@@ -1,224 +1,250 @@
+import threading
+from collections import OrderedDict
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.model_selection import train_test_split
-from datetime import datetime, timedelta
+from trend_model import LinearTrend
+from model_store import ModelStore
+from datetime import date, timedelta
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
-import math
+from chart_image import ChartImage, new_figure
+
+# Fitted predictions and rendered charts are kept per user and reading
+# version (bumped by triggers on every insert, update or delete), so
+# repeated views are served from memory until the data changes.
+CACHE_SIZE = 64
 
 class PredictModule:
-    def __init__(self, db_conn):
+    def __init__(self, db_conn, cache_size=CACHE_SIZE, model_store=None):
         self.conn = db_conn
-        
-    def prepare_bp_data(self, user_id):
-        cursor = self.conn.cursor()
+        # Selected models persist in the database between runs
+        self.model_store = model_store or ModelStore(db_conn)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+    def data_version(self, user_id, metric, conn=None):
+        cursor = (conn or self.conn).cursor()
+        cursor.execute('SELECT version FROM reading_versions WHERE user_id = ? AND kind = ?',
+                       (user_id, metric))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+        
+    def prefetch(self, user_id, metric, conn, *params):
+        """Return (key, hit, payload): the cached result on a hit, else the data to fit
+
+        'forecast' views load the trend_stats sums, 'select' views the stored
+        models and readings since them; other views load the history.
+        
+        Safe to run on a worker thread. The version is read before the data,
+        so a concurrent write can only make the entry miss, never go stale.
+        """
+        key = (user_id, metric, self.data_version(user_id, metric, conn)) + params
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return key, True, self._cache[key]
+        if params and params[0] == 'forecast':
+            return key, False, self.load_trend_stats(user_id, metric, conn)
+        if params and params[0] == 'select':
+            return key, False, self.model_store.fetch(user_id, metric, conn)
+        prepare = self.prepare_bp_data if metric == 'bp' else self.prepare_bs_data
+        return key, False, prepare(user_id, conn)
+        
+    def resolve(self, prefetched, compute):
+        """Finish a prefetch on the UI thread, calling compute(data) on a miss"""
+        key, hit, payload = prefetched
+        if hit:
+            return payload
+        result = compute(payload)
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+        
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+        
+    def load_trend_stats(self, user_id, metric, conn=None):
+        """Return the trend_stats sums (n, Σx, Σx², Σy1, Σxy1, Σy2, Σxy2) and newest ts, or None"""
+        table = 'bp_readings' if metric == 'bp' else 'bs_readings'
+        cursor = (conn or self.conn).cursor()
+        # MAX(ts) is one seek on the (user_id, ts) index
+        cursor.execute(f'''
+            SELECT n, sum_x, sum_xx, sum_y1, sum_xy1, sum_y2, sum_xy2,
+                   (SELECT MAX(ts) FROM {table} WHERE user_id = ?)
+            FROM trend_stats
+            WHERE user_id = ? AND kind = ?
+        ''', (user_id, user_id, metric))
+        return cursor.fetchone()
+        
+    def prepare_bp_data(self, user_id, conn=None):
+        cursor = (conn or self.conn).cursor()
         cursor.execute('''
-            SELECT date, time, systolic, diastolic 
+            SELECT ts, systolic, diastolic 
             FROM bp_readings 
             WHERE user_id = ?
-            ORDER BY date, time
+            ORDER BY ts
         ''', (user_id,))
         
         data = cursor.fetchall()
         if not data:
             return None
             
-        df = pd.DataFrame(data, columns=['date', 'time', 'systolic', 'diastolic'])
-        df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        df['days_since_first'] = (df['datetime'] - df['datetime'].min()).dt.days
+        df = pd.DataFrame(data, columns=['ts', 'systolic', 'diastolic'])
+        df['datetime'] = pd.to_datetime(df['ts'], unit='s')
+        df['days_since_first'] = (df['ts'] - df['ts'].iloc[0]) // 86400
         
         return df[['days_since_first', 'systolic', 'diastolic', 'datetime']]
         
-    def prepare_bs_data(self, user_id):
-        cursor = self.conn.cursor()
+    def prepare_bs_data(self, user_id, conn=None):
+        cursor = (conn or self.conn).cursor()
         cursor.execute('''
-            SELECT date, time, glucose_level 
+            SELECT ts, glucose_level 
             FROM bs_readings 
             WHERE user_id = ?
-            ORDER BY date, time
+            ORDER BY ts
         ''', (user_id,))
         
         data = cursor.fetchall()
         if not data:
             return None
             
-        df = pd.DataFrame(data, columns=['date', 'time', 'glucose'])
-        df['datetime'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        df['days_since_first'] = (df['datetime'] - df['datetime'].min()).dt.days
+        df = pd.DataFrame(data, columns=['ts', 'glucose'])
+        df['datetime'] = pd.to_datetime(df['ts'], unit='s')
+        df['days_since_first'] = (df['ts'] - df['ts'].iloc[0]) // 86400
         
         return df[['days_since_first', 'glucose', 'datetime']]
         
-    def evaluate_model(self, X, y, model_name=""):
-        """Evaluate model performance using train-test split"""
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
-        
-        model = LinearRegression()
-        model.fit(X_train, y_train)
-        
-        # Make predictions
-        y_pred = model.predict(X_test)
-        
-        # Calculate metrics
-        mae = mean_absolute_error(y_test, y_pred)
-        mse = mean_squared_error(y_test, y_pred)
-        rmse = math.sqrt(mse)
-        r2 = r2_score(y_test, y_pred)
-        
-        return {
-            'model': model_name,
-            'mae': round(mae, 2),
-            'rmse': round(rmse, 2),
-            'r2': round(r2, 2),
-            'model_object': model
-        }
-        
     def predict_bp(self, user_id, days_ahead=7, include_visualization=False, evaluate=False):
-        data = self.prepare_bp_data(user_id)
-        if data is None or len(data) < 3:
+        if not evaluate:
+            # Forecasts come from the incrementally kept sums, not the history
+            prefetched = self.prefetch(user_id, 'bp', self.conn, 'forecast', days_ahead, include_visualization)
+            return self.resolve(prefetched, lambda stats: self.forecast_from_stats(
+                'bp', stats, days_ahead, include_visualization))
+        # Model selection runs once per reading version; repeats hit the cache
+        prefetched = self.prefetch(user_id, 'bp', self.conn, 'select', days_ahead, include_visualization)
+        return self.resolve(prefetched, lambda fetched: self.forecast_selected(
+            'bp', self.model_store.evaluate(user_id, 'bp', fetched), days_ahead, include_visualization))
+        
+    def forecast_from_stats(self, metric, stats, days_ahead=7, include_visualization=False):
+        """Forecast the days after the last reading from load_trend_stats output"""
+        if stats is None or stats[0] < 3:
             return None
-            
-        X = data[['days_since_first']]
-        y_sys = data['systolic']
-        y_dia = data['diastolic']
-        
-        evaluation_results = {}
-        if evaluate:
-            evaluation_results['systolic'] = self.evaluate_model(X, y_sys, "Systolic BP")
-            evaluation_results['diastolic'] = self.evaluate_model(X, y_dia, "Diastolic BP")
-            model_sys = evaluation_results['systolic']['model_object']
-            model_dia = evaluation_results['diastolic']['model_object']
-        else:
-            model_sys = LinearRegression()
-            model_dia = LinearRegression()
-            model_sys.fit(X, y_sys)
-            model_dia.fit(X, y_dia)
         
-        # Predict for future dates
-        last_day = data['days_since_first'].max()
-        future_days = pd.DataFrame(range(last_day + 1, last_day + days_ahead + 1), 
-                                 columns=['days_since_first'])
+        n, sum_x, sum_xx, sum_y1, sum_xy1, sum_y2, sum_xy2, last_ts = stats
+        if metric == 'bp':
+            model = LinearTrend.from_sums(n, sum_x, sum_xx, [sum_y1, sum_y2], [sum_xy1, sum_xy2])
+        else:
+            model = LinearTrend.from_sums(n, sum_x, sum_xx, sum_y1, sum_xy1)
         
-        sys_pred = model_sys.predict(future_days)
-        dia_pred = model_dia.predict(future_days)
+        # x is the day number of the reading's wall-clock date. The trend is
+        # carried on from the last reading, not across any gap up to today.
+        last_day = last_ts // 86400
+        pred = model.predict(np.arange(last_day + 1, last_day + days_ahead + 1))
+        future_dates = [date(1970, 1, 1) + timedelta(days=last_day + i + 1) for i in range(days_ahead)]
         
-        # Create prediction results
-        last_date = datetime.now()
         predictions = []
-        for i in range(days_ahead):
-            pred_date = last_date + timedelta(days=i+1)
-            predictions.append({
-                'date': pred_date.strftime('%Y-%m-%d'),
-                'systolic': round(sys_pred[i]),
-                'diastolic': round(dia_pred[i])
-            })
-        
-        if include_visualization:
-            visualization = self._generate_bp_visualization(data, future_days, sys_pred, dia_pred)
-            if evaluate:
-                return predictions, visualization, evaluation_results
-            return predictions, visualization
-            
-        if evaluate:
-            return predictions, evaluation_results
-        return predictions
-        
-    def predict_bs(self, user_id, days_ahead=7, include_visualization=False, evaluate=False):
-        data = self.prepare_bs_data(user_id)
-        if data is None or len(data) < 3:
+        for i, pred_date in enumerate(future_dates):
+            if metric == 'bp':
+                predictions.append({
+                    'date': pred_date.strftime('%Y-%m-%d'),
+                    'systolic': round(pred[i, 0]),
+                    'diastolic': round(pred[i, 1])
+                })
+            else:
+                predictions.append({
+                    'date': pred_date.strftime('%Y-%m-%d'),
+                    'glucose': round(pred[i])
+                })
+        
+        if not include_visualization:
+            return predictions
+        if metric == 'bp':
+            return predictions, self._generate_bp_visualization(future_dates, pred[:, 0], pred[:, 1])
+        return predictions, self._generate_bs_visualization(future_dates, pred)
+        
+    def forecast_selected(self, metric, selection, days_ahead=7, include_visualization=False):
+        """Forecast with the models that won time-series cross-validation (ModelStore.evaluate output)"""
+        if selection is None:
             return None
-            
-        X = data[['days_since_first']]
-        y = data['glucose']
-        
-        evaluation_results = {}
-        if evaluate:
-            evaluation_results = self.evaluate_model(X, y, "Blood Sugar")
-            model = evaluation_results['model_object']
-        else:
-            model = LinearRegression()
-            model.fit(X, y)
         
-        # Predict for future dates
-        last_day = data['days_since_first'].max()
-        future_days = pd.DataFrame(range(last_day + 1, last_day + days_ahead + 1), 
-                                  columns=['days_since_first'])
+        labels = list(selection)
         
-        pred = model.predict(future_days)
+        # Forecasts carry on from the newest reading, not from today
+        last_day = max(selection[label]['model_object'].last_ts for label in labels) // 86400
+        day_numbers = np.arange(last_day + 1, last_day + days_ahead + 1)
+        pred = {label: selection[label]['model_object'].predict_days(day_numbers) for label in labels}
+        future_dates = [date(1970, 1, 1) + timedelta(days=int(day)) for day in day_numbers]
         
-        # Create prediction results
-        last_date = datetime.now()
         predictions = []
-        for i in range(days_ahead):
-            pred_date = last_date + timedelta(days=i+1)
-            predictions.append({
-                'date': pred_date.strftime('%Y-%m-%d'),
-                'glucose': round(pred[i])
-            })
+        for i, pred_date in enumerate(future_dates):
+            prediction = {'date': pred_date.strftime('%Y-%m-%d')}
+            for label in labels:
+                prediction[label] = round(pred[label][i])
+            predictions.append(prediction)
+        
+        # Copies, so the selection handed in is left as it was
+        if metric == 'bp':
+            evaluation_results = {label: dict(selection[label]) for label in labels}
+            evaluation_results['systolic']['model'] = "Systolic BP"
+            evaluation_results['diastolic']['model'] = "Diastolic BP"
+        else:
+            evaluation_results = dict(selection['glucose'])
+            evaluation_results['model'] = "Blood Sugar"
         
         if include_visualization:
-            visualization = self._generate_bs_visualization(data, future_days, pred)
-            if evaluate:
-                return predictions, visualization, evaluation_results
-            return predictions, visualization
-            
-        if evaluate:
-            return predictions, evaluation_results
-        return predictions
-    
-    def _generate_bp_visualization(self, historical_data, future_days, sys_pred, dia_pred):
-        plt.figure(figsize=(12, 6))
+            if metric == 'bp':
+                visualization = self._generate_bp_visualization(future_dates, pred['systolic'], pred['diastolic'])
+            else:
+                visualization = self._generate_bs_visualization(future_dates, pred['glucose'])
+            return predictions, visualization, evaluation_results
+        return predictions, evaluation_results
         
-        # Prepare future dates
-        last_date = historical_data['datetime'].max()
-        future_dates = [last_date + timedelta(days=int(days-historical_data['days_since_first'].max())) 
-                       for days in future_days['days_since_first']]
+    def predict_bs(self, user_id, days_ahead=7, include_visualization=False, evaluate=False):
+        if not evaluate:
+            prefetched = self.prefetch(user_id, 'bs', self.conn, 'forecast', days_ahead, include_visualization)
+            return self.resolve(prefetched, lambda stats: self.forecast_from_stats(
+                'bs', stats, days_ahead, include_visualization))
+        prefetched = self.prefetch(user_id, 'bs', self.conn, 'select', days_ahead, include_visualization)
+        return self.resolve(prefetched, lambda fetched: self.forecast_selected(
+            'bs', self.model_store.evaluate(user_id, 'bs', fetched), days_ahead, include_visualization))
+        
+    def _generate_bp_visualization(self, future_dates, sys_pred, dia_pred):
+        fig = new_figure()
+        ax = fig.add_subplot()
         
         # Plot only predictions (no historical data)
-        plt.plot(future_dates, sys_pred, 'b-o', label='Predicted Systolic')
-        plt.plot(future_dates, dia_pred, 'g-o', label='Predicted Diastolic')
+        ax.plot(future_dates, sys_pred, 'b-o', label='Predicted Systolic')
+        ax.plot(future_dates, dia_pred, 'g-o', label='Predicted Diastolic')
         
         # Formatting
-        plt.title('Blood Pressure Prediction')
-        plt.xlabel('Date')
-        plt.ylabel('Blood Pressure (mmHg)')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        return self._fig_to_base64()
+        ax.set_title('Blood Pressure Prediction')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Blood Pressure (mmHg)')
+        ax.legend()
+        ax.grid(True)
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+        
+        return ChartImage.from_figure(fig)
     
-    def _generate_bs_visualization(self, historical_data, future_days, pred):
-        plt.figure(figsize=(12, 6))
-        
-        # Prepare future dates
-        last_date = historical_data['datetime'].max()
-        future_dates = [last_date + timedelta(days=int(days-historical_data['days_since_first'].max())) 
-                       for days in future_days['days_since_first']]
+    def _generate_bs_visualization(self, future_dates, pred):
+        fig = new_figure()
+        ax = fig.add_subplot()
         
         # Plot only predictions (no historical data)
-        plt.plot(future_dates, pred, 'r-o', label='Predicted Glucose')
+        ax.plot(future_dates, pred, 'r-o', label='Predicted Glucose')
         
         # Formatting
-        plt.title('Blood Sugar Prediction')
-        plt.xlabel('Date')
-        plt.ylabel('Glucose Level (mg/dL)')
-        plt.legend()
-        plt.grid(True)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        return self._fig_to_base64()
-    
-    def _fig_to_base64(self):
-        img = io.BytesIO()
-        plt.savefig(img, format='png')
-        img.seek(0)
-        plt.close()
-        return base64.b64encode(img.getvalue()).decode('utf-8')
+        ax.set_title('Blood Sugar Prediction')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Glucose Level (mg/dL)')
+        ax.legend()
+        ax.grid(True)
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+        
+        return ChartImage.from_figure(fig)
     
@@ -0,0 +1,450 @@
+import os
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+from aggregates import describe
+from chart_image import ChartImage
+from downsample import decimate
+from rollups import day_number, summarize
+from trend_renderer import BPTrendLayout, BSTrendLayout, figures
+
+# PDF reports over a user's whole history or any date range. Readings are
+# streamed from SQLite with fetchmany() in chunks of CHUNK_ROWS and written
+# straight into table rows, so no DataFrame of the history is ever built.
+# The table continues over as many pages as it needs, repeating its header
+# on each one. Statistics are aggregated in SQLite. The trend chart streams
+# the readings once more and keeps, chunk by chunk, only the points its
+# pixel columns can show, so it holds a few points per column at most.
+#
+# fpdf assembles the document before writing it, so a report still holds
+# its own page content; what no longer grows with the history is the
+# Python-side copy of the readings.
+
+CHUNK_ROWS = 2000
+ROW_HEIGHT = 6
+# Width of the embedded chart in mm; the page is 190 mm inside its margins
+CHART_WIDTH = 190
+
+RED = (255, 0, 0)
+ORANGE = (255, 165, 0)
+GREEN = (0, 128, 0)
+BLACK = (0, 0, 0)
+
+
+def _text(value, limit=None):
+    # The core PDF fonts are latin-1 only
+    text = '' if value is None else str(value)
+    if limit is not None:
+        text = text[:limit]
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def _period(start, end):
+    """SQL condition and params on ts for days start..end (inclusive, None for open)"""
+    condition, params = ['user_id = ?'], []
+    if start is not None:
+        condition.append('ts >= ?')
+        params.append(day_number(start) * 86400)
+    if end is not None:
+        condition.append('ts < ?')
+        params.append((day_number(end) + 1) * 86400)
+    return ' AND '.join(condition), params
+
+
+class ReportResult:
+    def __init__(self, out):
+        self.out = out
+        self.rows = 0
+        self.pages = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return "\n".join([
+            f"Readings: {self.rows}",
+            f"Pages: {self.pages}",
+            f"Throughput: {self.rows_per_sec:,.0f} rows/sec",
+        ])
+
+
+class _Buffer:
+    """The document fpdf assembles on output, kept as a list of lines"""
+
+    def __init__(self):
+        self.lines = []
+        self.length = 0
+
+    def __iadd__(self, line):
+        self.lines.append(line)
+        self.length += len(line)
+        return self
+
+    def __len__(self):
+        return self.length
+
+    def getvalue(self):
+        return ''.join(self.lines)
+
+
+class ReportPDF(FPDF):
+    """FPDF that repeats the current table header at the top of each page"""
+
+    def __init__(self):
+        super().__init__()
+        # fpdf 1.7 appends each output line to one string, copying the whole
+        # document every time: quadratic in its size for long reports. The
+        # buffer is private, so it is only swapped while it is that string.
+        if isinstance(self.buffer, str):
+            self.buffer = _Buffer()
+        self.table = None
+        self.alias_nb_pages()
+
+    def save(self, out):
+        """Finish the document and write it to out, a path or binary file object"""
+        if self.state < 3:
+            self.close()
+        if isinstance(self.buffer, _Buffer):
+            data = self.buffer.getvalue().encode('latin-1')
+        else:
+            data = self.output(dest='S')
+            data = data.encode('latin-1') if isinstance(data, str) else bytes(data)
+        if isinstance(out, (str, os.PathLike)):
+            with open(out, 'wb') as f:
+                f.write(data)
+        else:
+            out.write(data)
+
+    def header(self):
+        if self.table is not None:
+            self.table_header()
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font("Arial", 'I', 8)
+        self.set_text_color(*BLACK)
+        self.cell(0, 10, f"Page {self.page_no()}/{{nb}}", 0, 0, 'C')
+
+    def table_header(self):
+        headers, widths = self.table
+        self.set_font("Arial", 'B', 8)
+        self.set_fill_color(200, 220, 255)  # Light blue
+        self.set_text_color(*BLACK)
+        for header, width in zip(headers, widths):
+            self.cell(width, ROW_HEIGHT, header, 1, 0, 'C', 1)
+        self.ln()
+        self.set_font("Arial", size=8)
+
+
+class ReadingReport:
+    """One kind of reading report; subclasses give its table, colors and summary"""
+    kind = None
+    title = ''
+    table = ''
+    # Table columns, in the order they are selected and shown
+    columns = ()
+    headers = ()
+    widths = ()
+    # Indexes of the cells colored by row_color()
+    colored = ()
+    notes_chars = 40
+    stats_columns = ()
+    layout_class = None
+
+    def __init__(self, conn, user_id, start=None, end=None, charts=True, chunk_rows=CHUNK_ROWS):
+        self.conn = conn
+        self.user_id = user_id
+        self.start = start
+        self.end = end
+        self.charts = charts
+        self.chunk_rows = chunk_rows
+        self.where, self.params = _period(start, end)
+
+    def count(self):
+        return self.conn.execute(f'SELECT COUNT(*) FROM {self.table} WHERE {self.where}',
+                                 [self.user_id] + self.params).fetchone()[0]
+
+    def user(self):
+        username, full_name, diabetes_type = self.conn.execute(
+            'SELECT username, full_name, diabetes_type FROM users WHERE id = ?', (self.user_id,)).fetchone()
+        return full_name or username, diabetes_type or "Not specified"
+
+    def period_text(self):
+        if self.start is None and self.end is None:
+            return "Full history"
+        first = str(self.start)[:10] if self.start is not None else "first reading"
+        last = str(self.end)[:10] if self.end is not None else datetime.now().strftime('%Y-%m-%d')
+        return f"{first} to {last}"
+
+    def write(self, out):
+        """Write the report to out (a path or binary file object); None if the period has no readings"""
+        start = time.perf_counter()
+        if not self.count():
+            return None
+        result = ReportResult(out)
+
+        pdf = ReportPDF()
+        pdf.add_page()
+        self.write_heading(pdf)
+        self.write_stats(pdf)
+        if self.charts:
+            self.write_chart(pdf)
+        result.rows = self.write_table(pdf)
+        result.pages = pdf.page_no()
+        pdf.save(out)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def write_heading(self, pdf):
+        user_name, diabetes_type = self.user()
+        pdf.set_font("Arial", size=12)
+        pdf.set_fill_color(44, 62, 80)  # Dark blue
+        pdf.set_text_color(255, 255, 255)  # White
+        pdf.cell(0, 10, _text(f"{self.title} for {user_name}"), 0, 1, 'C', 1)
+        for line in self.heading_lines(diabetes_type):
+            pdf.cell(0, 10, _text(line), 0, 1, 'C', 1)
+        pdf.ln(10)
+        pdf.set_text_color(*BLACK)
+
+    def heading_lines(self, diabetes_type):
+        return [f"Period: {self.period_text()}"]
+
+    def write_stats(self, pdf):
+        stats = {column: describe(self.conn, self.table, column, self.where, [self.user_id] + self.params)
+                 for column in self.stats_columns}
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, "Summary Statistics", 0, 1)
+        pdf.set_font("Arial", size=10)
+        for line in self.stats_lines(stats):
+            pdf.cell(0, 6, line, 0, 1)
+        pdf.ln(5)
+
+    def stats_lines(self, stats):
+        raise NotImplementedError
+
+    # Chart columns after ts, and the names the trend layouts know them by
+    chart_columns = ()
+    chart_names = ()
+
+    def chart_lines(self, rows):
+        """(mask, values) of each line drawn from (ts, *chart_columns) rows"""
+        raise NotImplementedError
+
+    def chart_frame(self, pixel_columns):
+        """The period's readings as the trend layouts take them, decimated to pixel_columns"""
+        params = [self.user_id] + self.params
+        x_range = self.conn.execute(f'SELECT MIN(ts), MAX(ts) FROM {self.table} WHERE {self.where}',
+                                    params).fetchone()
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT ts, {', '.join(self.chart_columns)}
+            FROM {self.table}
+            WHERE {self.where}
+            ORDER BY ts, id
+        ''', params)
+        kept = []
+        while True:
+            chunk = cursor.fetchmany(self.chunk_rows)
+            if not chunk:
+                break
+            # The points kept so far hold every bucket's first, last, lowest
+            # and highest reading, so decimating them with the next chunk
+            # keeps what decimating the whole period would
+            rows = kept + chunk
+            ts = np.array([row[0] for row in rows], dtype=float)
+            keep = [np.zeros(0, dtype=np.int64)]
+            for mask, values in self.chart_lines(rows):
+                index = np.flatnonzero(mask & ~np.isnan(values))
+                keep.append(index[decimate(ts[index], values[index], pixel_columns, x_range)])
+            kept = [rows[i] for i in np.unique(np.concatenate(keep))]
+        return pd.DataFrame(kept, columns=('Timestamp',) + self.chart_names)
+
+    def update_chart(self, layout, frame, stats):
+        layout.update(frame, stats, reset=True)
+
+    def write_chart(self, pdf):
+        layout = figures.acquire(self.layout_class)
+        try:
+            pixel_columns = max(ax.bbox.width for ax in layout.figure.axes)
+            self.update_chart(layout, self.chart_frame(pixel_columns),
+                              summarize(self.conn, self.user_id, self.kind, self.start, self.end))
+            chart = ChartImage.from_figure(layout.figure)
+        finally:
+            figures.release(layout)
+
+        # fpdf 1.7 only embeds images from files. Without an alpha channel
+        # it copies the PNG data as is instead of splitting it row by row.
+        fd, path = tempfile.mkstemp(suffix='.png')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                chart.to_pil().convert('RGB').save(f, format='PNG')
+            # Keep the heading on the chart's page
+            chart_height = CHART_WIDTH * chart.height / chart.width
+            if pdf.get_y() + 10 + chart_height > pdf.page_break_trigger:
+                pdf.add_page()
+            pdf.set_font("Arial", 'B', 12)
+            pdf.cell(0, 10, "Trends", 0, 1)
+            pdf.image(path, w=CHART_WIDTH, h=chart_height)
+        finally:
+            os.remove(path)
+        pdf.ln(5)
+
+    def row_color(self, row):
+        raise NotImplementedError
+
+    def write_table(self, pdf):
+        """Stream the period's readings into the table, newest first, and return how many"""
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, "Readings", 0, 1)
+        pdf.table = (self.headers, self.widths)
+        pdf.table_header()
+
+        cells = list(enumerate(self.widths))
+        notes = self.columns.index('notes')
+        rows = 0
+        cursor = self.conn.cursor()
+        cursor.execute(f'''
+            SELECT {', '.join(self.columns)}
+            FROM {self.table}
+            WHERE {self.where}
+            ORDER BY ts DESC, id DESC
+        ''', [self.user_id] + self.params)
+        while True:
+            chunk = cursor.fetchmany(self.chunk_rows)
+            if not chunk:
+                break
+            for row in chunk:
+                color = self.row_color(row)
+                for index, width in cells:
+                    if index in self.colored:
+                        pdf.set_text_color(*color)
+                        pdf.cell(width, ROW_HEIGHT, _text(row[index]), 1)
+                        pdf.set_text_color(*BLACK)
+                    elif index == notes:
+                        pdf.cell(width, ROW_HEIGHT, _text(row[index], self.notes_chars), 1)
+                    else:
+                        pdf.cell(width, ROW_HEIGHT, _text(row[index]), 1)
+                pdf.ln()
+            rows += len(chunk)
+        pdf.table = None
+        return rows
+
+
+class BPReport(ReadingReport):
+    kind = 'bp'
+    title = "Blood Pressure Report"
+    table = 'bp_readings'
+    columns = ('date', 'time', 'systolic', 'diastolic', 'pulse', 'notes')
+    headers = ("Date", "Time", "Systolic", "Diastolic", "Pulse", "Notes")
+    widths = (25, 20, 20, 20, 15, 90)
+    colored = (2, 3)
+    stats_columns = ('systolic', 'diastolic', 'pulse')
+    layout_class = BPTrendLayout
+    chart_columns = ('systolic', 'diastolic', 'pulse')
+    chart_names = ('Systolic', 'Diastolic', 'Pulse')
+
+    def stats_lines(self, stats):
+        described = zip(stats['systolic'], stats['diastolic'], stats['pulse'])
+        return [f"{index}: Systolic={round(systolic, 1)}, Diastolic={round(diastolic, 1)}, "
+                f"Pulse={round(pulse, 1)}"
+                for (index, systolic), (_, diastolic), (_, pulse) in described]
+
+    def chart_lines(self, rows):
+        # None (a missing pulse) becomes NaN
+        values = np.array([row[1:] for row in rows], dtype=float)
+        every = np.ones(len(rows), dtype=bool)
+        return [(every, values[:, i]) for i in range(values.shape[1])]
+
+    def row_color(self, row):
+        systolic, diastolic = row[2], row[3]
+        if systolic >= 140 or diastolic >= 90:
+            return RED  # High
+        if systolic >= 120 or diastolic >= 80:
+            return ORANGE  # Elevated
+        return GREEN  # Normal
+
+
+class BSReport(ReadingReport):
+    kind = 'bs'
+    title = "Blood Sugar Report"
+    table = 'bs_readings'
+    columns = ('date', 'time', 'glucose_level', 'measurement_type', 'meal_context', 'notes')
+    headers = ("Date", "Time", "Glucose", "Type", "Meal", "Notes")
+    widths = (25, 20, 25, 30, 25, 65)
+    colored = (2,)
+    notes_chars = 35
+    stats_columns = ('glucose_level',)
+
+    interpretation = [
+        "Normal fasting glucose: 70-99 mg/dL",
+        "Prediabetes (fasting): 100-125 mg/dL",
+        "Diabetes (fasting): 126+ mg/dL",
+        "Normal post-meal (2h): <140 mg/dL",
+        "Prediabetes post-meal: 140-199 mg/dL",
+        "Diabetes post-meal: 200+ mg/dL"
+    ]
+    layout_class = BSTrendLayout
+    chart_columns = ('glucose_level', 'measurement_type')
+    chart_names = ('Glucose', 'Type')
+
+    def heading_lines(self, diabetes_type):
+        return [f"Diabetes Type: {diabetes_type}"] + super().heading_lines(diabetes_type)
+
+    def write_stats(self, pdf):
+        super().write_stats(pdf)
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, "Glucose Level Interpretation", 0, 1)
+        pdf.set_font("Arial", size=10)
+        for line in self.interpretation:
+            pdf.cell(0, 6, line, 0, 1)
+        pdf.ln(5)
+
+    def stats_lines(self, stats):
+        return [f"{index}: {round(value, 1)} mg/dL" for index, value in stats['glucose_level']]
+
+    def chart_lines(self, rows):
+        glucose = np.array([row[1] for row in rows], dtype=float)
+        types = np.array([row[2] for row in rows], dtype=object)
+        return [(types == m_type, glucose) for m_type in set(types)]
+
+    def update_chart(self, layout, frame, stats):
+        # The frame is a sample, so the type bars count every reading in SQL
+        type_counts = dict(self.conn.execute(f'''
+            SELECT measurement_type, COUNT(*) FROM bs_readings WHERE {self.where} GROUP BY measurement_type
+        ''', [self.user_id] + self.params))
+        frame['Glucose'] = frame['Glucose'].astype(float)
+        layout.update(frame, stats, reset=True, type_counts=type_counts)
+
+    def row_color(self, row):
+        glucose, measurement_type = row[2], row[3]
+        if measurement_type == "Fasting":
+            if glucose >= 126:
+                return RED  # Diabetic
+            if glucose >= 100:
+                return ORANGE  # Prediabetic
+            return GREEN  # Normal
+        # Post-meal or random
+        if glucose >= 200:
+            return RED
+        if glucose >= 140:
+            return ORANGE
+        return GREEN
+
+
+REPORTS = {'bp': BPReport, 'bs': BSReport}
+
+
+def write_report(conn, user_id, kind, out, start=None, end=None, charts=True):
+    """Write a user's report for days start..end to out and return a ReportResult
+
+    out is a path or a binary file object such as BytesIO. Returns None,
+    writing nothing, when the user has no readings in the period.
+    """
+    if kind not in REPORTS:
+        raise ValueError(f"Unknown reading kind '{kind}'")
+    return REPORTS[kind](conn, user_id, start, end, charts).write(out)
@@ -0,0 +1,186 @@
+import math
+from datetime import date, datetime, timedelta
+from schema import ROLLUP_BIN_WIDTH, ROLLUP_SERIES
+
+# Summaries served from the reading_rollups and rollup_bins tables that
+# schema.py keeps current with triggers. A date range is split into whole
+# ISO weeks plus the odd days at either end, so a year of history is about
+# 52 week rows and at most 12 day rows per series, however many readings
+# it holds. Percentiles come from the value bins and are accurate to about
+# one bin width (ROLLUP_BIN_WIDTH).
+
+PERCENTILES = (0.25, 0.5, 0.75)
+
+# Date ranges offered by the trend windows, in days ending today (None for all)
+TREND_RANGES = {'7d': 7, '30d': 30, '90d': 90, '1y': 365, 'All': None}
+DEFAULT_RANGE = 'All'
+
+# Rollup series (reading columns) by kind
+SERIES = {kind: tuple(columns) for kind, *columns in ROLLUP_SERIES.values()}
+
+_EPOCH = date(1970, 1, 1)
+
+
+def day_number(value):
+    """Days since 1970-01-01 of a date, datetime or 'YYYY-MM-DD' string"""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d')
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - _EPOCH).days
+
+
+def day_date(number):
+    return _EPOCH + timedelta(days=number)
+
+
+def range_start(label):
+    """First date covered by a TREND_RANGES label, or None for the whole history"""
+    days = TREND_RANGES[label]
+    if days is None:
+        return None
+    return date.today() - timedelta(days=days - 1)
+
+
+def week_start(day):
+    """Day number of the Monday starting day's ISO week"""
+    return day - (day + 3) % 7
+
+
+def _spans(start, end):
+    """SQL condition and params picking rollup rows that cover days start..end exactly"""
+    first = None if start is None else day_number(start)
+    last = None if end is None else day_number(end)
+    # Whole weeks run from the first Monday on or after first to the Monday after last
+    first_week = None if first is None else week_start(first + 6)
+    end_week = None if last is None else week_start(last + 1)
+
+    if first is not None and last is not None and first_week >= end_week:
+        spans = [('day', first, last + 1)]
+    else:
+        spans = [('week', first_week, end_week)]
+        if first is not None:
+            spans.append(('day', first, first_week))
+        if last is not None:
+            spans.append(('day', end_week, last + 1))
+
+    conditions, params = [], []
+    for period, lo, hi in spans:
+        condition = ['period = ?']
+        params.append(period)
+        if lo is not None:
+            condition.append('start >= ?')
+            params.append(lo)
+        if hi is not None:
+            condition.append('start < ?')
+            params.append(hi)
+        conditions.append(f"({' AND '.join(condition)})")
+    return ' OR '.join(conditions), params
+
+
+class Summary:
+    """Count, extremes, moments and value bins of one series over a date range"""
+
+    def __init__(self, n=0, min_value=None, max_value=None, sum_value=0.0, sum_squares=0.0,
+                 bins=(), bin_width=1):
+        self.n = n
+        self.min = math.nan if min_value is None else min_value
+        self.max = math.nan if max_value is None else max_value
+        self.sum = sum_value
+        self.sum_squares = sum_squares
+        # (bin, count) pairs, lowest bin first
+        self.bins = list(bins)
+        self.bin_width = bin_width
+
+    @property
+    def mean(self):
+        return self.sum / self.n if self.n else math.nan
+
+    @property
+    def std(self):
+        """Sample standard deviation, as pandas reports it"""
+        if self.n < 2:
+            return math.nan
+        return math.sqrt(max(self.sum_squares - self.sum * self.sum / self.n, 0.0) / (self.n - 1))
+
+    def percentile(self, q):
+        """Approximate q-quantile (0 <= q <= 1), interpolated within its value bin"""
+        if not self.n:
+            return math.nan
+        rank = q * self.n
+        seen = 0
+        for bin_number, count in self.bins:
+            if seen + count >= rank and count:
+                # Readings are whole numbers, so a bin spans half a unit either side of its values
+                value = (bin_number + (rank - seen) / count) * self.bin_width - 0.5
+                return min(max(value, self.min), self.max)
+            seen += count
+        return self.max
+
+    def describe(self):
+        """(statistic, value) pairs in the order of DataFrame.describe()"""
+        return ([('count', float(self.n)), ('mean', self.mean), ('std', self.std), ('min', self.min)]
+                + [(f"{q:.0%}", self.percentile(q)) for q in PERCENTILES]
+                + [('max', self.max)])
+
+
+def _summaries(conn, user_id, kind, start, end, group, condition, params):
+    spans, span_params = _spans(start, end)
+    where = f"user_id = ? AND kind = ? AND {condition} AND ({spans})"
+    params = [user_id, kind] + list(params) + span_params
+
+    bins = {}
+    for key, bin_number, count in conn.execute(f'''
+        SELECT {group}, bin, SUM(n)
+        FROM rollup_bins
+        WHERE {where}
+        GROUP BY {group}, bin
+        ORDER BY bin
+    ''', params):
+        bins.setdefault(key, []).append((bin_number, count))
+
+    return {row[0]: Summary(*row[1:], bins=bins.get(row[0], ()), bin_width=ROLLUP_BIN_WIDTH[kind])
+            for row in conn.execute(f'''
+                SELECT {group}, SUM(n), MIN(min_value), MAX(max_value), SUM(sum_value), SUM(sum_squares)
+                FROM reading_rollups
+                WHERE {where}
+                GROUP BY {group}
+            ''', params)}
+
+
+def summarize(conn, user_id, kind, start=None, end=None, measurement_type=''):
+    """Summary per series ('systolic', 'glucose_level', ...) over days start..end
+
+    start and end are inclusive dates, datetimes or 'YYYY-MM-DD' strings;
+    None leaves that end open. measurement_type restricts glucose to one type.
+    """
+    found = _summaries(conn, user_id, kind, start, end, 'series',
+                       'measurement_type = ?', [measurement_type])
+    empty = Summary(bin_width=ROLLUP_BIN_WIDTH[kind])
+    return {series: found.get(series, empty) for series in SERIES[kind]}
+
+
+def summarize_types(conn, user_id, start=None, end=None):
+    """Glucose Summary per measurement_type over days start..end"""
+    return _summaries(conn, user_id, 'bs', start, end, 'measurement_type',
+                      "series = 'glucose_level' AND measurement_type != ''", [])
+
+
+def buckets(conn, user_id, kind, series, period='day', start=None, end=None, measurement_type=''):
+    """(date, n, min, max, mean) of one series per day or ISO week, oldest first"""
+    condition = ["user_id = ?", "kind = ?", "series = ?", "measurement_type = ?", "period = ?"]
+    params = [user_id, kind, series, measurement_type, period]
+    if start is not None:
+        condition.append("start >= ?")
+        first = day_number(start)
+        params.append(week_start(first) if period == 'week' else first)
+    if end is not None:
+        condition.append("start <= ?")
+        params.append(day_number(end))
+    rows = conn.execute(f'''
+        SELECT start, n, min_value, max_value, sum_value
+        FROM reading_rollups
+        WHERE {' AND '.join(condition)}
+        ORDER BY start
+    ''', params)
+    return [(day_date(start), n, low, high, total / n) for start, n, low, high, total in rows]
@@ -0,0 +1,534 @@
+import sqlite3
+import calendar
+from datetime import datetime
+
+# Every table, index and upgrade step lives here. Each migration runs once,
+# in order, and bumps PRAGMA user_version so existing health_monitor.db
+# files are upgraded in place the next time the app opens them.
+
+
+def _column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _add_missing_columns(conn, table, columns):
+    existing = _column_names(conn, table)
+    for name, definition in columns:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+
+def _create_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            full_name TEXT,
+            age INTEGER,
+            gender TEXT,
+            diabetes_type TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bp_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            systolic INTEGER NOT NULL,
+            diastolic INTEGER NOT NULL,
+            pulse INTEGER,
+            notes TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bs_readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            glucose_level INTEGER NOT NULL,
+            measurement_type TEXT NOT NULL,
+            meal_context TEXT,
+            notes TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+    # Older versions of main.py created slimmer reading tables
+    _add_missing_columns(conn, 'bp_readings', [
+        ('pulse', 'INTEGER'),
+        ('notes', 'TEXT'),
+    ])
+    _add_missing_columns(conn, 'bs_readings', [
+        ('measurement_type', "TEXT NOT NULL DEFAULT 'Random'"),
+        ('meal_context', 'TEXT'),
+        ('notes', 'TEXT'),
+    ])
+
+
+def _create_reading_indexes(conn):
+    # Latest-reading and history screens filter on user_id and sort by
+    # date/time; including the values makes the summary and prediction
+    # queries index-only.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bp_readings_user_date_time
+        ON bp_readings (user_id, date, time, systolic, diastolic)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bs_readings_user_date_time
+        ON bs_readings (user_id, date, time, glucose_level)
+    ''')
+
+
+def _add_reading_timestamps(conn):
+    # Readings carry an integer ts (seconds since the epoch for the
+    # wall-clock date/time, so it round-trips without a timezone) which
+    # ordering, range filters and model features use instead of parsing
+    # date + time on every load.
+    for table, values in (('bp_readings', 'systolic, diastolic'),
+                          ('bs_readings', 'glucose_level')):
+        _add_missing_columns(conn, table, [('ts', 'INTEGER')])
+        conn.execute(f'''
+            UPDATE {table}
+            SET ts = CAST(strftime('%s', date || ' ' || time) AS INTEGER)
+            WHERE ts IS NULL
+        ''')
+
+        # Keep ts filled for writers that only supply date and time
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_ts_insert
+            AFTER INSERT ON {table} WHEN NEW.ts IS NULL
+            BEGIN
+                UPDATE {table}
+                SET ts = CAST(strftime('%s', NEW.date || ' ' || NEW.time) AS INTEGER)
+                WHERE id = NEW.id;
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_ts_update
+            AFTER UPDATE OF date, time ON {table}
+            BEGIN
+                UPDATE {table}
+                SET ts = CAST(strftime('%s', NEW.date || ' ' || NEW.time) AS INTEGER)
+                WHERE id = NEW.id;
+            END
+        ''')
+
+        conn.execute(f'DROP INDEX IF EXISTS idx_{table}_user_date_time')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_user_ts
+            ON {table} (user_id, ts, {values})
+        ''')
+
+
+def _bump_version_sql(kind, user):
+    return f'''
+        INSERT INTO reading_versions (user_id, kind, version) VALUES ({user}.user_id, '{kind}', 1)
+        ON CONFLICT (user_id, kind) DO UPDATE SET version = version + 1;
+    '''
+
+
+def _add_reading_versions(conn):
+    # A per-user counter bumped by every write to a reading table, so
+    # cached predictions and charts can tell whether the data behind them
+    # changed with a single primary-key lookup. Missing rows mean version 0.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reading_versions (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        ) WITHOUT ROWID
+    ''')
+    for table, kind in (('bp_readings', 'bp'), ('bs_readings', 'bs')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_insert
+            AFTER INSERT ON {table}
+            BEGIN {_bump_version_sql(kind, 'NEW')} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_delete
+            AFTER DELETE ON {table}
+            BEGIN {_bump_version_sql(kind, 'OLD')} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_update
+            AFTER UPDATE ON {table}
+            BEGIN {_bump_version_sql(kind, 'OLD')} {_bump_version_sql(kind, 'NEW')} END
+        ''')
+
+
+# Reading columns fitted by the trend model, as (y1, y2); BS has one value
+TREND_VALUES = {
+    'bp_readings': ('bp', 'systolic', 'diastolic'),
+    'bs_readings': ('bs', 'glucose_level', '0'),
+}
+
+
+def _trend_terms(row, y1, y2):
+    day = f'({row}.ts / 86400)'
+    y1 = f'{row}.{y1}'
+    y2 = y2 if y2 == '0' else f'{row}.{y2}'
+    return day, f'{day} * {day}', y1, f'{day} * {y1}', y2, f'{day} * {y2}'
+
+
+def _add_trend_stats(conn):
+    # Least-squares sufficient statistics per user and metric, with x the
+    # reading's day number (ts / 86400). Triggers add or subtract one
+    # reading's terms on every write, so a forecast is one primary-key
+    # lookup however long the history is. Sums are exact integers.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trend_stats (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            sum_x INTEGER NOT NULL,
+            sum_xx INTEGER NOT NULL,
+            sum_y1 INTEGER NOT NULL,
+            sum_xy1 INTEGER NOT NULL,
+            sum_y2 INTEGER NOT NULL,
+            sum_xy2 INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        ) WITHOUT ROWID
+    ''')
+    sums = ('sum_x', 'sum_xx', 'sum_y1', 'sum_xy1', 'sum_y2', 'sum_xy2')
+    for table, (kind, y1, y2) in TREND_VALUES.items():
+        # Readings written with only date/time get their ts from an UPDATE,
+        # so rows without a ts are left to the update trigger
+        add = f'''
+            INSERT INTO trend_stats (user_id, kind, n, {", ".join(sums)})
+            SELECT NEW.user_id, '{kind}', 1, {", ".join(_trend_terms('NEW', y1, y2))}
+            WHERE NEW.ts IS NOT NULL
+            ON CONFLICT (user_id, kind) DO UPDATE SET n = n + 1,
+                {", ".join(f"{s} = {s} + excluded.{s}" for s in sums)};
+        '''
+        remove = f'''
+            UPDATE trend_stats SET n = n - 1,
+                {", ".join(f"{s} = {s} - {term}" for s, term in zip(sums, _trend_terms('OLD', y1, y2)))}
+            WHERE user_id = OLD.user_id AND kind = '{kind}' AND OLD.ts IS NOT NULL;
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_trend_insert
+            AFTER INSERT ON {table}
+            BEGIN {add} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_trend_delete
+            AFTER DELETE ON {table}
+            BEGIN {remove} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_trend_update
+            AFTER UPDATE OF user_id, ts, {y1}{'' if y2 == '0' else ', ' + y2} ON {table}
+            BEGIN {remove} {add} END
+        ''')
+
+        terms = _trend_terms(table, y1, y2)
+        conn.execute(f'''
+            INSERT OR REPLACE INTO trend_stats (user_id, kind, n, {", ".join(sums)})
+            SELECT user_id, '{kind}', COUNT(*), {", ".join(f"SUM({term})" for term in terms)}
+            FROM {table}
+            WHERE ts IS NOT NULL
+            GROUP BY user_id
+        ''')
+
+
+def _add_predictions(conn):
+    # Forecasts written in bulk by batch_forecast.py. y1/y2 follow
+    # trend_stats: systolic/diastolic for 'bp', glucose (y2 NULL) for 'bs'.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS predictions (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            date TEXT NOT NULL,
+            y1 REAL NOT NULL,
+            y2 REAL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, kind, date),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _count_edit_sql(kind, user):
+    return f'''
+        INSERT INTO reading_versions (user_id, kind, version, edits) VALUES ({user}.user_id, '{kind}', 0, 1)
+        ON CONFLICT (user_id, kind) DO UPDATE SET edits = edits + 1;
+    '''
+
+
+def _add_fitted_models(conn):
+    # Winning forecast model per user and target (systolic, diastolic or
+    # glucose), saved by model_store.py. params holds the model's
+    # sufficient statistics as little-endian float64; watermark is the
+    # newest reading ts they cover, n how many readings that is, and
+    # data_version/edits the reading_versions values at that point.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS fitted_models (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            target TEXT NOT NULL,
+            model TEXT NOT NULL,
+            format INTEGER NOT NULL,
+            first_ts INTEGER NOT NULL,
+            watermark INTEGER NOT NULL,
+            data_version INTEGER NOT NULL,
+            edits INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            selected_n INTEGER NOT NULL,
+            mae REAL,
+            rmse REAL,
+            r2 REAL,
+            candidates TEXT,
+            params BLOB NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, kind, target),
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Inserts alone let stored models be extended; edits and deletes of
+    # existing readings are counted separately so a model knows to refit.
+    # Filling in ts right after an insert (OLD.ts IS NULL) is not an edit.
+    _add_missing_columns(conn, 'reading_versions', [('edits', 'INTEGER NOT NULL DEFAULT 0')])
+    for table, kind in (('bp_readings', 'bp'), ('bs_readings', 'bs')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_edits_delete
+            AFTER DELETE ON {table}
+            BEGIN {_count_edit_sql(kind, 'OLD')} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_edits_update
+            AFTER UPDATE ON {table} WHEN OLD.ts IS NOT NULL
+            BEGIN {_count_edit_sql(kind, 'OLD')} {_count_edit_sql(kind, 'NEW')} END
+        ''')
+
+
+# Reading columns kept in reading_rollups, as (kind, series and column, ...)
+ROLLUP_SERIES = {
+    'bp_readings': ('bp', 'systolic', 'diastolic', 'pulse'),
+    'bs_readings': ('bs', 'glucose_level'),
+}
+# Width of the value bins behind rollup percentiles, in mmHg, BPM or mg/dL
+ROLLUP_BIN_WIDTH = {'bp': 2, 'bs': 5}
+# Day numbers (ts / 86400) of the day, or ISO week starting on Monday, holding a reading
+ROLLUP_PERIODS = {
+    'day': (1, '({row}.ts / 86400)'),
+    'week': (7, '({row}.ts / 86400 - ({row}.ts / 86400 + 3) % 7)'),
+}
+
+
+def _rollup_sql(table, kind, column, period, by_type):
+    """(add, remove) statements keeping one rollup series up to date for NEW/OLD"""
+    days, start = ROLLUP_PERIODS[period]
+    width = ROLLUP_BIN_WIDTH[kind]
+
+    def key(row):
+        m_type = f'{row}.measurement_type' if by_type else "''"
+        return (f"{row}.user_id, '{kind}', '{column}', {m_type}, '{period}', {start.format(row=row)}",
+                f"user_id = {row}.user_id AND kind = '{kind}' AND series = '{column}' "
+                f"AND measurement_type = {m_type} AND period = '{period}' AND start = {start.format(row=row)}")
+
+    values, match = key('NEW')
+    value = f'NEW.{column}'
+    add = f'''
+        INSERT INTO reading_rollups
+            (user_id, kind, series, measurement_type, period, start, n, min_value, max_value, sum_value, sum_squares)
+        SELECT {values}, 1, {value}, {value}, {value}, {value} * {value}
+        WHERE NEW.ts IS NOT NULL AND {value} IS NOT NULL
+        ON CONFLICT (user_id, kind, series, measurement_type, period, start) DO UPDATE SET
+            n = n + 1, min_value = MIN(min_value, excluded.min_value),
+            max_value = MAX(max_value, excluded.max_value), sum_value = sum_value + excluded.sum_value,
+            sum_squares = sum_squares + excluded.sum_squares;
+        INSERT INTO rollup_bins (user_id, kind, series, measurement_type, period, start, bin, n)
+        SELECT {values}, CAST({value} AS INTEGER) / {width}, 1
+        WHERE NEW.ts IS NOT NULL AND {value} IS NOT NULL
+        ON CONFLICT (user_id, kind, series, measurement_type, period, start, bin) DO UPDATE SET n = n + 1;
+    '''
+
+    values, match = key('OLD')
+    value = f'OLD.{column}'
+    bucket_start = start.format(row='OLD')
+    # Min and max cannot be taken back, so they are re-read from the bucket's
+    # remaining readings when the removed one held them
+    remaining = (f"SELECT {{}}({column}) FROM {table} WHERE user_id = OLD.user_id "
+                 f"AND ts >= {bucket_start} * 86400 AND ts < ({bucket_start} + {days}) * 86400"
+                 + (" AND measurement_type = OLD.measurement_type" if by_type else ""))
+    remove = f'''
+        UPDATE reading_rollups SET
+            n = n - 1, sum_value = sum_value - {value}, sum_squares = sum_squares - {value} * {value},
+            min_value = CASE WHEN {value} > min_value THEN min_value ELSE ({remaining.format('MIN')}) END,
+            max_value = CASE WHEN {value} < max_value THEN max_value ELSE ({remaining.format('MAX')}) END
+        WHERE {match} AND OLD.ts IS NOT NULL AND {value} IS NOT NULL;
+        DELETE FROM reading_rollups WHERE {match} AND n <= 0;
+        UPDATE rollup_bins SET n = n - 1
+        WHERE {match} AND bin = CAST({value} AS INTEGER) / {width} AND OLD.ts IS NOT NULL AND {value} IS NOT NULL;
+        DELETE FROM rollup_bins WHERE {match} AND bin = CAST({value} AS INTEGER) / {width} AND n <= 0;
+    '''
+    return add, remove
+
+
+def _add_reading_rollups(conn):
+    # Per-user day and ISO-week summaries of every reading series (and of
+    # glucose per measurement_type), so summaries, reports and trend stats
+    # over any date range read a few rollup rows instead of the readings.
+    # rollup_bins counts readings per value bin for approximate percentiles.
+    # measurement_type is '' for rows covering all readings. Triggers keep
+    # both tables current on every insert, delete and update.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reading_rollups (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            series TEXT NOT NULL,
+            measurement_type TEXT NOT NULL,
+            period TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            min_value REAL,
+            max_value REAL,
+            sum_value REAL NOT NULL,
+            sum_squares REAL NOT NULL,
+            PRIMARY KEY (user_id, kind, series, measurement_type, period, start)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_bins (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            series TEXT NOT NULL,
+            measurement_type TEXT NOT NULL,
+            period TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            bin INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (user_id, kind, series, measurement_type, period, start, bin)
+        ) WITHOUT ROWID
+    ''')
+    create_rollup_triggers(conn)
+    rebuild_rollups(conn)
+
+
+def create_rollup_triggers(conn):
+    for table, (kind, *columns) in ROLLUP_SERIES.items():
+        adds, removes = [], []
+        for column in columns:
+            for period in ROLLUP_PERIODS:
+                for by_type in ((False, True) if kind == 'bs' else (False,)):
+                    add, remove = _rollup_sql(table, kind, column, period, by_type)
+                    adds.append(add)
+                    removes.append(remove)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_insert
+            AFTER INSERT ON {table}
+            BEGIN {"".join(adds)} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_delete
+            AFTER DELETE ON {table}
+            BEGIN {"".join(removes)} END
+        ''')
+        watched = ', '.join(columns + (['measurement_type'] if kind == 'bs' else []))
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_update
+            AFTER UPDATE OF user_id, ts, {watched} ON {table}
+            BEGIN {"".join(removes)} {"".join(adds)} END
+        ''')
+
+
+def drop_rollup_triggers(conn):
+    """Stop maintaining rollups, for bulk loads that call rebuild_rollups afterwards"""
+    for table in ROLLUP_SERIES:
+        for event in ('insert', 'delete', 'update'):
+            conn.execute(f'DROP TRIGGER IF EXISTS trg_{table}_rollup_{event}')
+
+
+def rebuild_rollups(conn, first_user=None):
+    """Recompute rollups from the readings, for every user or those with id >= first_user"""
+    users = '1' if first_user is None else f'user_id >= {int(first_user)}'
+    conn.execute(f'DELETE FROM reading_rollups WHERE {users}')
+    conn.execute(f'DELETE FROM rollup_bins WHERE {users}')
+    # One grouped pass per series and period
+    for table, (kind, *columns) in ROLLUP_SERIES.items():
+        for column in columns:
+            for period, (_, start) in ROLLUP_PERIODS.items():
+                start = start.format(row=table)
+                for m_type in (("''", 'measurement_type') if kind == 'bs' else ("''",)):
+                    conn.execute(f'''
+                        INSERT INTO reading_rollups
+                            (user_id, kind, series, measurement_type, period, start,
+                             n, min_value, max_value, sum_value, sum_squares)
+                        SELECT user_id, '{kind}', '{column}', {m_type}, '{period}', {start},
+                               COUNT(*), MIN({column}), MAX({column}), SUM({column}), SUM({column} * {column})
+                        FROM {table}
+                        WHERE {users} AND ts IS NOT NULL AND {column} IS NOT NULL
+                        GROUP BY user_id, {m_type}, {start}
+                    ''')
+                    conn.execute(f'''
+                        INSERT INTO rollup_bins
+                            (user_id, kind, series, measurement_type, period, start, bin, n)
+                        SELECT user_id, '{kind}', '{column}', {m_type}, '{period}', {start},
+                               CAST({column} AS INTEGER) / {ROLLUP_BIN_WIDTH[kind]}, COUNT(*)
+                        FROM {table}
+                        WHERE {users} AND ts IS NOT NULL AND {column} IS NOT NULL
+                        GROUP BY user_id, {m_type}, {start}, CAST({column} AS INTEGER) / {ROLLUP_BIN_WIDTH[kind]}
+                    ''')
+
+
+MIGRATIONS = [
+    (1, _create_base_tables),
+    (2, _create_reading_indexes),
+    (3, _add_reading_timestamps),
+    (4, _add_reading_versions),
+    (5, _add_trend_stats),
+    (6, _add_predictions),
+    (7, _add_fitted_models),
+    (8, _add_reading_rollups),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def reading_timestamp(date, time):
+    """Convert the date/time strings entered for a reading into its ts value"""
+    value = f"{date.strip()} {time.strip()}"
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return calendar.timegm(parsed.timetuple())
+    raise ValueError(f"Date must be YYYY-MM-DD and time HH:MM, got '{value}'")
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION, one transaction per step"""
+    current = get_version(conn)
+    if current >= SCHEMA_VERSION:
+        return current
+
+    if conn.in_transaction:
+        conn.commit()
+
+    for version, step in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute('BEGIN')
+        try:
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        current = version
+
+    conn.execute('ANALYZE')
+    conn.commit()
+    return current
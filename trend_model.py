@@ -0,0 +1,103 @@
+import numpy as np
+
+# Ordinary least-squares line fits for reading trends, computed in closed
+# form from the running sums n, Σx, Σx², Σy and Σxy. One pass over the
+# history fits every value column at once (systolic and diastolic share x),
+# and the same sums can be kept up to date incrementally, so a fit never
+# needs the raw readings again.
+
+
+class LinearTrend:
+    def __init__(self, slope, intercept):
+        self.slope = np.asarray(slope, dtype=float)
+        self.intercept = np.asarray(intercept, dtype=float)
+
+    @classmethod
+    def from_sums(cls, n, sum_x, sum_xx, sum_y, sum_xy):
+        """Fit from running sums; sum_y and sum_xy may hold one entry per target
+
+        Integer sums (as stored in trend_stats) are re-centred exactly before
+        any float arithmetic, so large day numbers lose no precision.
+        """
+        if n == 0:
+            raise ValueError("Cannot fit a trend to no readings")
+        single = np.ndim(sum_y) == 0
+        sum_y = [sum_y] if single else list(sum_y)
+        sum_xy = [sum_xy] if single else list(sum_xy)
+
+        # Shift x by roughly its mean: Σ(x-c)² = Σx² - 2cΣx + nc², Σ(x-c)y = Σxy - cΣy
+        shift = sum_x // n if isinstance(sum_x, int) else sum_x / n
+        centered_x = sum_x - n * shift
+        centered_xx = sum_xx - 2 * shift * sum_x + n * shift * shift
+        centered_xy = [xy - shift * y for y, xy in zip(sum_y, sum_xy)]
+
+        spread = n * centered_xx - centered_x * centered_x
+        mean_y = np.array(sum_y, dtype=float) / n
+        if spread <= 0:
+            # Every reading on the same day: flat line through the mean
+            slope = np.zeros_like(mean_y)
+        else:
+            slope = np.array([float(n * xy - centered_x * y) for y, xy in zip(sum_y, centered_xy)]) / spread
+        intercept = mean_y - slope * (centered_x / n + shift)
+        if single:
+            return cls(slope[0], intercept[0])
+        return cls(slope, intercept)
+
+    def predict(self, x):
+        """Predicted values at x: shape (len(x),) for one target, (len(x), k) for k"""
+        x = np.asarray(x, dtype=float)
+        if self.slope.ndim == 0:
+            return self.intercept + self.slope * x
+        return self.intercept + np.outer(x, self.slope)
+
+
+def fit_trends(n, sum_x, sum_xx, sum_y, sum_xy):
+    """Fit one trend per group from arrays of integer sums
+
+    n, sum_x and sum_xx have one entry per group; sum_y and sum_xy have shape
+    (groups, targets). Returns (slope, intercept), each (groups, targets).
+    Groups with n == 0 get NaN.
+    """
+    n = np.asarray(n, dtype=np.int64)
+    sum_x = np.asarray(sum_x, dtype=np.int64)
+    sum_xx = np.asarray(sum_xx, dtype=np.int64)
+    sum_y = np.asarray(sum_y, dtype=np.int64)
+    sum_xy = np.asarray(sum_xy, dtype=np.int64)
+    safe_n = np.maximum(n, 1)
+
+    # Same exact integer re-centring as from_sums, for every group at once
+    shift = sum_x // safe_n
+    centered_x = sum_x - n * shift
+    centered_xx = sum_xx - 2 * shift * sum_x + n * shift * shift
+    centered_xy = sum_xy - shift[:, None] * sum_y
+
+    nf = n.astype(float)[:, None]
+    cx = centered_x.astype(float)[:, None]
+    spread = nf * centered_xx.astype(float)[:, None] - cx * cx
+    numerator = nf * centered_xy - cx * sum_y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(spread > 0, numerator / np.where(spread > 0, spread, 1), 0.0)
+        intercept = sum_y / nf - slope * (cx / nf + shift[:, None])
+    return slope, intercept
+
+
+def trend_sums(x, y):
+    """Return (n, Σx, Σx², Σy, Σxy) for x and a 1-D or (n, k) array y"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return len(x), x.sum(), x @ x, y.sum(axis=0), x @ y
+
+
+def fit_trend(x, *ys):
+    """Fit y = intercept + slope * x for each series in ys in one pass
+
+    With one series the model predicts a 1-D array; with several it predicts
+    one column per series, in the order given.
+    """
+    y = ys[0] if len(ys) == 1 else np.column_stack(ys)
+    x = np.asarray(x, dtype=float)
+    # Centering x keeps Σx² small relative to its terms for long histories
+    shift = x.mean() if len(x) else 0.0
+    n, sum_x, sum_xx, sum_y, sum_xy = trend_sums(x - shift, y)
+    model = LinearTrend.from_sums(n, sum_x, sum_xx, sum_y, sum_xy)
+    return LinearTrend(model.slope, model.intercept - model.slope * shift)
@@ -0,0 +1,446 @@
+import contextlib
+import threading
+from datetime import datetime
+import numpy as np
+import matplotlib.style
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from chart_image import CHART_DPI, CHART_SIZE, ChartImage
+from downsample import decimate
+from rollups import TREND_RANGES
+
+# Trend charts are drawn on pooled figures. A layout builds its axes,
+# bands, legends and styling once; showing other data only moves line data,
+# bar heights and the summary text. A trend window takes a layout from the
+# pool and hands it back when it closes, so repeated clicks reuse a few
+# figures instead of leaking a new one each time.
+#
+# Axis limits keep some headroom. A reading that lands inside them is
+# drawn by blitting the changed artists over the saved background; only a
+# reading outside the view redraws the whole figure.
+#
+# Trend windows show one date range at a time, and every line is decimated
+# to the points its axis has pixel columns for, so drawing time stays
+# bounded however many readings the range holds.
+
+MAX_IDLE = 2
+# Fraction of the data span added beyond it when limits have to move
+HEADROOM = 0.1
+MIN_PAD_DAYS = 1.0
+MIN_PAD_VALUE = 5.0
+# Lines show reading markers only while they have this few points
+MARKER_POINTS = 200
+
+# The epoch-independent matplotlib date number of ts = 0
+_EPOCH = mdates.date2num(datetime(1970, 1, 1))
+
+
+def date_numbers(ts):
+    """Reading timestamps (seconds, wall clock) as matplotlib date numbers"""
+    return np.asarray(ts, dtype=float) / 86400.0 + _EPOCH
+
+
+def _column(df, name):
+    return df[name].to_numpy(dtype=float)
+
+
+def _draw_line(line, x, y):
+    """Give line the points of (x, y) its axis can show, with markers while they are few"""
+    finite = ~np.isnan(y)
+    x, y = x[finite], y[finite]
+    ax = line.axes
+    keep = decimate(x, y, ax.bbox.width, ax.get_xlim())
+    line.set_data(x[keep], y[keep])
+    line.set_marker('o' if len(keep) <= MARKER_POINTS else '')
+
+
+def _fit_limits(get, set_, lo, hi, min_pad, reset=False):
+    """Move an axis' limits only if [lo, hi] left them or now fills under half; True if moved"""
+    if not np.isfinite(lo) or not np.isfinite(hi):
+        return False
+    current = get()
+    span = current[1] - current[0]
+    inside = current[0] <= lo and hi <= current[1] and (hi - lo) >= span / 2
+    if inside and not reset:
+        return False
+    pad = max((hi - lo) * HEADROOM, min_pad)
+    set_(lo - pad, hi + pad)
+    return True
+
+
+def _trend_style():
+    # Same choice the trend windows always made; 'seaborn' is gone from newer matplotlib
+    return 'seaborn' if 'seaborn' in matplotlib.style.available else 'ggplot'
+
+
+class TrendLayout:
+    figsize = (10, 8)
+    dpi = 100
+    style = None
+
+    def __init__(self):
+        context = matplotlib.style.context(self.style) if self.style else contextlib.nullcontext()
+        with context:
+            self.figure = Figure(figsize=self.figsize, dpi=self.dpi)
+            FigureCanvasAgg(self.figure)
+            # Artists that change with the data, redrawn when blitting
+            self.dynamic = []
+            self.build()
+            # Ticks are made lazily and copy the first one, so make it under the style
+            for ax in self.figure.axes:
+                ax.xaxis.get_major_ticks()
+                ax.yaxis.get_major_ticks()
+
+    def build(self):
+        raise NotImplementedError
+
+    def update(self, df, stats, reset=False):
+        """Show df and its rollup stats; return True if axis limits moved and a full redraw is needed"""
+        raise NotImplementedError
+
+    def clear(self):
+        for artist in self.dynamic:
+            if hasattr(artist, 'set_data'):
+                artist.set_data([], [])
+
+    def set_animated(self, animated):
+        for artist in self.dynamic:
+            artist.set_animated(animated)
+
+
+class BPTrendLayout(TrendLayout):
+    style = _trend_style()
+
+    def build(self):
+        gs = self.figure.add_gridspec(3, 1, height_ratios=[2, 2, 1])
+        self.ax1 = self.figure.add_subplot(gs[0])
+        self.ax2 = self.figure.add_subplot(gs[1])
+        self.ax3 = self.figure.add_subplot(gs[2])
+
+        # Blood pressure plot
+        self.systolic, = self.ax1.plot([], [], label='Systolic', color='#e74c3c', linewidth=2, marker='o')
+        self.diastolic, = self.ax1.plot([], [], label='Diastolic', color='#3498db', linewidth=2, marker='o')
+
+        # Add healthy range bands
+        self.ax1.axhspan(90, 120, color='#2ecc71', alpha=0.1, label='Normal')
+        self.ax1.axhspan(120, 140, color='#f39c12', alpha=0.1, label='Elevated')
+        self.ax1.axhspan(140, 200, color='#e74c3c', alpha=0.1, label='High')
+
+        self.ax1.set_ylabel('mmHg', fontweight='bold')
+        self.ax1.set_title('Blood Pressure Trend', fontweight='bold')
+        self.ax1.legend(loc='upper left')
+        self.ax1.grid(True, linestyle='--', alpha=0.7)
+
+        # Pulse plot
+        self.pulse, = self.ax2.plot([], [], label='Pulse', color='#9b59b6', linewidth=2, marker='o')
+        self.ax2.set_ylabel('BPM', fontweight='bold')
+        self.ax2.set_title('Pulse Trend', fontweight='bold')
+        self.ax2.grid(True, linestyle='--', alpha=0.7)
+
+        for ax in (self.ax1, self.ax2):
+            ax.xaxis_date()
+
+        # Summary statistics
+        self.ax3.axis('off')
+        self.stats = self.ax3.text(0.05, 0.5, "", fontsize=10, va='center', ha='left')
+        self.dynamic = [self.systolic, self.diastolic, self.pulse, self.stats]
+
+    def update(self, df, stats, reset=False):
+        df = df.sort_values('Timestamp')
+        x = date_numbers(df['Timestamp'])
+        values = {col: _column(df, col) for col in ('Systolic', 'Diastolic', 'Pulse')}
+
+        stats_text = []
+        for col in values:
+            summary = stats[col.lower()]
+            if summary.n:
+                stats_text.append(f"{col}: Min={round(summary.min, 1)}, "
+                                  f"Max={round(summary.max, 1)}, Avg={round(summary.mean, 1)}")
+        self.stats.set_text("\n".join(stats_text) or "No readings in this range")
+        if not len(x):
+            self.clear()
+            return False
+
+        pressure = np.concatenate([values['Systolic'], values['Diastolic']])
+        pulse = values['Pulse']
+        moved = False
+        for ax in (self.ax1, self.ax2):
+            moved |= _fit_limits(ax.get_xlim, ax.set_xlim, np.nanmin(x), np.nanmax(x), MIN_PAD_DAYS, reset)
+        # The range bands stay in view, as they did when the axes autoscaled
+        moved |= _fit_limits(self.ax1.get_ylim, self.ax1.set_ylim, min(np.nanmin(pressure), 90),
+                             max(np.nanmax(pressure), 200), MIN_PAD_VALUE, reset)
+        if np.isfinite(pulse).any():
+            moved |= _fit_limits(self.ax2.get_ylim, self.ax2.set_ylim, np.nanmin(pulse), np.nanmax(pulse),
+                                 MIN_PAD_VALUE, reset)
+        if moved:
+            self.figure.tight_layout()
+
+        # Decimated for the final limits and axis sizes
+        _draw_line(self.systolic, x, values['Systolic'])
+        _draw_line(self.diastolic, x, values['Diastolic'])
+        _draw_line(self.pulse, x, values['Pulse'])
+        return moved
+
+
+class BSTrendLayout(TrendLayout):
+    style = _trend_style()
+
+    # Define colors for different measurement types
+    colors = {
+        'Fasting': '#3498db',
+        'Before Meal': '#9b59b6',
+        'After Meal': '#e74c3c',
+        'Before Bed': '#f39c12',
+        'Random': '#2ecc71'
+    }
+
+    def build(self):
+        gs = self.figure.add_gridspec(3, 1, height_ratios=[3, 2, 1])
+        self.ax1 = self.figure.add_subplot(gs[0])
+        self.ax2 = self.figure.add_subplot(gs[1])
+        self.ax3 = self.figure.add_subplot(gs[2])
+
+        # One glucose line per measurement type
+        self.lines = {}
+        for m_type, color in self.colors.items():
+            self.lines[m_type], = self.ax1.plot([], [], 'o-', label=m_type, color=color,
+                                                markersize=5, linewidth=2)
+
+        # Add healthy range bands
+        self.ax1.axhspan(70, 99, color='#2ecc71', alpha=0.1, label='Normal')
+        self.ax1.axhspan(100, 125, color='#f39c12', alpha=0.1, label='Prediabetes')
+        self.ax1.axhspan(126, 300, color='#e74c3c', alpha=0.1, label='Diabetes')
+
+        self.ax1.set_ylabel('Glucose (mg/dL)', fontweight='bold')
+        self.ax1.set_title('Blood Sugar Trend', fontweight='bold')
+        self.ax1.legend(loc='upper left')
+        self.ax1.grid(True, linestyle='--', alpha=0.7)
+        self.ax1.xaxis_date()
+
+        # Measurement type distribution
+        self.bars = self.ax2.bar(list(self.colors), [0] * len(self.colors), color=list(self.colors.values()))
+        self.ax2.set_ylabel('Count', fontweight='bold')
+        self.ax2.set_title('Measurement Distribution', fontweight='bold')
+
+        # Summary statistics
+        self.ax3.axis('off')
+        self.stats = self.ax3.text(0.05, 0.5, "", fontsize=10, va='center', ha='left')
+        self.dynamic = list(self.lines.values()) + list(self.bars) + [self.stats]
+
+    def update(self, df, stats, reset=False, type_counts=None):
+        """As TrendLayout.update; type_counts ({type: readings}) sizes the bars when df is a sample"""
+        df = df.sort_values('Timestamp')
+        x = date_numbers(df['Timestamp'])
+        glucose = _column(df, 'Glucose')
+        types = df['Type'].to_numpy()
+
+        masks = {}
+        for m_type in self.lines:
+            # Readings from other meters are counted as Random
+            masks[m_type] = types == m_type if m_type != 'Random' else ~np.isin(types, list(self.colors)[:-1])
+        if type_counts is None:
+            counts = [int(mask.sum()) for mask in masks.values()]
+        else:
+            counts = [0] * len(self.lines)
+            for m_type, count in type_counts.items():
+                counts[list(self.lines).index(m_type if m_type in self.lines else 'Random')] += count
+        for bar, count in zip(self.bars, counts):
+            bar.set_height(count)
+
+        summary = stats['glucose_level']
+        if not summary.n:
+            self.stats.set_text("No readings in this range")
+        else:
+            self.stats.set_text("\n".join([
+                f"Glucose: Min={round(summary.min, 1)}, Max={round(summary.max, 1)}",
+                f"Average: {round(summary.mean, 1)}",
+                f"Readings: {summary.n}"
+            ]))
+        if not len(x):
+            super().clear()
+            return False
+
+        moved = _fit_limits(self.ax1.get_xlim, self.ax1.set_xlim, x.min(), x.max(), MIN_PAD_DAYS, reset)
+        moved |= _fit_limits(self.ax1.get_ylim, self.ax1.set_ylim, min(glucose.min(), 70),
+                             max(glucose.max(), 300), MIN_PAD_VALUE, reset)
+        # Counts start at zero, so only the top needs headroom
+        top = self.ax2.get_ylim()[1]
+        if reset or max(counts) > top or max(counts) < top / 2:
+            self.ax2.set_ylim(0, max(counts) * (1 + HEADROOM) + 1)
+            moved = True
+        if moved:
+            self.figure.tight_layout()
+
+        for m_type, line in self.lines.items():
+            _draw_line(line, x[masks[m_type]], glucose[masks[m_type]])
+        return moved
+
+    def clear(self):
+        super().clear()
+        for bar in self.bars:
+            bar.set_height(0)
+
+
+class ForecastLayout(TrendLayout):
+    """History plus a dashed forecast for each series, rendered as a ChartImage"""
+    figsize = (CHART_SIZE[0] / CHART_DPI, CHART_SIZE[1] / CHART_DPI)
+    dpi = CHART_DPI
+    title = ''
+    ylabel = ''
+    series = []
+
+    def build(self):
+        self.ax = self.figure.add_subplot()
+        self.history = []
+        self.forecast = []
+        for name, fmt in self.series:
+            self.history.append(self.ax.plot([], [], f'{fmt}-o', label=f'Historical {name}')[0])
+        for name, fmt in self.series:
+            self.forecast.append(self.ax.plot([], [], f'{fmt}--o', label=f'Predicted {name}')[0])
+        self.ax.xaxis_date()
+        self.ax.set_title(self.title)
+        self.ax.set_xlabel('Date')
+        self.ax.set_ylabel(self.ylabel)
+        self.ax.legend()
+        self.ax.grid(True)
+        self.ax.tick_params(axis='x', labelrotation=45)
+        self.dynamic = self.history + self.forecast
+
+    def update(self, history_x, history_values, future_x, future_values, reset=True):
+        for line, values in zip(self.history, history_values):
+            line.set_data(history_x, values)
+        for line, values in zip(self.forecast, future_values):
+            line.set_data(future_x, values)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.figure.tight_layout()
+        # Long histories are decimated once the limits are known
+        history_x = np.asarray(history_x, dtype=float)
+        for line, values in zip(self.history, history_values):
+            _draw_line(line, history_x, np.asarray(values, dtype=float))
+        return True
+
+    def render(self):
+        return ChartImage.from_figure(self.figure)
+
+
+class BPForecastLayout(ForecastLayout):
+    title = 'Blood Pressure Trend and Prediction'
+    ylabel = 'Blood Pressure (mmHg)'
+    series = [('Systolic', 'b'), ('Diastolic', 'g')]
+
+
+class BSForecastLayout(ForecastLayout):
+    title = 'Blood Sugar Trend and Prediction'
+    ylabel = 'Glucose Level (mg/dL)'
+    series = [('Glucose', 'r')]
+
+
+class FigurePool:
+    def __init__(self, max_idle=MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, layout_class):
+        with self._lock:
+            idle = self._idle.get(layout_class)
+            if idle:
+                return idle.pop()
+        return layout_class()
+
+    def release(self, layout):
+        """Take a layout back; its figure is kept for reuse or cleared if the pool is full"""
+        layout.clear()
+        layout.set_animated(False)
+        # Drop any Tk canvas so its destroyed widget can be freed
+        FigureCanvasAgg(layout.figure)
+        with self._lock:
+            idle = self._idle.setdefault(type(layout), [])
+            if len(idle) < self.max_idle:
+                idle.append(layout)
+                return
+        layout.figure.clear()
+
+    def idle_count(self):
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+
+class TrendWindow:
+    """A pooled trend figure embedded in a Tk widget
+
+    refresh() blits the changed artists when the axis limits still fit and
+    redraws otherwise. Call release() when the window closes.
+    """
+
+    def __init__(self, master, layout_class, pool=None):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.pool = pool or figures
+        self.layout = self.pool.acquire(layout_class)
+        self.layout.set_animated(True)
+        self.canvas = FigureCanvasTkAgg(self.layout.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self._background = None
+        self._shown = None
+        self._draw_id = self.canvas.mpl_connect('draw_event', self._on_draw)
+        self._resize_id = self.canvas.mpl_connect('resize_event', self._on_resize)
+
+    def build_range_bar(self, parent, selected, command):
+        """Add a row of TREND_RANGES buttons to parent and return its frame
+
+        command(label) is called when another range is picked.
+        """
+        import tkinter as tk
+        from tkinter import ttk
+        frame = ttk.Frame(parent)
+        self.range_choice = tk.StringVar(master=parent, value=selected)
+        for label in TREND_RANGES:
+            ttk.Radiobutton(frame, text=label, value=label, variable=self.range_choice, style='Toolbutton',
+                            command=lambda: command(self.range_choice.get())).pack(side=tk.LEFT, padx=2)
+        return frame
+
+    def _on_draw(self, event):
+        # Full draws leave out animated artists: keep that as the background, then add them
+        self._background = self.canvas.copy_from_bbox(self.layout.figure.bbox)
+        self._draw_dynamic()
+
+    def _draw_dynamic(self):
+        for artist in self.layout.dynamic:
+            self.layout.figure.draw_artist(artist)
+        self.canvas.blit(self.layout.figure.bbox)
+
+    def _on_resize(self, event):
+        # Lines were decimated for the old axis width
+        if self.layout is not None and self._shown is not None:
+            self.layout.update(*self._shown)
+            self.canvas.draw_idle()
+
+    def show(self, df, stats):
+        """Show a new range of readings, fitting the axes to it"""
+        self._shown = (df, stats)
+        self.layout.update(df, stats, reset=True)
+        self.canvas.draw()
+
+    def refresh(self, df, stats):
+        if self.layout is None:
+            return
+        self._shown = (df, stats)
+        if self.layout.update(df, stats) or self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_dynamic()
+
+    def release(self):
+        if self.layout is None:
+            return
+        self.canvas.mpl_disconnect(self._draw_id)
+        self.canvas.mpl_disconnect(self._resize_id)
+        self.pool.release(self.layout)
+        self.layout = None
+        self._shown = None
+
+
+figures = FigurePool()